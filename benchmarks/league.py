@@ -0,0 +1,70 @@
+import math
+import random
+
+
+class SyntheticLeague(object):
+    """a deterministic league of teams with known latent ratings, played out as play-by-play rows
+
+    every team has an offense and a defense unit whose elo drifts from week to week like the Wiener process
+    the rating model assumes. Each game produces plays_per_game plays, half with each team on offense, and the
+    rows look like the category csv files written by Features.export_segmented_labeled_csv
+
+    Attributes:
+        rows (list[list]): "home_name,away_name,winner,time_step" rows
+        true_elo (dict[tuple(str, int), float]): the latent elo of each unit in each week it played
+    """
+
+    def __init__(self, teams=14, weeks=1, density=1.0, plays_per_game=70, w2=14.0, spread=150.0, seed=0):
+        """
+        Args:
+            teams (int, optional): the number of teams
+            weeks (int, optional): the number of weeks
+            density (float, optional): the probability that a team plays in a given week
+            plays_per_game (int, optional): the number of plays of each game
+            w2 (float, optional): the variance of the weekly elo drift, in elo^2
+            spread (float, optional): the standard deviation of the initial elos
+            seed (int, optional): the random seed
+        """
+        rnd = random.Random(seed)
+        names = ["team {}".format(i) for i in range(teams)]
+        units = ["{} {}".format(n, side) for n in names for side in ('offense', 'defense')]
+        elo = {u: rnd.gauss(0, spread) for u in units}
+        self.rows = []
+        self.true_elo = {}
+        for week in range(1, weeks + 1):
+            for u in units:
+                elo[u] += rnd.gauss(0, math.sqrt(w2))
+            playing = [n for n in names if rnd.random() < density]
+            rnd.shuffle(playing)
+            for home, away in zip(playing[::2], playing[1::2]):
+                for i in range(plays_per_game):
+                    if i % 2 == 0:
+                        offense, defense = home + ' offense', away + ' defense'
+                        row = [offense, defense]
+                    else:
+                        offense, defense = away + ' offense', home + ' defense'
+                        row = [defense, offense]
+                    success = rnd.random() < 1.0 / (1.0 + 10 ** ((elo[defense] - elo[offense]) / 400.0))
+                    # the home unit wins the play when it is the offense and succeeds, or the defense and stops it
+                    row.extend(['H' if success == (row[0] == offense) else 'A', week])
+                    self.rows.append(row)
+                for u in (home + ' offense', home + ' defense', away + ' offense', away + ' defense'):
+                    self.true_elo[(u, week)] = elo[u]
+
+    def recovery_error(self, ratings):
+        """root mean square difference between fitted and latent elos, both centered on their mean
+
+        the likelihood only depends on rating differences, so a common shift is not an error
+
+        Args:
+            ratings (dict[tuple(str, int), float]): the fitted elo of each unit in each week
+
+        Returns:
+            float: the error in elo
+        """
+        keys = [k for k in self.true_elo if k in ratings]
+        if not keys:
+            return float('nan')
+        true_mean = sum(self.true_elo[k] for k in keys) / len(keys)
+        fit_mean = sum(ratings[k] for k in keys) / len(keys)
+        return math.sqrt(sum((ratings[k] - fit_mean - self.true_elo[k] + true_mean) ** 2 for k in keys) / len(keys))
@@ -0,0 +1,195 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from benchmarks.league import SyntheticLeague
+from benchmarks.run import TIERS
+from whr.snapshot import publish_base
+from whr.vectorized import VectorizedBase
+
+# request kind -> share of the requests
+MIX = {
+    'rating': 0.5,
+    'predict': 0.3,
+    'leaderboard': 0.15,
+    'history': 0.05,
+}
+
+
+def fit_snapshot(tier, path, w2=14.0, seed=0):
+    """fits a synthetic league and publishes its snapshot
+
+    Returns:
+        VectorizedBase: the fitted base
+    """
+    league = SyntheticLeague(w2=w2, seed=seed, **TIERS[tier])
+    base = VectorizedBase(config={"w2": w2})
+    base.load_plays(league.rows)
+    base.auto_iterate()
+    publish_base(base, path)
+    return base
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(connection, path):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def wait_until_up(host, port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            status, body = get(connection, '/health')
+            connection.close()
+            if status == 200:
+                return json.loads(body)
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("the service on {}:{} did not start".format(host, port))
+
+
+def client(host, port, names, deadline, seed, records):
+    """sends requests on one keep-alive connection until deadline, recording (kind, status, seconds)"""
+    rnd = random.Random(seed)
+    kinds, weights = zip(*MIX.items())
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    while time.time() < deadline:
+        kind = rnd.choices(kinds, weights)[0]
+        name = quote(rnd.choice(names))
+        if kind == 'rating':
+            path = '/ratings/{}'.format(name) if rnd.random() < 0.5 else '/ratings/{}?week={}'.format(
+                name, rnd.randint(1, 15))
+        elif kind == 'predict':
+            path = '/predict?home={}&away={}&handicap={}'.format(name, quote(rnd.choice(names)), rnd.randint(0, 50))
+        elif kind == 'leaderboard':
+            path = '/leaderboard?limit=25'
+        else:
+            path = '/history/{}'.format(name)
+        start = time.perf_counter()
+        try:
+            status, _ = get(connection, path)
+        except (OSError, http.client.HTTPException):
+            status = None
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+        records.append((kind, status, time.perf_counter() - start))
+    connection.close()
+
+
+def percentiles(seconds):
+    if len(seconds) == 0:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='load tests the ratings service (whr.service) on localhost')
+    parser.add_argument('--url', default=None, help='a running service, by default one is started on a free port')
+    parser.add_argument('--snapshot', default=None,
+                        help='the snapshot served by the started service, by default a fitted synthetic league')
+    parser.add_argument('--tier', default='fbs-season', choices=sorted(TIERS),
+                        help='the synthetic league fitted when no snapshot is given')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load')
+    parser.add_argument('--swap-every', type=float, default=0,
+                        help='republish the synthetic snapshot every that many seconds during the load, to measure '
+                             'hot swaps (0 for none)')
+    parser.add_argument('--output', default=None, help='where to write the results as json')
+    args = parser.parse_args(args)
+
+    server = None
+    base = None
+    folder = tempfile.mkdtemp()
+    snapshot = args.snapshot
+    try:
+        if args.url is None:
+            if snapshot is None:
+                snapshot = os.path.join(folder, '{}.npz'.format(args.tier))
+                base = fit_snapshot(args.tier, snapshot)
+            host, port = '127.0.0.1', free_port()
+            server = subprocess.Popen([sys.executable, '-m', 'whr.service', snapshot, '--host', host,
+                                       '--port', str(port), '--watch', '0.2'], stdout=subprocess.DEVNULL)
+        else:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        health = wait_until_up(host, port)
+
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        names = [t['name'] for t in json.loads(get(connection, '/leaderboard')[1])]
+        connection.close()
+
+        deadline = time.time() + args.duration
+        records = [[] for _ in range(args.clients)]
+        threads = [threading.Thread(target=client, args=(host, port, names, deadline, i, records[i]))
+                   for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        published = 0
+        if args.swap_every > 0 and base is not None:
+            # refits move the ratings a little, and every publish is swapped in under load
+            while time.time() + args.swap_every < deadline:
+                time.sleep(args.swap_every)
+                base.iterate(1)
+                publish_base(base, snapshot)
+                published += 1
+        for thread in threads:
+            thread.join()
+
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        swaps = json.loads(get(connection, '/health')[1])['version'] - health['version']
+        connection.close()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        os.rmdir(folder)
+
+    records = [r for rs in records for r in rs]
+    # a 404 is an answer (a team asked about a week before its first one), a dropped connection or a 5xx is not
+    failed = [r for r in records if r[1] is None or r[1] >= 500]
+    result = {
+        'clients': args.clients,
+        'duration_seconds': args.duration,
+        'requests': len(records),
+        'errors': len(failed),
+        'not_found': sum(r[1] == 404 for r in records),
+        'requests_per_second': len(records) / args.duration,
+        'published': published,
+        'swaps': swaps,
+        'latency': percentiles([r[2] for r in records]),
+        'latency_by_kind': {k: percentiles([r[2] for r in records if r[0] == k]) for k in MIX},
+    }
+    print("{requests} requests ({errors} errors) from {clients} clients in {duration_seconds:.0f}s: "
+          "{requests_per_second:.0f} requests/s, {swaps} snapshot swaps".format(**result))
+    print("latency: " + ", ".join("{} {:.2f}".format(k, v) for k, v in result['latency'].items()))
+    if args.output is not None:
+        with open(args.output, 'w+') as outfile:
+            json.dump(result, outfile, indent=4, sort_keys=True)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.league import SyntheticLeague
+from whr.vectorized import ELO_TO_R, VectorizedBase
+from whr.whole_history_rating import Base
+
+# name -> SyntheticLeague arguments, from one conference-week to ten seasons of play-by-play
+TIERS = {
+    'conference-week': dict(teams=14, weeks=1),
+    'conference-season': dict(teams=14, weeks=12),
+    'fbs-season': dict(teams=130, weeks=15, density=0.9),
+    'three-seasons': dict(teams=130, weeks=45, density=0.9),
+    'ten-seasons': dict(teams=130, weeks=150, density=0.9),
+}
+
+ENGINES = {
+    'object': Base,
+    'vectorized': VectorizedBase,
+}
+
+
+def fitted_elos(base):
+    """gets the fitted elo of every unit in every week it played"""
+    if isinstance(base, VectorizedBase):
+        base._ensure_built()
+        return {(base.names[t], w): r / ELO_TO_R for t, w, r in zip(base.tw_team.tolist(), base.tw_week.tolist(),
+                                                                    base.r.tolist())}
+    return {(t.name, w.week): w.elo() for t in base.teams.values() for w in t.weeks}
+
+
+def traced_memory(f):
+    """runs f and gets its result, the memory it allocated and still holds, and the peak of memory it allocated, in
+    bytes"""
+    tracemalloc.start()
+    try:
+        result = f()
+        current, peak = tracemalloc.get_traced_memory()
+        return result, current, peak
+    finally:
+        tracemalloc.stop()
+
+
+def run_one(league, engine, w2, time_limit, precision, iterations, acceleration=None):
+    """benchmarks one engine on one league
+
+    acceleration (see whr.acceleration) only applies to the auto_iterate run of the object engine
+
+    Returns:
+        dict: the measurements
+    """
+    cls = ENGINES[engine]
+    result = {'engine': engine, 'plays': len(league.rows)}
+
+    # memory is measured on separate runs, tracemalloc slows everything down
+    def load():
+        loaded = cls(config={"w2": w2})
+        loaded.load_plays(league.rows)
+        if isinstance(loaded, VectorizedBase):
+            loaded._ensure_built()
+        return loaded
+
+    # the base is returned, so what it still holds after loading is the memory of the loaded model
+    _, retained, load_peak = traced_memory(load)
+    result['load_peak_bytes'] = load_peak
+    result['bytes_per_play'] = load_peak / max(len(league.rows), 1)
+    result['retained_bytes_per_play'] = retained / max(len(league.rows), 1)
+
+    start = time.perf_counter()
+    base = cls(config={"w2": w2})
+    base.load_plays(league.rows)
+    result['load_seconds'] = time.perf_counter() - start
+
+    # the first iteration also builds caches (matchups, arrays), keep it out of the per-iteration time
+    base.iterate(1)
+    start = time.perf_counter()
+    base.iterate(iterations)
+    result['seconds_per_iteration'] = (time.perf_counter() - start) / iterations
+
+    _, _, iterate_peak = traced_memory(lambda: base.iterate(1))
+    result['iteration_peak_bytes'] = iterate_peak
+
+    base = cls(config={"w2": w2, "acceleration": acceleration})
+    base.load_plays(league.rows)
+    start = time.perf_counter()
+    result['iterations'], result['stable'] = base.auto_iterate(time_limit=time_limit, precision=precision)
+    result['auto_iterate_seconds'] = time.perf_counter() - start
+    result['iterations_saved'] = getattr(base, 'iterations_saved', None)
+
+    # force a full recompute of every uncertainty
+    base.ratings_version += 1
+    start = time.perf_counter()
+    base.update_uncertainty()
+    result['uncertainty_seconds'] = time.perf_counter() - start
+
+    elos = fitted_elos(base)
+    result['team_weeks'] = len(elos)
+    result['recovery_error_elo'] = league.recovery_error(elos)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='benchmarks the rating engines on synthetic leagues')
+    parser.add_argument('--tiers', nargs='+', default=['conference-week', 'conference-season', 'fbs-season'],
+                        choices=sorted(TIERS))
+    parser.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument('--plays-per-game', type=int, default=70)
+    parser.add_argument('--w2', type=float, default=14.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, default=60, help='auto_iterate time limit, in seconds')
+    parser.add_argument('--precision', type=float, default=10E-3)
+    parser.add_argument('--iterations', type=int, default=5, help='iterations timed for seconds_per_iteration')
+    parser.add_argument('--acceleration', default=None, choices=['sor', 'anderson', 'aitken'],
+                        help='acceleration of the auto_iterate run of the object engine')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(args)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': [],
+    }
+    for tier in args.tiers:
+        league = SyntheticLeague(plays_per_game=args.plays_per_game, w2=args.w2, seed=args.seed, **TIERS[tier])
+        for engine in args.engines:
+            result = run_one(league, engine, args.w2, args.time_limit, args.precision, args.iterations,
+                             args.acceleration)
+            result['tier'] = tier
+            report['results'].append(result)
+            print("{tier} / {engine}: {plays} plays, {seconds_per_iteration:.4f}s per iteration, {iterations} "
+                  "iterations (stable = {stable}) in {auto_iterate_seconds:.2f}s, "
+                  "recovery error {recovery_error_elo:.1f} elo, "
+                  "{retained_bytes_per_play:.0f} bytes per play".format(**result))
+
+    with open(args.output, 'w+') as outfile:
+        json.dump(report, outfile, indent=4, sort_keys=True)
+    return report
+
+
+if __name__ == "__main__":
+    main()
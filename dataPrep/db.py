@@ -1,4 +1,9 @@
+import hashlib
 import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from requests import Session
 from requests.adapters import HTTPAdapter
@@ -6,16 +11,16 @@ from requests.packages.urllib3.util.retry import Retry
 
 
 class dbSession(object):
-    headers = {'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:62.0) Gecko/20100101 Firefox/62.0'}
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:62.0) Gecko/20100101 Firefox/62.0'}
     base_url = 'https://api.collegefootballdata.com'
 
     @staticmethod
     def requests_retry_session(retries=10, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None,
-                               headers=None):
+                               headers=None, pool_size=10):
         if not headers:
             headers = dbSession.headers
         session = session or Session()
-        session.headers = headers
+        session.headers.update(headers)
         retry = Retry(
             total=retries,
             read=retries,
@@ -23,7 +28,7 @@ class dbSession(object):
             backoff_factor=backoff_factor,
             status_forcelist=status_forcelist,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
@@ -45,3 +50,137 @@ class dbSession(object):
         if len(kwargs.keys()) > 0:
             url = ''.join([url, '?', '&'.join([str(x) + '=' + str(kwargs[x]) for x in kwargs])])
         return json.loads(dbSession.requests_retry_session().get(url).text)
+
+
+class Fetcher(object):
+    """fetches many queries at once on one pooled session, with an on-disk cache of the responses
+
+    the session is the one of dbSession.requests_retry_session, with the same retry and backoff, and its connection
+    pool holds one connection per worker. Responses are cached as json files keyed by endpoint and parameters, so
+    re-runs only fetch what is missing. Empty and error responses are not cached, a re-run fetches them again
+
+    Attributes:
+        hits (int): the number of queries answered by the cache
+        misses (int): the number of queries sent to the server
+    """
+
+    def __init__(self, base_url=dbSession.base_url, workers=8, cache_dir=None, headers=None, retries=10,
+                 backoff_factor=0.3, status_forcelist=(500, 502, 504)):
+        """
+        Args:
+            base_url (str, optional): the url of the api
+            workers (int, optional): the maximal number of queries in flight
+            cache_dir (str, optional): the folder of the response cache, None to disable it
+            headers (dict, optional): the headers of every query, defaults to dbSession.headers
+            retries (int, optional): see dbSession.requests_retry_session
+            backoff_factor (float, optional): see dbSession.requests_retry_session
+            status_forcelist (tuple(int), optional): see dbSession.requests_retry_session
+        """
+        if workers < 1:
+            raise (AttributeError("The number of workers must be at least 1, got {}".format(workers)))
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.session = dbSession.requests_retry_session(retries=retries, backoff_factor=backoff_factor,
+                                                        status_forcelist=status_forcelist, headers=headers,
+                                                        pool_size=workers)
+        self.hits = 0
+        self.misses = 0
+        # the counts are bumped from the worker threads of fetch_many
+        self._lock = threading.Lock()
+
+    def cache_path(self, endpoint, params):
+        """gets the cache file of a query, None if the cache is disabled
+
+        Args:
+            endpoint (str): the endpoint, like "plays"
+            params (dict): the query parameters
+
+        Returns:
+            str: the path of the cached response
+        """
+        if self.cache_dir is None:
+            return None
+        key = json.dumps([self.base_url, endpoint, sorted((str(k), str(v)) for k, v in params.items())])
+        return os.path.join(self.cache_dir, endpoint.strip('/').replace('/', '_'),
+                            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def fetch(self, endpoint, **params):
+        """gets the json response of a query, from the cache if it is there
+
+        Args:
+            endpoint (str): the endpoint, like "plays"
+            **params: the query parameters
+
+        Returns:
+            the decoded json response
+        """
+        path = self.cache_path(endpoint, params)
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as infile:
+                result = json.load(infile)
+            with self._lock:
+                self.hits += 1
+            return result
+        response = self.session.get('/'.join([self.base_url, endpoint.strip('/')]), params=params)
+        with self._lock:
+            self.misses += 1
+        response.raise_for_status()
+        text = response.text
+        result = json.loads(text)
+        if path is not None and self.cacheable(result):
+            # write then rename, an interrupted run never leaves a truncated response in the cache
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as outfile:
+                outfile.write(text)
+            os.replace(tmp, path)
+        return result
+
+    @staticmethod
+    def cacheable(result):
+        """tells if a response can be cached: an empty response may only mean the data is not there yet, and an
+        error message is not data
+
+        Args:
+            result: the decoded json response
+
+        Returns:
+            bool: True to cache it
+        """
+        if not result:
+            return False
+        return not (isinstance(result, dict) and ('error' in result or 'message' in result))
+
+    def fetch_many(self, queries):
+        """gets the json responses of many queries, with at most workers of them in flight
+
+        Args:
+            queries (list[tuple(str, dict)]): the endpoint and parameters of each query
+
+        Returns:
+            list: the responses, in the order of queries
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(lambda q: self.fetch(q[0], **q[1]), queries))
+
+    def fetch_weeks(self, years, weeks):
+        """gets the games and plays of every week of every year
+
+        Args:
+            years (list[int]): the years
+            weeks (list[int]): the weeks
+
+        Returns:
+            list[tuple(int, int, list, list)]: the year, week, games and plays of each week, in order
+        """
+        keys = [(y, w) for y in years for w in weeks]
+        queries = []
+        for y, w in keys:
+            queries.append(('games', {'year': y, 'week': w}))
+            queries.append(('plays', {'year': y, 'week': w}))
+        responses = self.fetch_many(queries)
+        return [(y, w, responses[2 * i], responses[2 * i + 1]) for i, (y, w) in enumerate(keys)]
+
+    def close(self):
+        self.session.close()
@@ -2,222 +2,384 @@ import csv
 import json
 import os
 
+import numpy as np
+
 
 class Features(object):
-    __slots__ = ['plays', 'labeled', 'file']
+    __slots__ = ['plays', 'labeled', 'file', 'columns']
     labeled_fields = ['home', 'away', 'clock', 'defense', 'offense', 'distance', 'down', "drive_id", 'id', 'period',
                       'play_type',
                       'week', 'yard_line', 'yards_gained', 'year']
-
-    def __init__(self, file):
+    categories = ('success',
+                  'first_down_success',
+                  'first_down_rush_success',
+                  'first_down_pass_success',
+                  'second_down_success',
+                  'second_down_rush_success',
+                  'second_down_pass_success',
+                  'third_down_success',
+                  'third_down_rush_success',
+                  'third_down_pass_success',
+                  'fourth_down_success',
+                  'fourth_down_rush_success',
+                  'fourth_down_pass_success',
+                  'standard_down_rush_success',
+                  'standard_down_pass_success',
+                  'passing_down_rush_success',
+                  'passing_down_pass_success',
+                  'power_down_rush_success',
+                  'power_down_pass_success',
+                  'run_stuff',
+                  'explosive_rush',
+                  'explosive_pass',
+                  'opportunity'
+                  )
+
+    def __init__(self, file, label=True):
+        """
+        Args:
+            file (str): the json of the plays joined with their games
+            label (bool, optional): True to label every play as a dict (see labeled), the csv export does not
+                need it
+        """
         self.file = file
+        self.columns = None
         with open(file, 'r') as infile:
             self.plays = json.load(infile)
             self.labeled = []
-            self.label_successes()
+            if label:
+                self.label_successes()
 
     def label_successes(self):
+        self.labeled = []
         for play in self.plays:
-            temp = {x: play[x] for x in Features.labeled_fields}
+            self.labeled.append(Features.label(play))
+
+    @staticmethod
+    def to_columns(plays):
+        """loads the fields of the plays used by the labels into arrays
+
+        Args:
+            plays (list[dict]): plays joined with their games
+
+        Returns:
+            dict[str, np.ndarray]: down, distance, yards_gained, week, the play type flags rush, pass (passes and
+            sacks) and kick (punts and good field goals), offense_home, and the home and away unit names
+        """
+        play_types = [p['play_type'] for p in plays]
+        codes = {t: i for i, t in enumerate(set(play_types))}
+        # flags are computed once per distinct play type, then spread to plays by code
+        kinds = sorted(codes, key=codes.get)
+        type_code = np.array([codes[t] for t in play_types], dtype=np.int64)
+        home = np.array([p['home'] for p in plays], dtype=object)
+        away = np.array([p['away'] for p in plays], dtype=object)
+        offense_home = np.array([p['home'] == p['offense'] for p in plays], dtype=bool)
+        return {
+            'down': np.array([p['down'] for p in plays], dtype=np.int64),
+            'distance': np.array([p['distance'] for p in plays], dtype=np.float64),
+            'yards_gained': np.array([p['yards_gained'] for p in plays], dtype=np.float64),
+            'week': np.array([p['week'] for p in plays], dtype=np.int64),
+            'rush': np.array([t == 'Rush' for t in kinds], dtype=bool)[type_code],
+            'pass': np.array([t.startswith('Pass') or t == 'Sack' for t in kinds], dtype=bool)[type_code],
+            'kick': np.array([t.lower() in ('punt', 'field goal good') for t in kinds], dtype=bool)[type_code],
+            'offense_home': offense_home,
+            'home_unit': np.where(offense_home, home + ' offense', home + ' defense'),
+            'away_unit': np.where(offense_home, away + ' defense', away + ' offense'),
+        }
+
+    @staticmethod
+    def label_columns(columns):
+        """labels every play in every category at once, with the same rules as label
+
+        Args:
+            columns (dict[str, np.ndarray]): the columns of the plays, see to_columns
+
+        Returns:
+            dict[str, tuple(np.ndarray, np.ndarray)]: for each category, the mask of the plays in the category and
+            the mask of the successful ones
+        """
+        down, distance, yards = columns['down'], columns['distance'], columns['yards_gained']
+        rush = columns['rush']
+        pass_ = columns['pass'] & ~rush
+        every = np.ones(len(down), dtype=bool)
+        first, second, third, fourth = down == 1, down == 2, down == 3, down == 4
+        late = third | fourth
+        success = np.where(first, yards >= 0.5 * distance,
+                           np.where(second, yards >= 0.7 * distance,
+                                    late & ((yards >= distance) | columns['kick'])))
+        # first downs, second downs under 8 yards to go, third and fourth downs from 3 to 4 yards to go
+        standard = first | (second & (distance < 8)) | (late & (distance > 2) & (distance < 5))
+        passing = (second & (distance >= 8)) | (late & (distance >= 5))
+        power = late & (distance <= 2)
+        opportunity = yards >= 4
+        members = {
+            'success': every,
+            'first_down_success': first,
+            'first_down_rush_success': first & rush,
+            'first_down_pass_success': first & pass_,
+            'second_down_success': second,
+            'second_down_rush_success': second & rush,
+            'second_down_pass_success': second & pass_,
+            # label only sets these on successful third and fourth downs
+            'third_down_success': third & success,
+            'third_down_rush_success': third & rush,
+            'third_down_pass_success': third & pass_,
+            'fourth_down_success': fourth & success,
+            'fourth_down_rush_success': fourth & rush,
+            'fourth_down_pass_success': fourth & pass_,
+            'standard_down_rush_success': standard & rush,
+            'standard_down_pass_success': standard & pass_,
+            'passing_down_rush_success': passing & rush,
+            'passing_down_pass_success': passing & pass_,
+            'power_down_rush_success': power & rush,
+            'power_down_pass_success': power & pass_,
+            'run_stuff': rush,
+            'explosive_rush': opportunity & rush,
+            'explosive_pass': opportunity & pass_,
+            'opportunity': every,
+        }
+        wins = {
+            'run_stuff': yards > 0,
+            'explosive_rush': yards >= 12,
+            'explosive_pass': yards >= 16,
+            'opportunity': opportunity,
+        }
+        return {c: (members[c], wins.get(c, success)) for c in Features.categories}
+
+    @staticmethod
+    def segmented_rows(columns, categories=None):
+        """gets the csv rows of every category, like segmented_row but for all plays at once
+
+        Args:
+            columns (dict[str, np.ndarray]): the columns of the plays, see to_columns
+            categories (tuple(str), optional): the categories, defaults to every category
+
+        Returns:
+            dict[str, list[tuple]]: the "home_name,away_name,winner,time_step" rows of each category
+        """
+        labels = Features.label_columns(columns)
+        home, away, week = columns['home_unit'], columns['away_unit'], columns['week']
+        result = {}
+        for c in categories or Features.categories:
+            member, won = labels[c]
+            idx = np.flatnonzero(member)
+            # the home unit wins when it is the offense and the play succeeds, or the defense and it fails
+            winner = np.where(won[idx] == columns['offense_home'][idx], 'H', 'A')
+            result[c] = list(zip(home[idx].tolist(), away[idx].tolist(), winner.tolist(), week[idx].tolist()))
+        return result
+
+    @staticmethod
+    def label(play):
+        """labels the success of one play in every category it belongs to
+
+        Args:
+            play (dict): a play joined with its game (see labeled_fields)
+
+        Returns:
+            dict: the labeled fields of the play, and 1 or 0 for each category of the play
+        """
+        temp = {x: play[x] for x in Features.labeled_fields}
+
+        if play['play_type'] == 'Rush':
+            if play['yards_gained'] <= 0:
+                temp['run_stuff'] = 0
+            else:
+                temp['run_stuff'] = 1
+
+        if play['yards_gained'] >= 4:
+
+            temp['opportunity'] = 1
 
             if play['play_type'] == 'Rush':
-                if play['yards_gained'] <= 0:
-                    temp['run_stuff'] = 0
+
+                if play['yards_gained'] >= 12:
+
+                    temp['explosive_rush'] = 1
+
                 else:
-                    temp['run_stuff'] = 1
 
-            if play['yards_gained'] >= 4:
+                    temp['explosive_rush'] = 0
 
-                temp['opportunity'] = 1
+            elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
 
-                if play['play_type'] == 'Rush':
+                if play['yards_gained'] >= 16:
 
-                    if play['yards_gained'] >= 12:
+                    temp['explosive_pass'] = 1
 
-                        temp['explosive_rush'] = 1
+                else:
 
-                    else:
+                    temp['explosive_pass'] = 0
+        else:
+
+            temp['opportunity'] = 0
 
-                        temp['explosive_rush'] = 0
+        if play['down'] == 1:
+            if play['yards_gained'] >= 0.5 * play['distance']:
+                temp['success'] = 1
+                temp['first_down_success'] = 1
+
+                if play['play_type'] == 'Rush':
+                    temp['first_down_rush_success'] = 1
+                    temp['standard_down_rush_success'] = 1
 
                 elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['first_down_pass_success'] = 1
+                    temp['standard_down_pass_success'] = 1
+            else:
+                temp['success'] = 0
+                temp['first_down_success'] = 0
+
+                if play['play_type'] == 'Rush':
 
-                    if play['yards_gained'] >= 16:
+                    temp['first_down_rush_success'] = 0
+                    temp['standard_down_rush_success'] = 0
 
-                        temp['explosive_pass'] = 1
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['first_down_pass_success'] = 0
+                    temp['standard_down_pass_success'] = 0
 
+        elif play['down'] == 2:
+            if play['yards_gained'] >= 0.7 * play['distance']:
+                temp['success'] = 1
+                temp['second_down_success'] = 1
+
+                if play['play_type'] == 'Rush':
+                    temp['second_down_rush_success'] = 1
+                    if play['distance'] >= 8:
+                        temp['passing_down_rush_success'] = 1
                     else:
+                        temp['standard_down_rush_success'] = 1
+
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['second_down_pass_success'] = 1
+                    if play['distance'] >= 8:
+                        temp['passing_down_pass_success'] = 1
+                    else:
+                        temp['standard_down_pass_success'] = 1
 
-                        temp['explosive_pass'] = 0
             else:
+                temp['success'] = 0
+                temp['second_down_success'] = 0
+
+                if play['play_type'] == 'Rush':
+                    temp['second_down_rush_success'] = 0
+                    if play['distance'] >= 8:
+                        temp['passing_down_rush_success'] = 0
+                    else:
+                        temp['standard_down_rush_success'] = 0
 
-                temp['opportunity'] = 0
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['second_down_pass_success'] = 0
+                    if play['distance'] >= 8:
+                        temp['passing_down_pass_success'] = 0
+                    else:
+                        temp['standard_down_pass_success'] = 0
 
-            if play['down'] == 1:
-                if play['yards_gained'] >= 0.5 * play['distance']:
-                    temp['success'] = 1
-                    temp['first_down_success'] = 1
+        elif play['down'] == 3:
+            if play['yards_gained'] >= play['distance'] or play['play_type'].lower() == 'punt' or play[
+                'play_type'].lower() == 'field goal good':
+                temp['success'] = 1
+                temp['third_down_success'] = 1
 
-                    if play['play_type'] == 'Rush':
-                        temp['first_down_rush_success'] = 1
+                if play['play_type'] == 'Rush':
+                    temp['third_down_rush_success'] = 1
+
+                    if play['distance'] <= 2:
+                        temp['power_down_rush_success'] = 1
+                    elif play['distance'] < 5:
                         temp['standard_down_rush_success'] = 1
+                    else:
+                        temp['passing_down_rush_success'] = 1
 
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['first_down_pass_success'] = 1
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['third_down_pass_success'] = 1
+
+                    if play['distance'] <= 2:
+                        temp['power_down_pass_success'] = 1
+                    elif play['distance'] < 5:
                         temp['standard_down_pass_success'] = 1
-                else:
-                    temp['success'] = 0
-                    temp['first_down_success'] = 0
+                    else:
+                        temp['passing_down_pass_success'] = 1
 
-                    if play['play_type'] == 'Rush':
+            else:
+                temp['success'] = 0
 
-                        temp['first_down_rush_success'] = 0
+                if play['play_type'] == 'Rush':
+                    temp['third_down_rush_success'] = 0
+
+                    if play['distance'] <= 2:
+                        temp['power_down_rush_success'] = 0
+                    elif play['distance'] < 5:
                         temp['standard_down_rush_success'] = 0
+                    else:
+                        temp['passing_down_rush_success'] = 0
+
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['third_down_pass_success'] = 0
 
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['first_down_pass_success'] = 0
+                    if play['distance'] <= 2:
+                        temp['power_down_pass_success'] = 0
+                    elif play['distance'] < 5:
                         temp['standard_down_pass_success'] = 0
+                    else:
+                        temp['passing_down_pass_success'] = 0
 
-            elif play['down'] == 2:
-                if play['yards_gained'] >= 0.7 * play['distance']:
-                    temp['success'] = 1
-                    temp['second_down_success'] = 1
-
-                    if play['play_type'] == 'Rush':
-                        temp['second_down_rush_success'] = 1
-                        if play['distance'] >= 8:
-                            temp['passing_down_rush_success'] = 1
-                        else:
-                            temp['standard_down_rush_success'] = 1
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['second_down_pass_success'] = 1
-                        if play['distance'] >= 8:
-                            temp['passing_down_pass_success'] = 1
-                        else:
-                            temp['standard_down_pass_success'] = 1
+        elif play['down'] == 4:
+            if play['yards_gained'] >= play['distance'] or play['play_type'].lower() == 'punt' or play[
+                'play_type'].lower() == 'field goal good':
+                temp['success'] = 1
+                temp['fourth_down_success'] = 1
 
-                else:
-                    temp['success'] = 0
-                    temp['second_down_success'] = 0
-
-                    if play['play_type'] == 'Rush':
-                        temp['second_down_rush_success'] = 0
-                        if play['distance'] >= 8:
-                            temp['passing_down_rush_success'] = 0
-                        else:
-                            temp['standard_down_rush_success'] = 0
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['second_down_pass_success'] = 0
-                        if play['distance'] >= 8:
-                            temp['passing_down_pass_success'] = 0
-                        else:
-                            temp['standard_down_pass_success'] = 0
-
-            elif play['down'] == 3:
-                if play['yards_gained'] >= play['distance'] or play['play_type'].lower() == 'punt' or play[
-                    'play_type'].lower() == 'field goal good':
-                    temp['success'] = 1
-                    temp['third_down_success'] = 1
-
-                    if play['play_type'] == 'Rush':
-                        temp['third_down_rush_success'] = 1
-
-                        if play['distance'] <= 2:
-                            temp['power_down_rush_success'] = 1
-                        elif play['distance'] < 5:
-                            temp['standard_down_rush_success'] = 1
-                        else:
-                            temp['passing_down_rush_success'] = 1
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['third_down_pass_success'] = 1
-
-                        if play['distance'] <= 2:
-                            temp['power_down_pass_success'] = 1
-                        elif play['distance'] < 5:
-                            temp['standard_down_pass_success'] = 1
-                        else:
-                            temp['passing_down_pass_success'] = 1
+                if play['play_type'] == 'Rush':
+                    temp['fourth_down_rush_success'] = 1
 
-                else:
-                    temp['success'] = 0
-
-                    if play['play_type'] == 'Rush':
-                        temp['third_down_rush_success'] = 0
-
-                        if play['distance'] <= 2:
-                            temp['power_down_rush_success'] = 0
-                        elif play['distance'] < 5:
-                            temp['standard_down_rush_success'] = 0
-                        else:
-                            temp['passing_down_rush_success'] = 0
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['third_down_pass_success'] = 0
-
-                        if play['distance'] <= 2:
-                            temp['power_down_pass_success'] = 0
-                        elif play['distance'] < 5:
-                            temp['standard_down_pass_success'] = 0
-                        else:
-                            temp['passing_down_pass_success'] = 0
-
-            elif play['down'] == 4:
-                if play['yards_gained'] >= play['distance'] or play['play_type'].lower() == 'punt' or play[
-                    'play_type'].lower() == 'field goal good':
-                    temp['success'] = 1
-                    temp['fourth_down_success'] = 1
-
-                    if play['play_type'] == 'Rush':
-                        temp['fourth_down_rush_success'] = 1
-
-                        if play['distance'] <= 2:
-                            temp['power_down_rush_success'] = 1
-                        elif play['distance'] < 5:
-                            temp['standard_down_rush_success'] = 1
-                        else:
-                            temp['passing_down_rush_success'] = 1
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['fourth_down_pass_success'] = 1
-
-                        if play['distance'] <= 2:
-                            temp['power_down_pass_success'] = 1
-                        elif play['distance'] < 5:
-                            temp['standard_down_pass_success'] = 1
-                        else:
-                            temp['passing_down_pass_success'] = 1
+                    if play['distance'] <= 2:
+                        temp['power_down_rush_success'] = 1
+                    elif play['distance'] < 5:
+                        temp['standard_down_rush_success'] = 1
+                    else:
+                        temp['passing_down_rush_success'] = 1
 
-                else:
-                    temp['success'] = 0
-                    if play['play_type'] == 'Rush':
-                        temp['fourth_down_rush_success'] = 0
-
-                        if play['distance'] <= 2:
-                            temp['power_down_rush_success'] = 0
-                        elif play['distance'] < 5:
-                            temp['standard_down_rush_success'] = 0
-                        else:
-                            temp['passing_down_rush_success'] = 0
-
-                    elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
-                        temp['fourth_down_pass_success'] = 0
-
-                        if play['distance'] <= 2:
-                            temp['power_down_pass_success'] = 0
-                        elif play['distance'] < 5:
-                            temp['standard_down_pass_success'] = 0
-                        else:
-                            temp['passing_down_pass_success'] = 0
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['fourth_down_pass_success'] = 1
+
+                    if play['distance'] <= 2:
+                        temp['power_down_pass_success'] = 1
+                    elif play['distance'] < 5:
+                        temp['standard_down_pass_success'] = 1
+                    else:
+                        temp['passing_down_pass_success'] = 1
 
             else:
-                temp['success'] = -1
+                temp['success'] = 0
+                if play['play_type'] == 'Rush':
+                    temp['fourth_down_rush_success'] = 0
+
+                    if play['distance'] <= 2:
+                        temp['power_down_rush_success'] = 0
+                    elif play['distance'] < 5:
+                        temp['standard_down_rush_success'] = 0
+                    else:
+                        temp['passing_down_rush_success'] = 0
+
+                elif play['play_type'].startswith('Pass') or play['play_type'] == 'Sack':
+                    temp['fourth_down_pass_success'] = 0
+
+                    if play['distance'] <= 2:
+                        temp['power_down_pass_success'] = 0
+                    elif play['distance'] < 5:
+                        temp['standard_down_pass_success'] = 0
+                    else:
+                        temp['passing_down_pass_success'] = 0
+
+        else:
+            temp['success'] = -1
 
-            self.labeled.append(temp)
+        return temp
 
     def export_labeled_json(self, file=None):
+        if not self.labeled:
+            self.label_successes()
         if not file:
             if file == self.file or not file:
                 prompt = input('Overwrite existing file?')
@@ -231,48 +393,34 @@ class Features(object):
             json.dump(self.labeled, outfile, indent=4, sort_keys=True)
 
     def export_segmented_labeled_csv(self):
-        categories = ('success',
-                      'first_down_success',
-                      'first_down_rush_success',
-                      'first_down_pass_success',
-                      'second_down_success',
-                      'second_down_rush_success',
-                      'second_down_pass_success',
-                      'third_down_success',
-                      'third_down_rush_success',
-                      'third_down_pass_success',
-                      'fourth_down_success',
-                      'fourth_down_rush_success',
-                      'fourth_down_pass_success',
-                      'standard_down_rush_success',
-                      'standard_down_pass_success',
-                      'passing_down_rush_success',
-                      'passing_down_pass_success',
-                      'power_down_rush_success',
-                      'power_down_pass_success',
-                      'run_stuff',
-                      'explosive_rush',
-                      'explosive_pass',
-                      'opportunity'
-                      )
-        for c in categories:
-            out = []
-            for p in self.labeled:
-                if c in p.keys():
-                    if p['home'] == p['offense']:
-                        row = [p['home'] + ' offense', p['away'] + ' defense']
-                        if p[c] == 1:
-                            row.extend(['H', p['week']])
-                        else:
-                            row.extend(['A', p['week']])
-                    else:
-                        row = [p['home'] + ' defense', p['away'] + ' offense']
-                        if p[c] == 1:
-                            row.extend(['A', p['week']])
-                        else:
-                            row.extend(['H', p['week']])
-
-                    out.append(row)
+        if self.columns is None:
+            self.columns = Features.to_columns(self.plays)
+        for c, out in Features.segmented_rows(self.columns).items():
             with open(os.path.join('data', '{}.csv'.format(c)), 'w+', newline='') as outfile:
                 csvr = csv.writer(outfile)
                 csvr.writerows(out)
+
+    @staticmethod
+    def segmented_row(p, c):
+        """gets the row of a labeled play in the csv of category c
+
+        Args:
+            p (dict): a labeled play, in category c
+            c (str): the category
+
+        Returns:
+            list: "home_name,away_name,winner,time_step" where home and away are the offense and defense units
+        """
+        if p['home'] == p['offense']:
+            row = [p['home'] + ' offense', p['away'] + ' defense']
+            if p[c] == 1:
+                row.extend(['H', p['week']])
+            else:
+                row.extend(['A', p['week']])
+        else:
+            row = [p['home'] + ' defense', p['away'] + ' offense']
+            if p[c] == 1:
+                row.extend(['A', p['week']])
+            else:
+                row.extend(['H', p['week']])
+        return row
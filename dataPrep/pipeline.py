@@ -0,0 +1,167 @@
+import csv
+import json
+import os
+from collections import defaultdict
+
+from dataPrep.features import Features
+
+
+def index_games(games):
+    """indexes the games of a week by the set of their two teams
+
+    Args:
+        games (list[dict]): the games, as returned by the games endpoint
+
+    Returns:
+        dict[frozenset, dict]: the first game between each pair of teams
+    """
+    index = {}
+    for game in games:
+        index.setdefault(frozenset((game['home_team'], game['away_team'])), game)
+    return index
+
+
+def join_games(plays, games, year, week):
+    """adds the home and away teams of its game to every play, dropping plays whose game is unknown
+
+    Args:
+        plays (list[dict]): the plays of a week, as returned by the plays endpoint
+        games (list[dict]): the games of the same week
+        year (int): the year
+        week (int): the week
+
+    Yields:
+        dict: the plays with their week, year, home and away
+    """
+    index = index_games(games)
+    for play in plays:
+        game = index.get(frozenset((play['defense'], play['offense'])))
+        if game is not None:
+            yield {**play, "week": week, "year": year, "away": game['away_team'], "home": game['home_team']}
+
+
+def joined_plays(weeks):
+    """joins the plays of many weeks with their games
+
+    Args:
+        weeks (iterable[tuple(int, int, list, list)]): the year, week, games and plays of each week, like
+            Fetcher.fetch_weeks
+
+    Yields:
+        dict: the joined plays, week after week
+    """
+    for year, week, games, plays in weeks:
+        yield from join_games(plays, games, year, week)
+
+
+class Pipeline(object):
+    """streams plays from the api to the bases of every category: fetch, join games, label, route
+
+    nothing is written to disk unless asked, the joined plays can still be saved as the json read by Features and
+    the rows as the csv files written by Features.export_segmented_labeled_csv
+    """
+
+    def __init__(self, categories=Features.categories, plays_file=None, csv_dir=None, chunk_size=10000):
+        """
+        Args:
+            categories (tuple(str), optional): the categories routed
+            plays_file (str, optional): where to save the joined plays as json, None to skip it
+            csv_dir (str, optional): where to save a csv of rows per category, None to skip it
+            chunk_size (int, optional): the number of rows of a category given to its base at once
+        """
+        self.categories = categories
+        self.plays_file = plays_file
+        self.csv_dir = csv_dir
+        self.chunk_size = chunk_size
+        self.plays = 0
+
+    def _weeks(self, weeks):
+        """joins the plays of each week, saving them to plays_file on the way"""
+        self.plays = 0
+        outfile = None if self.plays_file is None else open(self.plays_file, 'w+')
+        try:
+            if outfile is not None:
+                outfile.write('[')
+            for year, week, games, plays in weeks:
+                joined = list(join_games(plays, games, year, week))
+                if outfile is not None:
+                    for play in joined:
+                        if self.plays > 0:
+                            outfile.write(', ')
+                        outfile.write(json.dumps(play))
+                        self.plays += 1
+                else:
+                    self.plays += len(joined)
+                yield joined
+            if outfile is not None:
+                outfile.write(']')
+        finally:
+            if outfile is not None:
+                outfile.close()
+
+    def rows(self, weeks):
+        """runs the pipeline, labeling the plays of each week at once (see Features.segmented_rows)
+
+        Args:
+            weeks (iterable[tuple(int, int, list, list)]): the year, week, games and plays of each week, like
+                Fetcher.fetch_weeks
+
+        Yields:
+            tuple(str, list): the category and its row, saved to csv_dir on the way
+        """
+        files, writers = {}, {}
+        try:
+            if self.csv_dir is not None:
+                for c in self.categories:
+                    files[c] = open(os.path.join(self.csv_dir, '{}.csv'.format(c)), 'w+', newline='')
+                    writers[c] = csv.writer(files[c])
+            for joined in self._weeks(weeks):
+                if not joined:
+                    continue
+                for c, rows in Features.segmented_rows(Features.to_columns(joined), self.categories).items():
+                    if c in writers:
+                        writers[c].writerows(rows)
+                    for row in rows:
+                        yield c, row
+        finally:
+            for f in files.values():
+                f.close()
+
+    def load(self, weeks, bases):
+        """routes the rows of every category into its base
+
+        Args:
+            weeks (iterable[tuple(int, int, list, list)]): the year, week, games and plays of each week
+            bases (dict[str, Base]): the base of each category, categories without a base are dropped
+
+        Returns:
+            dict[str, Base]: bases
+        """
+        chunks = defaultdict(list)
+        for c, row in self.rows(weeks):
+            base = bases.get(c)
+            if base is None:
+                continue
+            chunk = chunks[c]
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                base.load_plays(chunk)
+                chunks[c] = []
+        for c, chunk in chunks.items():
+            if chunk:
+                bases[c].load_plays(chunk)
+        return bases
+
+    def collect(self, weeks):
+        """gathers the rows of every category in memory, to send them to other processes
+
+        Args:
+            weeks (iterable[tuple(int, int, list, list)]): the year, week, games and plays of each week
+
+        Returns:
+            dict[str, list[tuple]]: the rows of each category
+        """
+        result = {c: [] for c in self.categories}
+        for c, row in self.rows(weeks):
+            result[c].append(row)
+        return result
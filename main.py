@@ -1,57 +1,161 @@
-import csv
+import argparse
 import json
 import os
-from itertools import product
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from dataPrep.db import dbSession
+from dataPrep.db import Fetcher
 from dataPrep.features import Features
+from dataPrep.pipeline import Pipeline
+from whr.multi import MultiBase
 from whr.whole_history_rating import Base
 
+
+def fit_category(category, games, config, seeds=None):
+    """fits one category in its own fresh Base
+
+    Args:
+        category (str): the category
+        games (str|list[tuple]): the path of the category csv, or its rows
+        config (dict): the Base config
+        seeds (dict[str, float], optional): the elo each team starts from, see Base.seed_ratings
+
+    Returns:
+        tuple(str, list, tuple(int, bool), float): the category, the current ratings, the auto_iterate result and the
+        time spent in seconds
+    """
+    start = time.time()
+    whr = Base(config=dict(config))
+    if seeds:
+        whr.seed_ratings(seeds)
+    whr.load_plays(games)
+    iterations = whr.auto_iterate()
+    return category, whr.get_ordered_ratings(current=True), iterations, time.time() - start
+
+
+def fit_categories(sources, config, workers=None, seeds=None):
+    """fits every category on a process pool, yielding each result as soon as its worker finishes
+
+    Args:
+        sources (dict[str, str|list[tuple]]): the csv path or the rows of each category
+        config (dict): the Base config
+        workers (int, optional): the number of processes, defaults to the number of cpus
+        seeds (dict[str, dict[str, float]], optional): the starting elo of the teams of each category
+    """
+    seeds = seeds or {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fit_category, category, games, config, seeds.get(category))
+                   for category, games in sources.items()]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def fit_jointly(sources, config, seeds=None):
+    """fits every category at once in a MultiBase, sharing the team-week structure between categories
+
+    Args:
+        sources (dict[str, str|list[tuple]]): the csv path or the rows of each category
+        config (dict): the MultiBase config
+        seeds (dict[str, dict[str, float]], optional): the starting elo of the teams of each category
+
+    Returns:
+        tuple(dict[str, list], tuple(int, bool)): the current ratings of each category, and the auto_iterate result
+    """
+    whr = MultiBase(config=dict(config))
+    for category, ratings in (seeds or {}).items():
+        if category in sources:
+            whr.seed_ratings(category, ratings)
+    for category, games in sources.items():
+        whr.load_plays(category, games)
+    iterations = whr.auto_iterate()
+    return whr.ratings(current=True), iterations
+
+
+def merge_ratings(results, category, ratings):
+    for name, elo in ratings:
+        for x in ('offense', 'defense'):
+            team = name.split(' ')
+            if team[-1] == x:
+                try:
+                    results[' '.join(team[:-1])]['_'.join([x, category])] = elo
+                except KeyError:
+                    results[' '.join(team[:-1])] = {'_'.join([x, category]): elo}
+
+
+def split_ratings(results):
+    """the inverse of merge_ratings: gets the elo of each team of each category
+
+    Args:
+        results (dict[str, dict[str, float]]): for each school, its elo keyed by "offense_category" or
+            "defense_category", like the saved ratings
+
+    Returns:
+        dict[str, dict[str, float]]: for each category, the elo of each "school offense" and "school defense"
+    """
+    seeds = {}
+    for school, ratings in results.items():
+        for key, elo in ratings.items():
+            side, _, category = key.partition('_')
+            seeds.setdefault(category, {})[' '.join([school, side])] = elo
+    return seeds
+
+
 if __name__ == "__main__":
-    data = []
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes fitting categories at once (default: number of cpus)')
+    parser.add_argument('--download-workers', type=int, default=8, help='number of queries downloading at once')
+    parser.add_argument('--cache', default=os.path.join('data', 'cache'),
+                        help='folder of the downloaded responses, re-runs only download what is missing')
+    parser.add_argument('--joint', action='store_true',
+                        help='fit every category at once in one MultiBase instead of one Base per process')
+    parser.add_argument('--save-intermediate', action='store_true',
+                        help='also write the downloaded plays to data/plays.json and the category csv files')
+    args = parser.parse_args()
+
+    sources = None
     if input('Download new play data?\n')[0].lower() == 'y':
-        for y, w in product(range(2018, 2019), range(1, 16)):
-            g = dbSession.query_games(year=y, week=w)
-            p = [{**x, "week": w, "year": y} for x in dbSession.query_plays(year=y, week=w)]
-            for i in p:
-                for j in g:
-                    if {i['defense'], i['offense']} == {j['home_team'], j['away_team']}:
-                        i['away'], i['home'] = j['away_team'], j['home_team']
-                        data.append(i)
-                        break
-
-        with open(os.path.join('data', 'plays.json'), 'w+') as outfile:
-            json.dump(data, outfile)
-
-    if input('Process and label plays?\n')[0].lower() == 'y':
-        f = Features(file=os.path.join('data', 'plays.json'))
-        f.label_successes()
+        # fetch, join, label and split into categories in one stream, files are only written if asked
+        fetcher = Fetcher(workers=args.download_workers, cache_dir=args.cache)
+        if args.save_intermediate:
+            pipeline = Pipeline(plays_file=os.path.join('data', 'plays.json'), csv_dir='data')
+        else:
+            pipeline = Pipeline()
+        sources = pipeline.collect(fetcher.fetch_weeks(range(2018, 2019), range(1, 16)))
+        fetcher.close()
+        print("Downloaded {} responses, {} from the cache, {} plays".format(fetcher.misses, fetcher.hits,
+                                                                           pipeline.plays))
+
+    elif input('Process and label plays?\n')[0].lower() == 'y':
+        f = Features(file=os.path.join('data', 'plays.json'), label=False)
         f.export_segmented_labeled_csv()
 
     if input('Merge with existing ratings?\n')[0].lower() == 'y':
-        with open(os.path.join('data', 'ELO ratings.json'), 'w+') as infile:
+        with open(os.path.join('data', 'ELO ratings.json'), 'r') as infile:
             results = json.load(infile)
     else:
         results = {}
+    # the existing ratings are also where the fits start from, so a refit only needs a few sweeps
+    seeds = split_ratings(results)
 
-    # run the whole history rating for each feature
+    # run the whole history rating for each feature, each in its own process
 
-    whr = Base(config={"w2": 14})
-
-    for file in [n for n in os.listdir('data') if n.endswith('.csv')]:
-        with open(os.path.join('data', file), 'r') as infile:
-            plays = [x for x in csv.reader(infile)]
+    start = time.time()
+    if sources is None:
+        sources = {n.split('.')[0]: os.path.join('data', n) for n in os.listdir('data') if n.endswith('.csv')}
+    if args.joint:
+        fitted, (iterations, stable) = fit_jointly(sources, {"w2": 14}, seeds)
+        print("{} iterations, stable = {}".format(iterations, stable))
+    else:
+        fitted = {}
+        fits = fit_categories(sources, {"w2": 14}, args.workers, seeds)
+        for category, ratings, (iterations, stable), elapsed in fits:
+            print("{}: {} iterations, stable = {}, {:.1f}s".format(category, iterations, stable, elapsed))
+            fitted[category] = ratings
+    print("Fitted {} categories in {:.1f}s".format(len(fitted), time.time() - start))
 
-        whr.load_plays(plays)
-        whr.auto_iterate()
-        for t in whr.get_ordered_ratings(current=True):
-            for x in ('offense', 'defense'):
-                team = t[0].split(' ')
-                if team[-1] == x:
-                    try:
-                        results[' '.join(team[:-1])]['_'.join([x, file.__str__().split('.')[0]])] = t[1]
-                    except KeyError:
-                        results[' '.join(team[:-1])] = {'_'.join([x, file.__str__().split('.')[0]]): t[1]}
+    for category in sorted(fitted):
+        merge_ratings(results, category, fitted[category])
 
-        with open(os.path.join('data', 'ELO ratings.json'), 'w+') as outfile:
-            json.dump(results, outfile, indent=4, sort_keys=True)
+    with open(os.path.join('data', 'ELO ratings.json'), 'w+') as outfile:
+        json.dump(results, outfile, indent=4, sort_keys=True)
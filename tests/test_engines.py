@@ -0,0 +1,157 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.multi import MultiBase
+from whr.vectorized import ELO_TO_R, VectorizedBase
+from whr.whole_history_rating import Base
+
+PRECISION = 1e-5
+# every engine stops within a few PRECISION of the optimum
+TOLERANCE = 1e-3
+
+
+@pytest.fixture(scope="module")
+def leagues():
+    return (SyntheticLeague(teams=6, weeks=5, density=0.8, plays_per_game=10, seed=1).rows,
+            SyntheticLeague(teams=6, weeks=5, density=0.8, plays_per_game=10, seed=2).rows)
+
+
+def fit(engine, rows, **config):
+    base = engine(config=dict(w2=14, **config))
+    base.load_plays(rows)
+    iterations, stable = base.auto_iterate(precision=PRECISION)
+    assert stable
+    return base
+
+
+def ratings(base, *category):
+    return dict(base.get_ordered_ratings(*category))
+
+
+def assert_same_ratings(expected, actual):
+    assert expected.keys() == actual.keys()
+    for name, elos in expected.items():
+        np.testing.assert_allclose(actual[name], elos, rtol=0, atol=TOLERANCE)
+
+
+@pytest.fixture(scope="module")
+def reference(leagues):
+    return fit(Base, leagues[0])
+
+
+@pytest.mark.parametrize("engine, config", [
+    (VectorizedBase, {}),
+    (Base, {"solver": "newton"}),
+    (VectorizedBase, {"solver": "newton"}),
+    (Base, {"acceleration": "sor"}),
+    (Base, {"acceleration": "aitken"}),
+    (Base, {"acceleration": "anderson"}),
+    (Base, {"schedule": "residual"}),
+])
+def test_engines_and_solvers_agree(leagues, reference, engine, config):
+    assert_same_ratings(ratings(reference), ratings(fit(engine, leagues[0], **config)))
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_parallel_sweeps_agree(leagues, reference, backend):
+    with Base(config={"w2": 14, "workers": 2, "parallel_backend": backend}) as base:
+        base.load_plays(leagues[0])
+        assert base.auto_iterate(precision=PRECISION)[1]
+        assert_same_ratings(ratings(reference), ratings(base))
+        shm = base._parallel.shm
+    if backend == "process":
+        # leaving the with block unlinked the shared ratings
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=shm.name)
+    else:
+        assert shm is None
+    assert base._parallel is None
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_parallel_sweeps_agree_with_a_window_and_an_update(leagues, backend):
+    rows = leagues[0]
+    last = max(int(row[3]) for row in rows)
+    fits = []
+    for config in ({}, {"workers": 2, "parallel_backend": backend}):
+        base = Base(config=dict(w2=14, **config))
+        base.set_window(2)
+        base.load_plays([row for row in rows if int(row[3]) < last])
+        assert base.auto_iterate(precision=PRECISION)[1]
+        windowed = ratings(base)
+        base.add_week([row for row in rows if int(row[3]) == last])
+        base.update(tolerance=PRECISION / 10)
+        fits.append((windowed, ratings(base)))
+        base.close()
+    for serial, parallel in zip(*fits):
+        assert_same_ratings(serial, parallel)
+
+
+def test_a_rejected_sweep_keeps_the_teams_to_update(leagues):
+    base = Base(config={"w2": 14, "acceleration": "sor"})
+    base.load_plays(leagues[0])
+    base.iterate(3)
+    base._start_acceleration()
+    before = {name: [w.r for w in team.weeks] for name, team in base.teams.items()}
+    active = {sorted(base.teams)[0]}
+    base._active = active
+    # a sweep stretched that far lowers the log posterior
+    base._acceleration.omega = 5.0
+    base._accelerated_iteration(1e-4)
+    assert base._acceleration.rejections == 1
+    assert base._active == active
+    assert {name: [w.r for w in team.weeks] for name, team in base.teams.items()} == before
+
+
+def test_an_empty_vectorized_base_fits():
+    base = VectorizedBase(config={"w2": 14})
+    assert base.auto_iterate()[1]
+    assert base.get_ordered_ratings() == []
+    assert base.log_likelihood() == 0
+
+
+def test_multibase_categories_match_separate_fits(leagues, reference):
+    multi = MultiBase(config={"w2": 14})
+    multi.load_plays("a", leagues[0])
+    multi.load_plays("b", leagues[1])
+    assert multi.auto_iterate(precision=PRECISION)[1]
+    assert_same_ratings(ratings(reference), ratings(multi, "a"))
+    assert_same_ratings(ratings(fit(Base, leagues[1])), ratings(multi, "b"))
+    for category, rows in zip("ab", leagues):
+        expected = fit(VectorizedBase, rows).log_likelihood()
+        assert multi.log_likelihood(category) == pytest.approx(expected, rel=1e-6)
+
+
+def test_an_empty_multibase_fits():
+    multi = MultiBase(["a"], config={"w2": 14})
+    assert multi.auto_iterate()[1]
+    assert multi.ratings() == {"a": []}
+    assert multi.log_likelihood("a") == 0
+
+
+def test_uncertainties_and_likelihood_agree(leagues, reference):
+    vectorized = fit(VectorizedBase, leagues[0])
+    for team in reference.teams.values():
+        team.update_uncertainty()
+    vectorized.update_uncertainty()
+    for team in reference.teams.values():
+        s = vectorized._team_slice(team.name)
+        np.testing.assert_allclose(vectorized.uncertainty[s], [w.uncertainty for w in team.weeks], rtol=1e-4)
+        np.testing.assert_allclose(vectorized.r[s] / ELO_TO_R, [w.elo() for w in team.weeks], atol=TOLERANCE)
+    assert vectorized.log_likelihood() == pytest.approx(reference.log_likelihood(), rel=1e-6)
+
+
+def test_predictions_agree(leagues, reference):
+    vectorized = fit(VectorizedBase, leagues[0])
+    names = sorted(reference.teams)
+    pairs = [(a, b) for a in names for b in names if a != b]
+    for uncertainty in (False, True):
+        np.testing.assert_allclose(vectorized.predict_many(pairs, uncertainty=uncertainty),
+                                   reference.predict_many(pairs, uncertainty=uncertainty), atol=1e-6)
+
+
+def test_unknown_teams_are_predicted_at_even_odds():
+    np.testing.assert_allclose(Base().predict_many([("a", "b"), ("c", "d")]), [0.5, 0.5])
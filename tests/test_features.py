@@ -0,0 +1,46 @@
+from itertools import product
+
+import pytest
+
+from dataPrep.features import Features
+
+PLAY_TYPES = ('Rush', 'Pass Reception', 'Pass Incompletion', 'Passing Touchdown', 'Sack', 'Punt', 'Field Goal Good',
+              'Field Goal Missed', 'Kickoff', 'Penalty', 'Fumble Recovery (Opponent)')
+
+
+@pytest.fixture(scope="module")
+def plays():
+    plays = []
+    for i, (down, distance, yards, play_type, offense_home) in enumerate(product(
+            (0, 1, 2, 3, 4, 5), (1, 2, 2.5, 3, 4.5, 5, 7.9, 8, 10.5), (-3, 0, 0.5, 1.4, 3.5, 4, 7, 11.5, 12, 15.5, 16),
+            PLAY_TYPES, (True, False))):
+        home, away = 'home {}'.format(i % 3), 'away {}'.format(i % 4)
+        plays.append({'home': home, 'away': away, 'offense': home if offense_home else away,
+                      'defense': away if offense_home else home, 'clock': {}, 'distance': distance, 'down': down,
+                      'drive_id': i // 10, 'id': i, 'period': 1, 'play_type': play_type, 'week': 1 + i % 5,
+                      'yard_line': 50, 'yards_gained': yards, 'year': 2019})
+    return plays
+
+
+def test_columns_label_like_the_dicts(plays):
+    labeled = [Features.label(p) for p in plays]
+    rows = Features.segmented_rows(Features.to_columns(plays))
+    assert set(rows) == set(Features.categories)
+    for c in Features.categories:
+        expected = [tuple(Features.segmented_row(p, c)) for p in labeled if c in p]
+        assert rows[c] == expected, c
+        assert expected, c
+
+
+def test_label_columns_masks(plays):
+    labeled = [Features.label(p) for p in plays]
+    for c, (member, won) in Features.label_columns(Features.to_columns(plays)).items():
+        assert member.tolist() == [c in p for p in labeled]
+        assert won[member].tolist() == [p[c] == 1 for p in labeled if c in p]
+
+
+def test_categories_can_be_selected(plays):
+    columns = Features.to_columns(plays)
+    rows = Features.segmented_rows(columns, ('run_stuff', 'opportunity'))
+    assert list(rows) == ['run_stuff', 'opportunity']
+    assert rows['run_stuff'] == Features.segmented_rows(columns)['run_stuff']
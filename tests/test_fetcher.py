@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from dataPrep.db import Fetcher  # noqa: E402
+
+
+class StubApi(BaseHTTPRequestHandler):
+    """answers /games and /plays with one row naming the query, an empty list for week 0, and an error for week
+    -1 until the server's broken flag is cleared"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        week = int(parse_qs(url.query)['week'][0])
+        with self.server.lock:
+            self.server.calls.append((url.path, week))
+        # keep several queries in flight at once
+        time.sleep(0.01)
+        if week == -1 and self.server.broken:
+            body, status = {'error': 'not ready'}, 503
+        elif week == 0:
+            body, status = [], 200
+        else:
+            body, status = [{'endpoint': url.path, 'week': week}], 200
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApi)
+    server.daemon_threads = True
+    server.calls = []
+    server.lock = threading.Lock()
+    server.broken = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_fetcher(server, cache_dir, workers=8):
+    return Fetcher(base_url='http://127.0.0.1:{}'.format(server.server_port), workers=workers,
+                   cache_dir=str(cache_dir), retries=0, status_forcelist=())
+
+
+def test_fetch_weeks_in_order_with_exact_counts(server, tmp_path):
+    fetcher = make_fetcher(server, tmp_path)
+    weeks = list(range(1, 21))
+    result = fetcher.fetch_weeks([2018], weeks)
+    assert [(y, w) for y, w, _, _ in result] == [(2018, w) for w in weeks]
+    for _, w, games, plays in result:
+        assert games == [{'endpoint': '/games', 'week': w}]
+        assert plays == [{'endpoint': '/plays', 'week': w}]
+    assert (fetcher.hits, fetcher.misses) == (0, 40)
+
+    # a re-run is answered by the cache, counted across the worker threads
+    again = fetcher.fetch_weeks([2018], weeks)
+    assert again == result
+    assert (fetcher.hits, fetcher.misses) == (40, 40)
+    assert len(server.calls) == 40
+    fetcher.close()
+
+
+def test_empty_responses_are_fetched_again(server, tmp_path):
+    fetcher = make_fetcher(server, tmp_path)
+    assert fetcher.fetch('plays', year=2018, week=0) == []
+    assert fetcher.fetch('plays', year=2018, week=0) == []
+    assert fetcher.misses == 2
+    assert len(server.calls) == 2
+    fetcher.close()
+
+
+def test_error_responses_are_not_cached(server, tmp_path):
+    server.broken = True
+    fetcher = make_fetcher(server, tmp_path)
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch('plays', year=2018, week=-1)
+    # the backfill recovers once the server does
+    server.broken = False
+    assert fetcher.fetch('plays', year=2018, week=-1) == [{'endpoint': '/plays', 'week': -1}]
+    assert fetcher.fetch('plays', year=2018, week=-1) == [{'endpoint': '/plays', 'week': -1}]
+    assert (fetcher.hits, fetcher.misses) == (1, 2)
+    fetcher.close()
+
+
+def test_error_bodies_are_not_cached():
+    assert not Fetcher.cacheable([])
+    assert not Fetcher.cacheable({'error': 'bad year'})
+    assert Fetcher.cacheable([{'id': 1}])
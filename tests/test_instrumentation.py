@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.instrumentation import JsonLinesObserver, Observer
+from whr.whole_history_rating import Base
+
+
+class Recorder(Observer):
+    log_likelihood = True
+    slowest = 2
+
+    def __init__(self):
+        self.calls = []
+
+    def start(self, base):
+        self.calls.append(('start', base))
+
+    def iteration(self, event):
+        self.calls.append(('iteration', event))
+
+    def finish(self, base, iterations, stable, uncertainty_seconds):
+        self.calls.append(('finish', base, iterations, stable))
+
+
+@pytest.fixture
+def base():
+    base = Base(config={"w2": 14})
+    base.load_plays(SyntheticLeague(teams=6, weeks=4, plays_per_game=10, seed=7).rows)
+    return base
+
+
+def events(recorder):
+    return [call[1] for call in recorder.calls if call[0] == 'iteration']
+
+
+def test_iterate_reports_every_iteration(base):
+    recorder = Recorder()
+    base.observer = recorder
+    base.iterate(3)
+    assert [call[0] for call in recorder.calls] == ['iteration'] * 3
+    for i, event in enumerate(events(recorder), 1):
+        assert event.iteration == i
+        assert event.teams == len(base.teams)
+        assert event.play_terms > 0
+        assert event.active_teams is None
+        assert event.newton_seconds >= 0 and event.stability_seconds >= 0
+        assert len(event.slowest_teams) == 2
+        assert event.slowest_teams[0][1] >= event.slowest_teams[1][1]
+        assert event.slowest_teams[0][0] in base.teams
+    assert events(recorder)[-1].log_likelihood == pytest.approx(base.log_likelihood())
+
+
+def test_auto_iterate_reports_start_iterations_and_finish(base):
+    recorder = Recorder()
+    base.observer = recorder
+    iterations, stable = base.auto_iterate(precision=1e-4)
+    assert recorder.calls[0] == ('start', base)
+    assert recorder.calls[-1] == ('finish', base, iterations, stable)
+    reported = events(recorder)
+    assert len(reported) == iterations == len(recorder.calls) - 2
+    assert [e.iteration for e in reported] == list(range(1, iterations + 1))
+    # fewer teams take a step as they converge, until none is left
+    assert reported[0].teams == len(base.teams) > reported[-1].teams
+    assert reported[-1].active_teams == 0
+    assert reported[-1].max_shift <= 1e-5
+    assert reported[-1].log_likelihood == pytest.approx(base.log_likelihood())
+
+
+def test_json_lines_observer(base, tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    observer = JsonLinesObserver(path)
+    base.observer = observer
+    iterations, stable = base.auto_iterate(precision=1e-4)
+    observer.close()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['event'] for r in records] == ['start'] + ['iteration'] * iterations + ['finish']
+    assert records[0] == {'event': 'start', 'teams': len(base.teams), 'plays': len(base.plays)}
+    assert records[-1]['iterations'] == iterations and records[-1]['stable'] == stable
+    assert all(r['log_likelihood'] is not None for r in records[1:-1])
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.whole_history_rating import Base
+
+
+def shuffled_rows():
+    """rows out of week order, some with a handicap"""
+    rows = [[str(x) for x in row] for row in SyntheticLeague(teams=10, weeks=5, plays_per_game=12, seed=4).rows]
+    random.Random(0).shuffle(rows)
+    for row in rows[::5]:
+        row.append('12.5')
+    return rows
+
+
+def team_weeks(base):
+    return {(t.name, w.week): ({(o.name, offset): tuple(c) for (o, offset), c in w.play_counts.items()},
+                               w.r, w.is_first_week, w.play_count)
+            for t in base.teams.values() for w in t.weeks}
+
+
+def test_bulk_loading_matches_create_play():
+    rows = shuffled_rows()
+    bulk = Base(config={"w2": 14})
+    bulk.load_plays(rows, chunk_size=97)
+    per_row = Base(config={"w2": 14})
+    for row in rows:
+        per_row.create_play(row[0], row[1], row[2], int(row[3]), float(row[4]) if len(row) > 4 else 0)
+
+    assert team_weeks(bulk) == team_weeks(per_row)
+    assert {n: t.team_id for n, t in bulk.teams.items()} == {n: t.team_id for n, t in per_row.teams.items()}
+    for column in ('home', 'away', 'home_won', 'week', 'handicap'):
+        assert list(getattr(bulk.plays, column)) == list(getattr(per_row.plays, column))
+    assert {n: {o.name for o in t.opponents} for n, t in bulk.teams.items()} == \
+        {n: {o.name for o in t.opponents} for n, t in per_row.teams.items()}
+
+
+def test_play_table_reads_plays_back():
+    rows = shuffled_rows()
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    for row, play in zip(rows, base.plays):
+        assert (play.home_team.name, play.away_team.name, play.winner, play.week) == \
+            (row[0], row[1], row[2], int(row[3]))
+        assert play.hpd is play.home_team.week_exact(play.week)
+        assert play.apd is play.away_team.week_exact(play.week)
+
+
+def test_loading_rejects_a_team_playing_itself():
+    with pytest.raises(AttributeError):
+        Base().load_plays([["a", "b", "H", 1], ["c", "c", "A", 1]])
@@ -0,0 +1,80 @@
+import csv
+import os
+
+import pytest
+
+from dataPrep.features import Features
+from dataPrep.pipeline import Pipeline, join_games, joined_plays
+
+
+def play(offense, defense, down, distance, yards, play_type):
+    return {'offense': offense, 'defense': defense, 'down': down, 'distance': distance, 'yards_gained': yards,
+            'play_type': play_type}
+
+
+@pytest.fixture
+def weeks():
+    games = [{'home_team': 'Ohio', 'away_team': 'Iowa'}, {'home_team': 'Utah', 'away_team': 'Army'}]
+    plays = [play('Ohio', 'Iowa', 1, 10, 6, 'Rush'),
+             play('Iowa', 'Ohio', 2, 7, 2, 'Pass Reception'),
+             play('Army', 'Utah', 3, 2, 3, 'Rush'),
+             # no game between these two this week
+             play('Ohio', 'Utah', 1, 10, 20, 'Pass Reception'),
+             play('Utah', 'Army', 4, 5.5, 0, 'Sack')]
+    later = [{'home_team': 'Iowa', 'away_team': 'Utah'}]
+    later_plays = [play('Utah', 'Iowa', 1, 10, 12, 'Rush'),
+                   play('Iowa', 'Utah', 3, 8, 1, 'Punt'),
+                   play('Army', 'Ohio', 2, 3, 5, 'Rush')]
+    return [(2019, 1, games, plays), (2019, 2, later, later_plays), (2019, 3, [], [])]
+
+
+def test_join_games_matches_either_side(weeks):
+    year, week, games, plays = weeks[0]
+    joined = list(join_games(plays, games, year, week))
+    assert [(p['offense'], p['home'], p['away']) for p in joined] == [
+        ('Ohio', 'Ohio', 'Iowa'), ('Iowa', 'Ohio', 'Iowa'), ('Army', 'Utah', 'Army'), ('Utah', 'Utah', 'Army')]
+    assert all(p['year'] == 2019 and p['week'] == 1 for p in joined)
+    # the plays are not changed
+    assert 'home' not in plays[0]
+
+
+def test_joined_plays_drop_plays_without_a_game(weeks):
+    joined = list(joined_plays(weeks))
+    assert len(joined) == 6
+    assert [p['week'] for p in joined] == [1, 1, 1, 1, 2, 2]
+
+
+class Rows:
+    """stands for a base, recording the chunks it loads"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def load_plays(self, chunk):
+        self.chunks.append(list(chunk))
+
+
+def test_load_and_collect_give_the_same_rows(weeks):
+    collected = Pipeline().collect(weeks)
+    assert set(collected) == set(Features.categories)
+    expected = Features.segmented_rows(Features.to_columns(list(joined_plays(weeks))))
+    assert collected == expected
+
+    bases = {c: Rows() for c in ('success', 'run_stuff', 'opportunity')}
+    pipeline = Pipeline(chunk_size=2)
+    assert pipeline.load(weeks, bases) is bases
+    assert pipeline.plays == 6
+    for c, base in bases.items():
+        assert all(0 < len(chunk) <= 2 for chunk in base.chunks)
+        assert [row for chunk in base.chunks for row in chunk] == collected[c]
+    assert len(collected['success']) == 6
+
+
+def test_files_are_written_on_the_way(weeks, tmp_path):
+    plays_file = str(tmp_path / "plays.json")
+    pipeline = Pipeline(categories=('success', 'run_stuff'), plays_file=plays_file, csv_dir=str(tmp_path))
+    collected = pipeline.collect(weeks)
+    assert Features(plays_file, label=False).plays == list(joined_plays(weeks))
+    for c, rows in collected.items():
+        with open(os.path.join(str(tmp_path), '{}.csv'.format(c)), newline='') as f:
+            assert list(csv.reader(f)) == [[str(x) for x in row] for row in rows]
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.team import wiener_posterior
+from whr.vectorized import ELO_TO_R, VectorizedBase
+from whr.whole_history_rating import Base
+
+
+@pytest.fixture(scope="module")
+def rows():
+    # a sparse schedule, so teams skip weeks
+    return SyntheticLeague(teams=8, weeks=10, density=0.5, plays_per_game=10, seed=3).rows
+
+
+@pytest.fixture(scope="module", params=[Base, VectorizedBase])
+def base(request, rows):
+    base = request.param(config={"w2": 14})
+    base.load_plays(rows)
+    base.auto_iterate(precision=1e-5)
+    return base
+
+
+@pytest.fixture(scope="module")
+def reference(rows):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    base.auto_iterate(precision=1e-5)
+    base.update_uncertainty()
+    return base
+
+
+def gapped_team(reference):
+    """a team with a gap of several weeks between two weeks it played"""
+    for team in reference.teams.values():
+        for before, after in zip(team.weeks, team.weeks[1:]):
+            if after.week - before.week > 1:
+                return team, before, after
+    raise AssertionError("the league has no gap")
+
+
+def test_weeks_played_give_their_rating(base, reference):
+    for team in reference.teams.values():
+        for w in team.weeks:
+            elo, deviation = base.rating_at(team.name, w.week)
+            assert elo == pytest.approx(w.elo(), abs=1e-3)
+            assert deviation == pytest.approx(math.sqrt(w.uncertainty) / ELO_TO_R, rel=1e-4)
+
+
+def test_between_weeks_played_is_a_brownian_bridge(base, reference):
+    team, before, after = gapped_team(reference)
+    w2 = 14 * ELO_TO_R ** 2
+    span = after.week - before.week
+    for week in range(before.week + 1, after.week):
+        alpha = (week - before.week) / span
+        elo, deviation = base.rating_at(team.name, week)
+        assert elo == pytest.approx((1 - alpha) * before.elo() + alpha * after.elo(), abs=1e-3)
+        variance = wiener_posterior(alpha, span, before.uncertainty, after.uncertainty, before.next_covariance, w2)
+        assert deviation == pytest.approx(math.sqrt(variance) / ELO_TO_R, rel=1e-4)
+
+
+def test_covariances_match_a_dense_inverse(reference):
+    team, _, _ = gapped_team(reference)
+    _, _, lower, diag, upper, _ = team._active_system()
+    dense = np.diag(diag) + np.diag(lower, -1) + np.diag(upper, 1)
+    covariance = np.linalg.inv(-dense)
+    np.testing.assert_allclose([w.uncertainty for w in team.weeks], np.diag(covariance), rtol=1e-8)
+    np.testing.assert_allclose([w.next_covariance for w in team.weeks[:-1]], np.diag(covariance, 1), rtol=1e-8)
+
+
+def test_after_the_last_week_the_variance_grows(base, reference):
+    team = next(iter(reference.teams.values()))
+    last = team.weeks[-1]
+    w2 = 14 * ELO_TO_R ** 2
+    for ahead in (0, 1, 5):
+        elo, deviation = base.rating_at(team.name, last.week + ahead)
+        assert elo == pytest.approx(last.elo(), abs=1e-3)
+        assert deviation == pytest.approx(math.sqrt(last.uncertainty + ahead * w2) / ELO_TO_R, rel=1e-4)
+    assert base.rating_at(team.name) == pytest.approx(base.rating_at(team.name, last.week))
+
+
+def test_before_the_first_week_there_is_no_rating(base, reference):
+    team = max(reference.teams.values(), key=lambda t: t.weeks[0].week)
+    assert team.weeks[0].week > 1
+    assert base.rating_at(team.name, team.weeks[0].week - 1) is None
+    assert base.rating_at("nobody", 3) is None
+
+
+def test_ratings_as_of_matches_rating_at(base, reference):
+    for week in (None, 1, 4, 7, 12):
+        names, elos, deviations = base.ratings_as_of(week)
+        for name, elo, deviation in zip(names, elos, deviations):
+            rating = base.rating_at(name, week)
+            if rating is None:
+                assert math.isnan(elo) and math.isnan(deviation)
+            else:
+                assert (elo, deviation) == pytest.approx(rating)
+
+
+@pytest.mark.parametrize("engine", [Base, VectorizedBase])
+def test_a_loaded_snapshot_gives_the_same_ratings(base, engine, tmp_path):
+    base.update_uncertainty()
+    path = str(tmp_path / "base.npz")
+    base.save_base(path)
+    loaded = engine.load_base(path)
+    names = sorted(base.teams if isinstance(base, Base) else base.names)
+    for week in [None] + list(range(1, 13)):
+        for name in names:
+            assert loaded.rating_at(name, week) == pytest.approx(base.rating_at(name, week), rel=1e-9)
+        np.testing.assert_allclose(loaded.ratings_as_of(week, names)[1:], base.ratings_as_of(week, names)[1:],
+                                   rtol=1e-9)
+
+
+@pytest.mark.parametrize("engine", [Base, VectorizedBase])
+def test_an_empty_base_has_no_rating(engine):
+    base = engine(config={"w2": 14})
+    assert base.rating_at("nobody", 3) is None
+    np.testing.assert_allclose(base.predict_many([("a", "b")], week=3), [0.5])
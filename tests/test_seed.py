@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.multi import MultiBase
+from whr.vectorized import VectorizedBase
+from whr.whole_history_rating import Base
+
+PRECISION = 1e-4
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return SyntheticLeague(teams=8, weeks=6, density=0.8, plays_per_game=10, seed=4).rows
+
+
+@pytest.fixture(scope="module")
+def cold(rows):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    assert base.auto_iterate(precision=PRECISION)[1]
+    return base
+
+
+def elos(base):
+    return dict(base.get_ordered_ratings())
+
+
+def test_seeding_from_the_fit_itself_converges_at_once(rows, cold, tmp_path):
+    path = str(tmp_path / "base.npz")
+    cold.save_base(path)
+    cold_iterations = Base(config={"w2": 14})
+    cold_iterations.load_plays(rows)
+    warm = Base(config={"w2": 14})
+    warm.seed_from_snapshot(path)
+    warm.load_plays(rows)
+    iterations, stable = warm.auto_iterate(precision=PRECISION)
+    assert stable and iterations <= 2
+    assert cold_iterations.auto_iterate(precision=PRECISION)[0] > 20
+    for name, expected in elos(cold).items():
+        np.testing.assert_allclose(elos(warm)[name], expected, atol=1e-3)
+
+
+@pytest.mark.parametrize("engine", [Base, VectorizedBase])
+@pytest.mark.parametrize("before", [True, False])
+def test_unknown_teams_start_from_the_prior(rows, engine, before):
+    names = sorted(set(row[0] for row in rows) | set(row[1] for row in rows))
+    seeds = {name: 100.0 for name in names[1:]}
+    seeds["nobody"] = 50.0
+    base = engine(config={"w2": 14})
+    if before:
+        base.seed_ratings(seeds)
+    base.load_plays(rows)
+    if not before:
+        base.seed_ratings(seeds)
+    start = elos(base)
+    assert "nobody" not in start
+    np.testing.assert_allclose(start[names[0]], 0.0, atol=1e-9)
+    for name in names[1:]:
+        np.testing.assert_allclose(start[name], 100.0)
+
+
+@pytest.mark.parametrize("engine", [Base, VectorizedBase])
+def test_seeded_fits_reach_the_cold_optimum(rows, cold, engine):
+    names = sorted(set(row[0] for row in rows) | set(row[1] for row in rows))
+    base = engine(config={"w2": 14})
+    base.seed_ratings({name: [[1, 300.0 * (i % 3 - 1)], [4, -200.0]] for i, name in enumerate(names)})
+    base.load_plays(rows)
+    assert base.auto_iterate(precision=PRECISION)[1]
+    for name, expected in elos(cold).items():
+        np.testing.assert_allclose(elos(base)[name], expected, atol=1e-2)
+
+
+def test_multibase_seeds_reach_the_team_weeks_built_before_them(rows):
+    names = sorted(set(row[0] for row in rows) | set(row[1] for row in rows))
+    multi = MultiBase(config={"w2": 14})
+    multi.load_plays("a", rows)
+    multi.iterate(1)
+    multi.seed_ratings("a", {name: 100.0 for name in names})
+    multi.seed_ratings("b", {name: -100.0 for name in names})
+    multi.load_plays("b", rows)
+    for category, elo in (("a", 100.0), ("b", -100.0)):
+        for name, elos in multi.get_ordered_ratings(category):
+            np.testing.assert_allclose(elos, elo)
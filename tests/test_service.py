@@ -0,0 +1,91 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.service import RatingsService, RatingsView, make_server
+from whr.snapshot import publish_base
+from whr.vectorized import ELO_TO_R, VectorizedBase
+
+
+@pytest.fixture
+def base():
+    base = VectorizedBase(config={"w2": 14})
+    base.load_plays(SyntheticLeague(teams=6, weeks=5, plays_per_game=10, seed=7).rows)
+    base.auto_iterate()
+    return base
+
+
+@pytest.fixture
+def snapshots(base, tmp_path):
+    publish_base(base, str(tmp_path / "success.npz"))
+    return tmp_path
+
+
+@pytest.fixture
+def client(snapshots):
+    service = RatingsService(str(snapshots))
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+
+    def get(path):
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield service, get
+    connection.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_queries_match_the_base(base, client):
+    _, get = client
+    name = base.names[0]
+    status, rating = get('/ratings/{}?week=3'.format(name.replace(' ', '%20')))
+    assert status == 200
+    assert (rating['elo'], rating['deviation']) == pytest.approx(base.rating_at(name, 3))
+    status, prediction = get('/predict?home={}&away={}&handicap=10'.format(*(n.replace(' ', '%20')
+                                                                              for n in base.names[:2])))
+    assert prediction['probability'] == pytest.approx(
+        base.predict_many([tuple(base.names[:2])], [10], uncertainty=True)[0])
+    status, leaderboard = get('/leaderboard?limit=3')
+    assert [t['name'] for t in leaderboard] == [n for n, _ in base.get_ordered_ratings(current=True)[::-1][:3]]
+    assert get('/ratings/nobody')[0] == 404
+    assert get('/ratings/{}?week=x'.format(name.replace(' ', '%20')))[0] == 400
+    assert get('/nowhere')[0] == 404
+
+
+def test_past_leaderboards_are_bounded(snapshots):
+    view = RatingsView(str(snapshots / "success.npz"))
+    current = view.leaderboard()
+    for week in range(-50, 50):
+        view.leaderboard(week, limit=1)
+    assert len(view._leaderboards) == view.weeks_cached
+    assert view.leaderboard() == current
+
+
+def test_reload_swaps_new_snapshots_and_keeps_the_old_on_errors(base, snapshots, client):
+    service, get = client
+    name = base.names[0].replace(' ', '%20')
+    before = get('/ratings/{}'.format(name))[1]
+    view = service.view()
+
+    base.r[:] += 0.1
+    base.ratings_version += 1
+    publish_base(base, str(snapshots / "success.npz"))
+    assert service.reload()
+    assert service.version == 2
+    assert get('/ratings/{}'.format(name))[1]['elo'] == pytest.approx(before['elo'] + 0.1 / ELO_TO_R)
+    # a request holding the old view still reads it
+    assert view.rating(base.names[0])['elo'] == before['elo']
+
+    with open(str(snapshots / "success.npz"), 'wb') as outfile:
+        outfile.write(b'not a snapshot')
+    assert not service.reload()
+    assert service.version == 2
+    assert get('/health')[1]['categories'] == {'success': len(base.names)}
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.vectorized import VectorizedBase
+from whr.whole_history_rating import Base
+
+
+@pytest.fixture
+def rows():
+    rows = [[str(x) for x in row] for row in SyntheticLeague(teams=8, weeks=4, plays_per_game=10, seed=5).rows]
+    for row in rows[::3]:
+        row.append('20')
+    return rows
+
+
+def fitted(engine, rows):
+    base = engine(config={"w2": 14})
+    base.load_plays(rows)
+    base.auto_iterate()
+    base.update_uncertainty()
+    return base
+
+
+def test_base_round_trip(rows, tmp_path):
+    base = fitted(Base, rows)
+    path = str(tmp_path / "base.npz")
+    base.save_base(path)
+    loaded = Base.load_base(path)
+
+    assert loaded.config["w2"] == 14
+    assert len(loaded.plays) == len(base.plays)
+    assert list(loaded.plays.handicap) == list(base.plays.handicap)
+    for team in base.teams.values():
+        other = loaded.teams[team.name]
+        assert [w.week for w in other.weeks] == [w.week for w in team.weeks]
+        assert [w.r for w in other.weeks] == [w.r for w in team.weeks]
+        assert [w.uncertainty for w in other.weeks] == [w.uncertainty for w in team.weeks]
+        assert [{(o.name, offset): c for (o, offset), c in w.play_counts.items()} for w in other.weeks] == \
+            [{(o.name, offset): c for (o, offset), c in w.play_counts.items()} for w in team.weeks]
+    for name in base.teams:
+        assert loaded.ratings_for_team(name) == base.ratings_for_team(name)
+    # the loaded base fits on from where it was saved
+    assert loaded.auto_iterate()[0] == 1
+
+
+def test_vectorized_round_trip(rows, tmp_path):
+    base = fitted(VectorizedBase, rows)
+    path = str(tmp_path / "base.npz")
+    base.save_base(path)
+    loaded = VectorizedBase.load_base(path)
+
+    assert loaded.names == base.names
+    np.testing.assert_array_equal(loaded.tw_team, base.tw_team)
+    np.testing.assert_array_equal(loaded.tw_week, base.tw_week)
+    np.testing.assert_array_equal(loaded.r, base.r)
+    np.testing.assert_array_equal(loaded.uncertainty, base.uncertainty)
+    np.testing.assert_array_equal(loaded.handicap, base.handicap)
+    for name in base.names:
+        assert loaded.ratings_for_team(name) == base.ratings_for_team(name)
+
+
+def test_snapshots_load_into_either_engine(rows, tmp_path):
+    base = fitted(Base, rows)
+    path = str(tmp_path / "base.npz")
+    base.save_base(path)
+    loaded = VectorizedBase.load_base(path)
+    for name in base.teams:
+        assert loaded.ratings_for_team(name) == base.ratings_for_team(name)
+
+
+def test_version_1_snapshots_still_load(rows, tmp_path):
+    base = fitted(VectorizedBase, rows)
+    path = str(tmp_path / "base.npz")
+    base.save_base(path)
+    with np.load(path) as data:
+        arrays = {f: data[f] for f in data.files if f != 'next_covariance'}
+    arrays['version'] = np.array([1])
+    np.savez(path, **arrays)
+    loaded = VectorizedBase.load_base(path)
+    # without the covariances the uncertainties are recomputed
+    for name in base.names:
+        assert loaded.rating_at(name, 3) == pytest.approx(base.rating_at(name, 3))
@@ -0,0 +1,49 @@
+from benchmarks.league import SyntheticLeague
+from whr.whole_history_rating import Base
+
+
+def league_rows():
+    return SyntheticLeague(teams=8, weeks=5, plays_per_game=10, seed=2).rows
+
+
+def test_update_matches_a_full_fit():
+    rows = league_rows()
+    full = Base(config={"w2": 14})
+    full.load_plays(rows)
+    full.auto_iterate(precision=1e-4)
+
+    incremental = Base(config={"w2": 14})
+    incremental.load_plays([r for r in rows if r[3] < 5])
+    incremental.auto_iterate(precision=1e-4)
+    incremental.add_week([r for r in rows if r[3] == 5])
+    changes = incremental.update(tolerance=1e-4)
+
+    assert set(changes) == {name for name, _, _, week in rows if week == 5} | \
+        {name for _, name, _, week in rows if week == 5}
+    for team in full.teams.values():
+        weeks = {w.week: w for w in incremental.teams[team.name].weeks}
+        for w in team.weeks:
+            assert abs(weeks[w.week].elo() - w.elo()) < 0.01
+
+
+def test_update_skips_teams_without_weeks():
+    base = Base(config={"w2": 14})
+    base.create_play("a", "b", "H", 1)
+    base.auto_iterate()
+    # looked up or seeded teams exist without any week
+    base.team_by_name("c")
+    base.seed_ratings({"d": 100})
+    base.create_play("a", "b", "A", 2)
+    changes = base.update()
+    assert set(changes) == {"a", "b"}
+
+
+def test_update_with_every_week_frozen():
+    base = Base(config={"w2": 14})
+    base.load_plays(league_rows())
+    base.auto_iterate()
+    base.set_window(1)
+    base.auto_iterate()
+    base.create_play("team 0 offense", "team 1 defense", "H", 6)
+    changes = base.update()
+    assert "team 0 offense" in changes
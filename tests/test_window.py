@@ -0,0 +1,88 @@
+import pytest
+
+from benchmarks.league import SyntheticLeague
+from whr.whole_history_rating import Base
+
+WEEKS = 12
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return SyntheticLeague(teams=8, weeks=WEEKS, plays_per_game=10, seed=6).rows
+
+
+@pytest.fixture(scope="module")
+def full(rows):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    base.auto_iterate(precision=1e-4)
+    return base
+
+
+def elos(base, since=None):
+    return {(t.name, w.week): w.elo() for t in base.teams.values() for w in t.weeks
+            if since is None or w.week >= since}
+
+
+def largest_difference(a, b):
+    return max(abs(a[k] - b[k]) for k in a)
+
+
+def test_set_window_does_not_freeze_before_a_fit(rows, full):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    base.set_window(3)
+    assert all(t.frozen == 0 for t in base.teams.values())
+    base.auto_iterate(precision=1e-4)
+    assert any(t.frozen > 0 for t in base.teams.values())
+    assert largest_difference(elos(full), elos(base)) < 0.01
+
+
+def test_refitting_a_frozen_window_keeps_the_ratings(rows):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    base.set_window(3)
+    base.auto_iterate(precision=1e-4)
+    before = elos(base)
+    base.iterate(50)
+    assert largest_difference(before, elos(base)) < 0.01
+
+
+@pytest.mark.parametrize("horizon", [3, 6])
+def test_windowed_update_follows_the_full_fit_on_active_weeks(rows, full, horizon):
+    base = Base(config={"w2": 14})
+    base.load_plays([r for r in rows if r[3] < WEEKS])
+    base.set_window(horizon)
+    base.auto_iterate(precision=1e-4)
+    frozen = {k: v for k, v in elos(base).items() if k[1] <= WEEKS - 1 - horizon}
+    base.add_week([r for r in rows if r[3] == WEEKS])
+    base.update(tolerance=1e-4)
+
+    # frozen weeks do not move, active ones only miss what the new week would have changed in the frozen ones
+    assert largest_difference(frozen, elos(base)) == 0
+    assert largest_difference(elos(full, since=WEEKS - horizon + 1), elos(base, since=WEEKS - horizon + 1)) < 10
+
+
+def test_thaw_refits_every_week(rows, full):
+    base = Base(config={"w2": 14})
+    base.load_plays([r for r in rows if r[3] < WEEKS])
+    base.set_window(3)
+    base.auto_iterate(precision=1e-4)
+    base.add_week([r for r in rows if r[3] == WEEKS])
+    base.set_window(None)
+    base.thaw()
+    base.auto_iterate(precision=1e-4)
+    assert all(t.frozen == 0 for t in base.teams.values())
+    assert largest_difference(elos(full), elos(base)) < 0.01
+
+
+def test_a_play_in_a_frozen_week_thaws_its_teams(rows):
+    base = Base(config={"w2": 14})
+    base.load_plays(rows)
+    base.set_window(3)
+    base.auto_iterate()
+    home, away = rows[0][0], rows[0][1]
+    assert base.teams[home].frozen > 0
+    base.create_play(home, away, "H", 1)
+    assert base.teams[home].frozen == 0
+    assert base.teams[away].frozen == 0
@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+
+
+class Acceleration:
+    """speeds up the outer iteration, the Gauss-Seidel sweeps over teams
+
+    a sweep is a fixed-point map G on the stacked ratings of every active team-week. The first sweeps run plain,
+    until the contraction rate of G, estimated on the changes of two successive sweeps, has settled (the first
+    sweeps only damp the fast modes). It gives the number of plain sweeps the fit would have needed (see
+    plain_iterations). Then each scheme either over-relaxes the sweeps (omega) or proposes a point extrapolated
+    from the previous iterates (extrapolate), which the caller keeps only if the log posterior does not decrease
+    (see reject)
+
+    Attributes:
+        omega (float): the relaxation factor of the Newton steps of the next sweep
+        shifts (list[float]): the largest change of r of each sweep
+        rate (float): the contraction rate of the plain sweeps, None until the warmup is over
+        extrapolations (int): the proposals kept
+        rejections (int): the proposals or sweeps rejected by the log posterior safeguard
+    """
+
+    warmup = 10
+    max_warmup = 30
+
+    def __init__(self):
+        self.omega = 1.0
+        self.shifts = []
+        self.rate = None
+        self.extrapolations = 0
+        self.rejections = 0
+        self._rates = []
+        self._change = None
+        self._plain = None
+
+    @property
+    def warming_up(self):
+        return self._plain is None
+
+    def observe(self, x, gx):
+        """records a sweep
+
+        Args:
+            x (np.ndarray): the ratings before the sweep
+            gx (np.ndarray): the ratings after the sweep
+        """
+        change = gx - x
+        shift = float(np.max(np.abs(change), initial=0.0))
+        self.shifts.append(shift)
+        if not self.warming_up:
+            return
+        if self._change is not None:
+            previous = self._change @ self._change
+            if previous > 0:
+                self._rates.append(float(self._change @ change) / previous)
+        self._change = change
+        settled = len(self._rates) >= 2 and abs(self._rates[-1] - self._rates[-2]) < 0.005
+        if (len(self.shifts) >= self.warmup and settled) or len(self.shifts) >= self.max_warmup:
+            if self._rates and 0 < self._rates[-1] < 1:
+                self.rate = self._rates[-1]
+            self._plain = (len(self.shifts), shift)
+            self._change = None
+            self.start()
+
+    def start(self):
+        """called when the warmup is over"""
+
+    def extrapolate(self, x, gx):
+        """proposes the next iterate
+
+        Args:
+            x (np.ndarray): the ratings before the sweep
+            gx (np.ndarray): the ratings after the sweep
+
+        Returns:
+            np.ndarray: the proposed ratings, None to keep gx
+        """
+        return None
+
+    def accept(self):
+        self.extrapolations += 1
+
+    def reject(self):
+        """the log posterior decreased, falls back to plain sweeps"""
+        self.rejections += 1
+
+    def plain_iterations(self, tolerance):
+        """estimates the number of plain sweeps needed until a sweep moves r by less than tolerance
+
+        Args:
+            tolerance (float): the shift of r at which the fit stops
+
+        Returns:
+            int: the estimate, None when the contraction rate is unknown
+        """
+        if self.rate is None:
+            return None
+        sweeps, shift = self._plain
+        if shift <= tolerance:
+            return sweeps
+        return sweeps + int(math.ceil(math.log(tolerance / shift) / math.log(self.rate)))
+
+
+class OverRelaxation(Acceleration):
+    """successive over-relaxation: every Newton step of a sweep is stretched by omega
+
+    omega is set after the warmup from the contraction rate rho of the plain sweeps to the optimum
+    2 / (1 + sqrt(1 - rho)), and falls back halfway to 1 each time the log posterior decreases
+    """
+
+    def __init__(self, max_omega=1.95):
+        super().__init__()
+        self.max_omega = max_omega
+
+    def start(self):
+        if self.rate is not None:
+            self.omega = min(2.0 / (1.0 + math.sqrt(1.0 - self.rate)), self.max_omega)
+
+    def accept(self):
+        pass
+
+    def reject(self):
+        super().reject()
+        self.omega = 1.0 + (self.omega - 1.0) / 2
+
+
+class Anderson(Acceleration):
+    """Anderson extrapolation: the next iterate combines the last sweeps so that their residuals G(x) - x cancel
+
+    Args:
+        depth (int, optional): the number of previous sweeps combined
+    """
+
+    def __init__(self, depth=5):
+        super().__init__()
+        self.depth = depth
+        self._g = []
+        self._f = []
+
+    def extrapolate(self, x, gx):
+        if self.warming_up:
+            return None
+        self._g.append(gx)
+        self._f.append(gx - x)
+        if len(self._f) > self.depth + 1:
+            del self._g[0], self._f[0]
+        if len(self._f) < 2:
+            return None
+        df = np.diff(np.array(self._f), axis=0)
+        dg = np.diff(np.array(self._g), axis=0)
+        gamma = np.linalg.lstsq(df.T, self._f[-1], rcond=None)[0]
+        return gx - gamma @ dg
+
+    def reject(self):
+        super().reject()
+        self._g, self._f = [], []
+
+
+class Aitken(Acceleration):
+    """vector Aitken extrapolation: after two plain sweeps x0 -> x1 -> x2, jumps to where the geometric series of
+    their changes ends
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._previous = None
+
+    def extrapolate(self, x, gx):
+        if self.warming_up:
+            return None
+        if self._previous is None or not np.array_equal(self._previous[1], x):
+            self._previous = (x, gx)
+            return None
+        x0, x1 = self._previous
+        self._previous = None
+        d1, d2 = x1 - x0, gx - x1
+        dd = d2 - d1
+        denominator = dd @ dd
+        if denominator == 0:
+            return None
+        return gx - (d2 @ dd) / denominator * d2
+
+
+SCHEMES = {
+    'sor': OverRelaxation,
+    'anderson': Anderson,
+    'aitken': Aitken,
+}
+
+
+def make_acceleration(config):
+    """creates the acceleration chosen by config["acceleration"], see SCHEMES
+
+    config["anderson_depth"] sets the depth of "anderson"
+
+    Returns:
+        Acceleration: the acceleration, None without one
+    """
+    name = config.get("acceleration")
+    if name is None:
+        return None
+    if name not in SCHEMES:
+        raise (AttributeError("Unknown acceleration {}, expected one of {}".format(name, sorted(SCHEMES))))
+    if name == 'anderson' and config.get("anderson_depth") is not None:
+        return Anderson(config["anderson_depth"])
+    return SCHEMES[name]()
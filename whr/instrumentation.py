@@ -0,0 +1,118 @@
+import cProfile
+import json
+import pstats
+
+
+class IterationEvent:
+    """what happened during one iteration of a Base
+
+    Attributes:
+        iteration (int): the number of iterations run so far by the base
+        newton_seconds (float): the time spent in the Newton steps of the sweep
+        stability_seconds (float): the time spent tracking which teams converged
+        uncertainty_seconds (float): the time spent updating uncertainties since the previous event
+        teams (int): the number of teams that took a Newton step
+        play_terms (int): the number of weighted play terms evaluated by those teams
+        max_shift (float): the largest change of a weekly elo
+        active_teams (int): the number of teams left to update, None when every team is updated each iteration
+        log_likelihood (float): the log likelihood after the iteration, None unless the observer asks for it
+        slowest_teams (list[tuple(str, float)]): the teams with the slowest Newton steps, with their time
+    """
+
+    __slots__ = ('iteration', 'newton_seconds', 'stability_seconds', 'uncertainty_seconds', 'teams', 'play_terms',
+                 'max_shift', 'active_teams', 'log_likelihood', 'slowest_teams')
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Observer:
+    """receives the events of a Base, set it with base.observer = observer
+
+    nothing is measured while base.observer is None
+
+    Attributes:
+        log_likelihood (bool): True to compute the log likelihood after every iteration (a full pass over all plays)
+        slowest (int): the number of slowest teams reported in each event
+    """
+
+    log_likelihood = False
+    slowest = 5
+
+    def start(self, base):
+        """called when auto_iterate starts"""
+
+    def iteration(self, event):
+        """called after every iteration
+
+        Args:
+            event (IterationEvent): what happened
+        """
+
+    def finish(self, base, iterations, stable, uncertainty_seconds):
+        """called when auto_iterate returns
+
+        Args:
+            base (Base): the base
+            iterations (int): the number of iterations run
+            stable (bool): True if it reached stability
+            uncertainty_seconds (float): the time spent in the final uncertainty update
+        """
+
+
+class JsonLinesObserver(Observer):
+    """writes every event as one json object per line"""
+
+    def __init__(self, path, log_likelihood=True):
+        self.path = path
+        self.log_likelihood = log_likelihood
+        self._file = None
+
+    def _write(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def start(self, base):
+        self._write({'event': 'start', 'teams': len(base.teams), 'plays': len(base.plays)})
+
+    def iteration(self, event):
+        self._write(dict(event.as_dict(), event='iteration'))
+
+    def finish(self, base, iterations, stable, uncertainty_seconds):
+        self._write({'event': 'finish', 'iterations': iterations, 'stable': stable,
+                     'uncertainty_seconds': uncertainty_seconds, 'iterations_saved': base.iterations_saved})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ProfileObserver(Observer):
+    """captures a cProfile of everything auto_iterate runs, and dumps it to path when it returns"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start(self, base):
+        self.profile.enable()
+
+    def finish(self, base, iterations, stable, uncertainty_seconds):
+        self.profile.disable()
+        if self.path is not None:
+            self.profile.dump_stats(self.path)
+
+    def stats(self):
+        """gets the captured profile
+
+        Returns:
+            pstats.Stats: the statistics
+        """
+        return pstats.Stats(self.profile)
@@ -0,0 +1,458 @@
+import csv
+import math
+import time
+from itertools import islice
+
+import numpy as np
+
+from whr.seed import parse_seeds, seeded_r
+from whr.vectorized import ELO_TO_R, VectorizedBase, color_teams, unique_rows
+from whr.whole_history_rating import UnstableRatingException
+
+
+class MultiBase:
+    """fits many categories of plays between the same teams at once
+
+    the team-week index, the matchups and the coloring of the team graph are built once for the union of every
+    category's plays, and ratings are a (team-weeks, categories) matrix whose columns all take the same batched
+    Newton steps as VectorizedBase
+
+    a team-week without plays in a category only carries the Wiener process prior in that category: its rating
+    follows its neighbours and does not change the fit of the other weeks, which is then the same as fitting each
+    category in its own base. Results only report the team-weeks each category played
+    """
+
+    def __init__(self, categories=None, config=None):
+        """
+        Args:
+            categories (list[str], optional): the categories, more are added as plays reference them
+            config (dict, optional): the config, like the one of Base
+        """
+        if config is None:
+            config = {}
+        self.config = config
+        if self.config.get("debug") is None:
+            self.config["debug"] = False
+        if self.config.get("w2") is None:
+            self.config["w2"] = 300.0
+        self.w2 = (math.sqrt(self.config["w2"]) * ELO_TO_R) ** 2  # Convert from elo^2 to r^2
+        self.names = []
+        self.team_ids = {}
+        # the known ratings of each category teams start from, see seed_ratings
+        self.seeds = {}
+        self.categories = []
+        self.category_ids = {}
+        for c in categories or []:
+            self.category_id(c)
+        self._category = []
+        self._home = []
+        self._away = []
+        self._home_won = []
+        self._week = []
+        self._handicap = []
+        self._dirty = False
+        self.ratings_version = 0
+        self._uncertainty_version = None
+        self.r = np.zeros((0, 0))
+        self.uncertainty = np.zeros((0, 0))
+        self.tw_team = np.zeros(0, dtype=np.int64)
+        self.tw_week = np.zeros(0, dtype=np.int64)
+        self.team_start = np.zeros(1, dtype=np.int64)
+        self._build()
+
+    def team_id(self, name):
+        """gets the integer id of a team, registering the name if it is new"""
+        tid = self.team_ids.get(name)
+        if tid is None:
+            tid = len(self.names)
+            self.team_ids[name] = tid
+            self.names.append(name)
+        return tid
+
+    def category_id(self, category):
+        """gets the column of a category, registering the category if it is new"""
+        cid = self.category_ids.get(category)
+        if cid is None:
+            cid = len(self.categories)
+            self.category_ids[category] = cid
+            self.categories.append(category)
+        return cid
+
+    def seed_ratings(self, category, ratings):
+        """warm starts the fit of a category from known ratings, like Base.seed_ratings
+
+        Args:
+            category (str): the category
+            ratings (dict[str, float|list]|list[tuple]): for each team name, its elo, or its [week, elo, ...] for
+                each known week, see whr.seed.parse_seeds
+        """
+        seeds = parse_seeds(ratings)
+        self.seeds.setdefault(category, {}).update(seeds)
+        self._ensure_built()
+        c = self.category_id(category)
+        if c < self.r.shape[1]:
+            for name, seed in seeds.items():
+                tid = self.team_ids.get(name)
+                if tid is not None:
+                    start, end = self.team_start[tid], self.team_start[tid + 1]
+                    self.r[start:end, c] = [seeded_r(seed, w) for w in self.tw_week[start:end].tolist()]
+        self.ratings_version += 1
+
+    def create_play(self, category, home, away, winner, time_step, handicap=0):
+        """creates a new play of a category
+
+        Args:
+            category (str): the category
+            home (str): the home name
+            away (str): the away name
+            winner (str): "H" if home won, "A" if away won
+            time_step (int): the week of the match from origin
+            handicap (float, optional): elo bonus given to the home team
+        """
+        if home == away:
+            raise (AttributeError("Invalid play (home team == away team)"))
+        self._category.append(self.category_id(category))
+        self._home.append(self.team_id(home))
+        self._away.append(self.team_id(away))
+        self._home_won.append(winner == "H")
+        self._week.append(int(time_step))
+        self._handicap.append(handicap)
+        self._dirty = True
+        self.ratings_version += 1
+
+    def load_plays(self, category, games, separator=',', chunk_size=10000):
+        """loads all games of a category at once, streaming the file in chunks
+
+        Args:
+            category (str): the category
+            games (str|iterable[list[str]]): a csv path or rows of "home_name,away_name,winner,time_step,handicap"
+            separator (str, optional): the csv delimiter
+            chunk_size (int, optional): the number of rows appended at once
+        """
+        if isinstance(games, str):
+            with open(games, 'r', newline='') as f:
+                self._load_rows(category, csv.reader(f, delimiter=separator), chunk_size)
+        else:
+            self._load_rows(category, games, chunk_size)
+
+    def _load_rows(self, category, rows, chunk_size):
+        cid = self.category_id(category)
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if any(line[0] == line[1] for line in chunk):
+                raise (AttributeError("Invalid play (home team == away team)"))
+            self._category.extend([cid] * len(chunk))
+            self._home.extend(self.team_id(line[0]) for line in chunk)
+            self._away.extend(self.team_id(line[1]) for line in chunk)
+            self._home_won.extend(line[2] == "H" for line in chunk)
+            self._week.extend(int(line[3]) for line in chunk)
+            self._handicap.extend(float(line[4]) if len(line) > 4 and line[4] != '' else 0 for line in chunk)
+            self._dirty = True
+            self.ratings_version += 1
+
+    def _build(self):
+        """builds the shared team-week index and the per category matchup weights, keeping known ratings"""
+        old = {}
+        for i, (t, w) in enumerate(zip(self.tw_team.tolist(), self.tw_week.tolist())):
+            old[(t, w)] = self.r[i]
+        category = np.asarray(self._category, dtype=np.int64)
+        home = np.asarray(self._home, dtype=np.int64)
+        away = np.asarray(self._away, dtype=np.int64)
+        home_won = np.asarray(self._home_won, dtype=np.float64)
+        week = np.asarray(self._week, dtype=np.int64)
+        hk = np.asarray(self._handicap, dtype=np.float64) * ELO_TO_R
+        team_count = len(self.names)
+        k = len(self.categories)
+        n_plays = len(home)
+
+        (self.tw_team, self.tw_week), inverse = unique_rows(np.concatenate([home, away]),
+                                                            np.concatenate([week, week]))
+        n = len(self.tw_team)
+
+        # the same matchup in every category is one term, weighted by its plays and home wins in each column
+        (self.m_home, self.m_away, self.m_hk), group = unique_rows(inverse[:n_plays], inverse[n_plays:], hk)
+        m = len(self.m_home)
+        self.m_count = np.bincount(group * k + category, minlength=m * k).astype(np.float64).reshape(m, k)
+        self.m_wins = np.bincount(group * k + category, home_won, minlength=m * k).reshape(m, k)
+
+        self.team_start = np.searchsorted(self.tw_team, np.arange(team_count + 1))
+        counts = np.diff(self.team_start)
+        self.pos = np.arange(n) - self.team_start[self.tw_team]
+        self.max_weeks = int(counts.max()) if team_count > 0 else 0
+        self.single = counts[self.tw_team] == 1
+
+        # the team-weeks each category played, and the first of them for each team, which gets the virtual plays
+        self.present = np.zeros((n, k), dtype=bool)
+        self.present[inverse, np.concatenate([category, category])] = True
+        seen = np.cumsum(self.present, axis=0)
+        before = np.zeros((n, k), dtype=np.int64)
+        starts = self.team_start[self.tw_team]
+        has_before = starts > 0
+        before[has_before] = seen[starts[has_before] - 1]
+        self.first = self.present & (seen - before == 1)
+
+        self.has_next = np.zeros(n, dtype=bool)
+        self.has_next[:-1] = self.tw_team[1:] == self.tw_team[:-1]
+        self.sigma2 = np.zeros(n)
+        self.sigma2[:-1] = np.abs(self.tw_week[1:] - self.tw_week[:-1]) * self.w2
+        self.inv_sigma2 = np.zeros(n)
+        self.inv_sigma2[self.has_next] = 1.0 / self.sigma2[self.has_next]
+
+        r = np.zeros((n, k))
+        first_week = self.pos == 0
+        seeds = [self.seeds.get(c, {}) for c in self.categories]
+        weeks = self.tw_week.tolist()
+        for i, (t, w) in enumerate(zip(self.tw_team.tolist(), weeks)):
+            known = old.get((t, w), ())
+            r[i, :len(known)] = known
+            # new team-weeks, and the columns of categories added since the last build, start from their seed or
+            # the previous week, like VectorizedBase
+            name = self.names[t]
+            for c in range(len(known), k):
+                if first_week[i]:
+                    r[i, c] = seeded_r(seeds[c].get(name), w)
+                else:
+                    r[i, c] = seeded_r(seeds[c].get(name), w, weeks[i - 1], r[i - 1, c])
+        self.r = r
+        self.uncertainty = np.zeros((n, k))
+
+        colors = color_teams(home, away, team_count)
+        home_color = colors[self.tw_team[self.m_home]]
+        away_color = colors[self.tw_team[self.m_away]]
+        self.color_groups = []
+        for c in range(int(colors.max()) + 1 if team_count > 0 else 0):
+            teams = np.flatnonzero(colors == c)
+            self.color_groups.append((teams, np.flatnonzero(home_color == c), np.flatnonzero(away_color == c)))
+        self._dirty = False
+
+    def _ensure_built(self):
+        if self._dirty:
+            self._build()
+
+    def _team_weeks(self, teams):
+        starts = self.team_start[teams]
+        counts = self.team_start[teams + 1] - starts
+        return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    def _padded(self, teams, values, fill):
+        """lays out per team-week rows as a (teams * categories, max_weeks) matrix padded with fill"""
+        k = len(self.categories)
+        out = np.full((len(teams), k, self.max_weeks), fill, dtype=np.float64)
+        counts = self.team_start[teams + 1] - self.team_start[teams]
+        rows = np.repeat(np.arange(len(teams)), counts)
+        idx = self._team_weeks(teams)
+        out[rows, :, self.pos[idx]] = values[idx] if values.ndim == 2 else values[idx, None]
+        return out.reshape(-1, self.max_weeks), rows, idx
+
+    def _derivatives(self, home_matchups, away_matchups):
+        """gradient and hessian diagonal of the play likelihood for every team-week and category"""
+        n, k = self.r.shape
+        g = np.zeros(n * k)
+        h = np.zeros(n * k)
+        columns = np.arange(k)
+        for m, sign in ((home_matchups, 1.0), (away_matchups, -1.0)):
+            hw = self.m_home[m]
+            aw = self.m_away[m]
+            count = self.m_count[m]
+            p = 1.0 / (1.0 + np.exp(self.r[aw] - self.r[hw] - self.m_hk[m, None]))
+            target = ((hw if sign > 0 else aw)[:, None] * k + columns).reshape(-1)
+            won = self.m_wins[m] if sign > 0 else count - self.m_wins[m]
+            expected = p if sign > 0 else 1.0 - p
+            g += np.bincount(target, (won - count * expected).reshape(-1), minlength=n * k)
+            h -= np.bincount(target, (count * p * (1.0 - p)).reshape(-1), minlength=n * k)
+        g = g.reshape(n, k)
+        h = h.reshape(n, k)
+        gamma = np.exp(self.r[self.first])
+        g[self.first] += 1.0 - 2.0 * gamma / (gamma + 1.0)
+        h[self.first] -= 2.0 * gamma / (gamma + 1.0) ** 2
+        return g, h
+
+    def _prior(self, g, h):
+        """adds the Wiener process prior between consecutive weeks to the gradient and hessian diagonal"""
+        dr = np.zeros(self.r.shape)
+        dr[:-1] = (self.r[:-1] - self.r[1:]) * self.inv_sigma2[:-1, None]
+        g -= dr
+        g[1:] += dr[:-1]
+        h -= self.inv_sigma2[:, None]
+        h[1:] -= self.inv_sigma2[:-1, None]
+        h[~self.single] -= 0.001
+        # keeps the system of a team that never played a category (only the prior, or nothing) invertible
+        h[self.single[:, None] & ~self.present] -= 0.001
+        return g, h
+
+    def _update_teams(self, teams, home_plays, away_plays):
+        g, h = self._prior(*self._derivatives(home_plays, away_plays))
+        k = len(self.categories)
+        hp, rows, idx = self._padded(teams, h, 1.0)
+        gp, _, _ = self._padded(teams, g, 0.0)
+        bp, _, _ = self._padded(teams, self.inv_sigma2, 0.0)
+        x = VectorizedBase._solve_tridiagonal(hp, bp, gp).reshape(len(teams), k, self.max_weeks)
+        new_r = self.r[idx] - x[rows, :, self.pos[idx]]
+        if np.any(new_r > 650):
+            raise UnstableRatingException("unstable r on team")
+        self.r[idx] = new_r
+
+    def _run_one_iteration(self):
+        """runs one iteration for every category, one batched Newton step per color of teams"""
+        for teams, home_plays, away_plays in self.color_groups:
+            self._update_teams(teams, home_plays, away_plays)
+        self.ratings_version += 1
+
+    def update_uncertainty(self):
+        """computes the variance of every team-week in every category, if ratings changed"""
+        self._ensure_built()
+        if self._uncertainty_version == self.ratings_version:
+            return
+        if len(self.r) == 0:
+            self.uncertainty = np.zeros(self.r.shape)
+            self._uncertainty_version = self.ratings_version
+            return
+        every = np.arange(len(self.m_home))
+        _, h = self._prior(*self._derivatives(every, every))
+        teams = np.arange(len(self.names))
+        k = len(self.categories)
+        d, rows, idx = self._padded(teams, h, 1.0)
+        b, _, _ = self._padded(teams, self.inv_sigma2, 0.0)
+        m = d.shape[1]
+        df = d.copy()
+        for i in range(1, m):
+            df[:, i] -= b[:, i - 1] ** 2 / df[:, i - 1]
+        db = d.copy()
+        for i in range(m - 2, -1, -1):
+            db[:, i] -= b[:, i] ** 2 / db[:, i + 1]
+        v = np.empty_like(d)
+        v[:, :-1] = db[:, 1:] / (b[:, :-1] ** 2 - df[:, :-1] * db[:, 1:])
+        v[:, -1] = -1 / df[:, -1]
+        self.uncertainty = np.zeros(self.r.shape)
+        self.uncertainty[idx] = v.reshape(len(teams), k, m)[rows, :, self.pos[idx]]
+        self._uncertainty_version = self.ratings_version
+
+    def iterate(self, count):
+        """do a number of "count" iterations of the algorithm on every category
+
+        Args:
+            count (int): the number of iterations desired
+        """
+        self._ensure_built()
+        for _ in range(count):
+            self._run_one_iteration()
+
+    def auto_iterate(self, time_limit=10, precision=10E-3, monitor=False):
+        """iterates until the elo of every team-week of every category moves less than precision between two rounds
+        of 10 iterations
+
+        Args:
+            time_limit (int, optional): the maximal time after which no more iteration are launched
+            precision (float, optional): the precision of the stability desired
+
+        Returns:
+            tuple(int, bool): the number of iterations and True if it has reached stability, False otherwise
+        """
+        start = time.time()
+        self.iterate(10)
+        a = self.r.copy()
+        i = 10
+        while True:
+            if monitor:
+                print("Elapsed time: {}".format(time.time() - start))
+            self.iterate(10)
+            i += 10
+            if np.max(np.abs(self.r - a), initial=0.0) / ELO_TO_R <= precision:
+                self.update_uncertainty()
+                return i, True
+            if time.time() - start > time_limit:
+                self.update_uncertainty()
+                return i, False
+            a = self.r.copy()
+
+    def _team_weeks_played(self, category, name):
+        """gets the team-week indices a team played in a category"""
+        self._ensure_built()
+        tid = self.team_ids.get(name)
+        if tid is None or category not in self.category_ids:
+            return np.zeros(0, dtype=np.int64)
+        s = np.arange(self.team_start[tid], self.team_start[tid + 1])
+        return s[self.present[s, self.category_ids[category]]]
+
+    def ratings_for_team(self, category, name, current=False):
+        """gets all rating for each week played for the team in a category
+
+        Args:
+            category (str): the category
+            name (str): the team's name
+
+        Returns:
+            list[list[int,float,float]]: for each week, the time_step the elo the uncertainty
+        """
+        idx = self._team_weeks_played(category, name)
+        self.update_uncertainty()
+        c = self.category_ids.get(category)
+        weeks, elos, uncertainty = self.tw_week[idx], self.r[idx, c] / ELO_TO_R, self.uncertainty[idx, c]
+        if current:
+            return round(elos[-1]), round(uncertainty[-1] * 100)
+        return [[int(w), round(e), round(u * 100)] for w, e, u in zip(weeks, elos, uncertainty)]
+
+    def get_ordered_ratings(self, category, current=False, compact=False):
+        """gets all ratings for each team that played a category (for each week it played) ordered
+
+        Args:
+            category (str): the category
+            current (bool, optional): True to let only the last estimation of the elo, False gets all estimation for each week played
+            compact (bool, optional): True to get only a list of elos, False to get the name before
+
+        Returns:
+            list[list[float]]: for each team and each week in the season, the corresponding elo
+        """
+        self._ensure_built()
+        c = self.category_ids[category]
+        played = []
+        for name in self.names:
+            idx = self._team_weeks_played(category, name)
+            if len(idx) > 0:
+                played.append((name, self.r[idx, c] / ELO_TO_R))
+        played.sort(key=lambda x: x[1][-1])
+        result = []
+        for name, elos in played:
+            if current:
+                result.append((name, elos[-1]))
+            elif compact:
+                result.append(elos.tolist())
+            else:
+                result.append((name, elos.tolist()))
+        return result
+
+    def ratings(self, current=True):
+        """gets the ordered ratings of every category
+
+        Returns:
+            dict[str, list]: get_ordered_ratings of each category
+        """
+        return {c: self.get_ordered_ratings(c, current=current) for c in self.categories}
+
+    def log_likelihood(self, category):
+        """gets the likelihood of the current state of a category
+
+        Args:
+            category (str): the category
+
+        Returns:
+            float: the likelihood
+        """
+        self._ensure_built()
+        c = self.category_ids[category]
+        r, present, first = self.r[:, c], self.present[:, c], self.first[:, c]
+        x = r[self.m_home] - r[self.m_away] + self.m_hk
+        wins, count = self.m_wins[:, c], self.m_count[:, c]
+        # every play counts once for each of its teams, like Base
+        score = -2 * np.sum(wins * np.logaddexp(0.0, -x) + (count - wins) * np.logaddexp(0.0, x))
+        score -= 2 * np.sum(np.logaddexp(0.0, r[first])) - np.sum(r[first])
+        # the prior between the consecutive weeks the team played in this category
+        idx = np.flatnonzero(present)
+        same = self.tw_team[idx[1:]] == self.tw_team[idx[:-1]]
+        dr = (r[idx[1:]] - r[idx[:-1]])[same]
+        s2 = (np.abs(self.tw_week[idx[1:]] - self.tw_week[idx[:-1]]) * self.w2)[same]
+        score -= np.sum(0.5 * dr ** 2 / s2 + 0.5 * np.log(2 * math.pi * s2))
+        return float(score)
@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class SparseNewton:
+    """global Newton steps on the ratings of every team-week at once
+
+    minus the hessian of the log posterior is A = D + P - C: D the curvature of each team-week's own plays (and
+    virtual plays), P the Wiener process prior, tridiagonal within each team, and C the couplings between the two
+    team-weeks of each matchup. Newton's system A x = g is solved by conjugate gradient, preconditioned by the
+    block tridiagonal D + P, which is exactly what the per-team Newton steps invert. The couplings are what the
+    Gauss-Seidel sweeps take hundreds of iterations to propagate
+
+    matchups are directed: the team-week of rows plays the team-week of cols, so each play appears once from
+    each side, except against team-weeks outside of r (a frozen week, see Team.freeze), given by cols = -1 and
+    their fixed rating
+
+    Attributes:
+        cg_iterations (int): the conjugate gradient iterations of the last step
+    """
+
+    def __init__(self, team_start, inv_sigma2, first, rows, cols, offset, wins, losses, fixed=None, prior_index=None,
+                 prior_mean=None, prior_variance=None):
+        """
+        Args:
+            team_start (np.ndarray): where each team's weeks start in r, with a last entry len(r)
+            inv_sigma2 (np.ndarray): 1 / sigma2 between each team-week and the next one of its team, 0 at the end
+            first (np.ndarray): True for the team-weeks that get a virtual win and loss against gamma = 1
+            rows (np.ndarray): the team-week of each directed matchup
+            cols (np.ndarray): the opponent team-week, -1 for an opponent outside of r
+            offset (np.ndarray): the r added to the opponent (handicap)
+            wins (np.ndarray): the plays won by the team-week of rows
+            losses (np.ndarray): the plays lost
+            fixed (np.ndarray, optional): the r of the opponents outside of r, where cols is -1
+            prior_index (np.ndarray, optional): the team-weeks with an extra Gaussian prior
+            prior_mean (np.ndarray, optional): its mean
+            prior_variance (np.ndarray, optional): its variance
+        """
+        self.team_start = np.asarray(team_start, dtype=np.int64)
+        self.inv_sigma2 = np.asarray(inv_sigma2, dtype=np.float64)
+        self.first = np.asarray(first, dtype=bool)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.wins = np.asarray(wins, dtype=np.float64)
+        self.losses = np.asarray(losses, dtype=np.float64)
+        self.inside = self.cols >= 0
+        self.fixed = np.zeros(len(self.rows)) if fixed is None else np.asarray(fixed, dtype=np.float64)
+        self.prior_index = np.asarray([] if prior_index is None else prior_index, dtype=np.int64)
+        self.prior_mean = np.zeros(0) if prior_mean is None else np.asarray(prior_mean, dtype=np.float64)
+        self.prior_variance = np.ones(0) if prior_variance is None else np.asarray(prior_variance, dtype=np.float64)
+        self.n = len(self.inv_sigma2)
+        teams = len(self.team_start) - 1
+        counts = np.diff(self.team_start)
+        self.team = np.repeat(np.arange(teams), counts)
+        self.pos = np.arange(self.n) - self.team_start[self.team]
+        self.max_weeks = int(counts.max()) if teams > 0 else 0
+        self.cg_iterations = 0
+
+    def _margin(self, r):
+        opponent = np.where(self.inside, r[np.maximum(self.cols, 0)], self.fixed)
+        return r[self.rows] - opponent - self.offset
+
+    def derivatives(self, r):
+        """gets the gradient of the log posterior, the diagonal of D + P and the couplings C
+
+        Returns:
+            tuple(np.ndarray, np.ndarray, np.ndarray): the gradient, the diagonal, and the coupling of each matchup
+        """
+        p = 1.0 / (1.0 + np.exp(-self._margin(r)))
+        count = self.wins + self.losses
+        g = np.bincount(self.rows, self.wins - count * p, minlength=self.n)
+        curvature = count * p * (1.0 - p)
+        d = np.bincount(self.rows, curvature, minlength=self.n)
+        gamma = np.exp(r[self.first])
+        g[self.first] += 1.0 - 2.0 * gamma / (gamma + 1.0)
+        d[self.first] += 2.0 * gamma / (gamma + 1.0) ** 2
+        dr = np.zeros(self.n)
+        dr[:-1] = (r[:-1] - r[1:]) * self.inv_sigma2[:-1]
+        g -= dr
+        g[1:] += dr[:-1]
+        d += self.inv_sigma2
+        d[1:] += self.inv_sigma2[:-1]
+        g[self.prior_index] -= (r[self.prior_index] - self.prior_mean) / self.prior_variance
+        d[self.prior_index] += 1.0 / self.prior_variance
+        return g, d, np.where(self.inside, curvature, 0.0)
+
+    def log_posterior(self, r):
+        """gets the log posterior, up to a constant"""
+        x = self._margin(r)
+        # a play between two team-weeks of r is seen from both sides
+        weight = np.where(self.inside, 0.5, 1.0)
+        score = -np.sum(weight * (self.wins * np.logaddexp(0.0, -x) + self.losses * np.logaddexp(0.0, x)))
+        score -= 2 * np.sum(np.logaddexp(0.0, r[self.first])) - np.sum(r[self.first])
+        score -= 0.5 * np.sum((r[1:] - r[:-1]) ** 2 * self.inv_sigma2[:-1])
+        score -= 0.5 * np.sum((r[self.prior_index] - self.prior_mean) ** 2 / self.prior_variance)
+        return float(score)
+
+    def _multiply(self, d, c, v):
+        """A v"""
+        result = d * v
+        result[:-1] -= self.inv_sigma2[:-1] * v[1:]
+        result[1:] -= self.inv_sigma2[:-1] * v[:-1]
+        result -= np.bincount(self.rows[self.inside], c[self.inside] * v[self.cols[self.inside]], minlength=self.n)
+        return result
+
+    def _factor(self, d):
+        """forward elimination of the block tridiagonal preconditioner D + P, every team at once"""
+        teams = len(self.team_start) - 1
+        dp = np.ones((teams, self.max_weeks))
+        bp = np.zeros((teams, self.max_weeks))
+        dp[self.team, self.pos] = d
+        bp[self.team, self.pos] = -self.inv_sigma2
+        for i in range(1, self.max_weeks):
+            dp[:, i] -= bp[:, i - 1] ** 2 / dp[:, i - 1]
+        return dp, bp
+
+    def _precondition(self, factor, y):
+        dp, bp = factor
+        z = np.zeros(dp.shape)
+        z[self.team, self.pos] = y
+        for i in range(1, self.max_weeks):
+            z[:, i] -= bp[:, i - 1] / dp[:, i - 1] * z[:, i - 1]
+        z[:, -1] /= dp[:, -1]
+        for i in range(self.max_weeks - 2, -1, -1):
+            z[:, i] = (z[:, i] - bp[:, i] * z[:, i + 1]) / dp[:, i]
+        return z[self.team, self.pos]
+
+    def direction(self, r, tolerance=1e-10, max_iterations=None):
+        """solves A x = g by preconditioned conjugate gradient
+
+        Args:
+            r (np.ndarray): the ratings
+            tolerance (float, optional): the residual, relative to g, at which conjugate gradient stops
+            max_iterations (int, optional): the maximal number of conjugate gradient iterations, default len(r)
+
+        Returns:
+            tuple(np.ndarray, np.ndarray): the Newton direction x and the gradient g
+        """
+        g, d, c = self.derivatives(r)
+        factor = self._factor(d)
+        x = np.zeros(self.n)
+        residual = g.copy()
+        z = self._precondition(factor, residual)
+        p = z.copy()
+        rz = residual @ z
+        target = tolerance * np.linalg.norm(g)
+        self.cg_iterations = 0
+        for _ in range(max_iterations or max(self.n, 1)):
+            if np.linalg.norm(residual) <= target:
+                break
+            ap = self._multiply(d, c, p)
+            alpha = rz / (p @ ap)
+            x += alpha * p
+            residual -= alpha * ap
+            z = self._precondition(factor, residual)
+            rz, previous = residual @ z, rz
+            p = z + (rz / previous) * p
+            self.cg_iterations += 1
+        return x, g
+
+    def step(self, r, tolerance=1e-10, max_halvings=20):
+        """takes one Newton step, halved until the log posterior does not decrease
+
+        Args:
+            r (np.ndarray): the ratings
+            tolerance (float, optional): see direction
+            max_halvings (int, optional): the maximal number of halvings of the step
+
+        Returns:
+            np.ndarray: the new ratings
+        """
+        x, _ = self.direction(r, tolerance)
+        before = self.log_posterior(r)
+        for _ in range(max_halvings):
+            new_r = r + x
+            if self.log_posterior(new_r) >= before - 1e-12 * abs(before):
+                return new_r
+            x = x / 2
+        return r + x
@@ -0,0 +1,147 @@
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from whr.vectorized import color_teams
+
+# state of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _flat_weeks(base, names=None):
+    """gets the weeks of every team, team after team in the order of names (default: the order of base.teams)"""
+    return [w for n in (base.teams if names is None else names) for w in base.teams[n].weeks]
+
+
+def _init_worker(plays, names, w2, shm_name, size):
+    from whr.whole_history_rating import Base
+    base = Base(config={"w2": w2})
+    for home, away, winner, week, handicap in plays:
+        base.create_play(home, away, winner, week, handicap)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["base"] = base
+    # the shared vector follows the team order of the parent base, which load_plays may not have created in
+    # play order
+    _worker["weeks"] = _flat_weeks(base, names)
+    _worker["shm"] = shm
+    _worker["r"] = np.ndarray((size,), dtype=np.float64, buffer=shm.buf)
+    # the ratings the worker's weeks hold, the ones created by create_play
+    _worker["synced"] = np.array([w.r for w in _worker["weeks"]] + [0.0] * (size - len(_worker["weeks"])))
+
+
+def _update_shard(names, slices, frozen):
+    """runs the Newton step of a shard of teams in a worker, reading and writing ratings in shared memory
+
+    only the weeks whose rating changed in the shared vector are written, setting r bumps the week's version and
+    drops the play terms its opponents cached (see TeamWeek.play_terms)
+
+    frozen holds the frozen week count and prior of each team (see Team.freeze), which workers do not track
+    """
+    base, r, weeks, synced = _worker["base"], _worker["r"], _worker["weeks"], _worker["synced"]
+    current = np.array(r)
+    for i in np.flatnonzero(current != synced).tolist():
+        weeks[i].r = current[i]
+    synced[:] = current
+    for name, (start, stop), (count, posterior) in zip(names, slices, frozen):
+        team = base.teams[name]
+        team.frozen, team._frozen_posterior = count, posterior
+        team.run_one_newton_iteration()
+        r[start:stop] = synced[start:stop] = [w.r for w in base.teams[name].weeks]
+
+
+def _release(executor, shm):
+    executor.shutdown()
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+
+class ParallelSweep:
+    """runs the team Newton steps of one iteration concurrently
+
+    teams are colored so that no two teams of a color ever played each other. A team's Newton step only reads
+    the ratings of its opponents, so the teams of one color can be updated at once and each iteration stays
+    a Gauss-Seidel sweep, only in color order instead of insertion order.
+
+    with the "process" backend every worker rebuilds the base from the plays once and ratings are exchanged
+    through a vector in shared memory. The "thread" backend updates the base's own objects in place.
+
+    the workers and the shared memory are released by close, by leaving a with block, or when the sweep is
+    garbage collected
+    """
+
+    def __init__(self, base, workers, backend="process"):
+        self.base = base
+        self.workers = workers
+        self.backend = backend
+        self.play_count = len(base.plays)
+        # team ids index base.plays.teams, which lists the teams in the order of base.teams
+        names = list(base.teams)
+        ids = {n: i for i, n in enumerate(names)}
+        home = np.asarray(base.plays.home, dtype=np.int64)
+        away = np.asarray(base.plays.away, dtype=np.int64)
+        colors = color_teams(home, away, len(names))
+
+        self.weeks = _flat_weeks(base)
+        self.slices = {}
+        start = 0
+        for name, team in base.teams.items():
+            self.slices[name] = (start, start + len(team.weeks))
+            start += len(team.weeks)
+
+        # spread each color over the workers, heaviest teams first so shards stay balanced
+        self.shards = []
+        for c in range(int(colors.max()) + 1 if len(names) > 0 else 0):
+            teams = sorted((n for n in names if colors[ids[n]] == c), key=lambda n: -len(base.teams[n].weeks))
+            self.shards.append([teams[i::workers] for i in range(workers) if teams[i::workers]])
+
+        self.shm = None
+        if backend == "process":
+            size = max(len(self.weeks), 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=size * 8)
+            self.r = np.ndarray((size,), dtype=np.float64, buffer=self.shm.buf)
+            table = base.plays
+            handicap = table.handicap if table.handicap is not None else [0] * len(table)
+            plays = [(names[h], names[a], "H" if won else "A", week, hk)
+                     for h, a, won, week, hk in zip(table.home, table.away, table.home_won, table.week, handicap)]
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(plays, names, base.config["w2"], self.shm.name, size))
+        elif backend == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise (AttributeError("Unknown parallel backend {}".format(backend)))
+        self._finalizer = weakref.finalize(self, _release, self.executor, self.shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _update_teams(self, names):
+        for name in names:
+            self.base.teams[name].run_one_newton_iteration()
+
+    def run_one_iteration(self):
+        if self.backend == "thread":
+            for shards in self.shards:
+                list(self.executor.map(self._update_teams, shards))
+            return
+        before = np.array([w.r for w in self.weeks])
+        self.r[:len(self.weeks)] = before
+        teams = self.base.teams
+        for shards in self.shards:
+            list(self.executor.map(_update_shard, shards, [[self.slices[n] for n in s] for s in shards],
+                                   [[(teams[n].frozen, teams[n]._frozen_posterior) for n in s] for s in shards]))
+        after = self.r[:len(self.weeks)]
+        # like the workers, only touch the weeks that moved so the cached play terms of the others are kept
+        for i in np.flatnonzero(after != before).tolist():
+            self.weeks[i].r = float(after[i])
+
+    def close(self):
+        """shuts the workers down and releases the shared memory, once"""
+        self.r = None
+        self.shm = None
+        self._finalizer()
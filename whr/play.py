@@ -1,7 +1,9 @@
 import sys
+from array import array
 
 
 class Play:
+    __slots__ = ('week', 'away_team', 'home_team', 'winner', 'handicap', 'apd', 'hpd')
 
     def __init__(self, home, away, winner, time_step, handicap=0):
         self.week = time_step
@@ -9,7 +11,6 @@ class Play:
         self.home_team = home
         self.winner = winner
         self.handicap = handicap
-        self.handicap_proc = handicap
         self.apd = None
         self.hpd = None
 
@@ -51,3 +52,79 @@ class Play:
 
     def home_win_probability(self):
         return self.hpd.gamma() / (self.hpd.gamma() + self.opponents_adjusted_gamma(self.home_team))
+
+
+class PlayTable:
+    """the plays of a base, stored as typed arrays indexed by play
+
+    teams are referenced by their integer id (Team.team_id, the index in teams). Only the outcomes are kept per
+    play, the team-weeks aggregate them into matchups, so a Play object is only built when a play is read back
+
+    Attributes:
+        teams (list[Team]): the teams, indexed by id
+        home (array): the home team id of each play
+        away (array): the away team id of each play
+        home_won (array): 1 where the home team won the play
+        week (array): the week of each play
+        handicap (array): the handicap of each play, None while every handicap is 0
+    """
+
+    __slots__ = ('teams', 'home', 'away', 'home_won', 'week', 'handicap')
+
+    def __init__(self):
+        self.teams = []
+        self.home = array('i')
+        self.away = array('i')
+        self.home_won = array('b')
+        self.week = array('i')
+        self.handicap = None
+
+    def __len__(self):
+        return len(self.home)
+
+    def __getitem__(self, i):
+        home, away = self.teams[self.home[i]], self.teams[self.away[i]]
+        week = self.week[i]
+        play = Play(home, away, "H" if self.home_won[i] else "A", week,
+                    0 if self.handicap is None else self.handicap[i])
+        play.hpd = home.week_exact(week)
+        play.apd = away.week_exact(week)
+        return play
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, play):
+        """stores a play
+
+        Args:
+            play (Play): the play, its teams must have an id
+        """
+        self.home.append(play.home_team.team_id)
+        self.away.append(play.away_team.team_id)
+        self.home_won.append(play.winner == "H")
+        self.week.append(play.week)
+        if play.handicap and self.handicap is None:
+            self.handicap = array('d', bytes(8 * (len(self.home) - 1)))
+        if self.handicap is not None:
+            self.handicap.append(play.handicap)
+
+    def extend(self, home, away, home_won, week, handicap):
+        """stores many plays given column-wise
+
+        Args:
+            home (list[int]): the home team id of each play
+            away (list[int]): the away team id of each play
+            home_won (list[bool]): True where the home team won the play
+            week (list[int]): the week of each play
+            handicap (list[float]): the handicap of each play
+        """
+        if self.handicap is None and any(handicap):
+            self.handicap = array('d', bytes(8 * len(self.home)))
+        self.home.extend(home)
+        self.away.extend(away)
+        self.home_won.extend(home_won)
+        self.week.extend(week)
+        if self.handicap is not None:
+            self.handicap.extend(handicap)
@@ -0,0 +1,79 @@
+import bisect
+import math
+from numbers import Number
+
+from whr.snapshot import load_snapshot
+
+ELO_TO_R = math.log(10) / 400
+
+
+def parse_seeds(ratings):
+    """turns known elo ratings into seeds, the starting r of the team-weeks of each team
+
+    Args:
+        ratings (dict[str, float|list]|list[tuple]): for each team name, either one elo for every week, or
+            [week, elo, ...] entries like ratings_for_team returns. A list of (name, elo) pairs, like
+            get_ordered_ratings(current=True) returns, is read as a dict
+
+    Returns:
+        dict[str, tuple(list[float], list[float])]: for each team, the seeded weeks in order and their r
+    """
+    if not isinstance(ratings, dict):
+        ratings = dict(ratings)
+    seeds = {}
+    for name, value in ratings.items():
+        if isinstance(value, Number):
+            # a single rating holds from the start
+            seeds[name] = ([-math.inf], [float(value) * ELO_TO_R])
+        else:
+            points = sorted((entry[0], entry[1]) for entry in value)
+            if not points:
+                raise (AttributeError("No rating to seed {} with".format(name)))
+            seeds[name] = ([w for w, _ in points], [elo * ELO_TO_R for _, elo in points])
+    return seeds
+
+
+def snapshot_seeds(path):
+    """reads the ratings of a snapshot written by save_base as seeds, see parse_seeds
+
+    Args:
+        path (str): the snapshot
+
+    Returns:
+        dict[str, tuple(list[float], list[float])]: for each team, its weeks in order and their r
+    """
+    data = load_snapshot(path, mmap=False)
+    names = data["names"].tolist()
+    seeds = {}
+    for t, week, r in zip(data["tw_team"].tolist(), data["tw_week"].tolist(), data["r"].tolist()):
+        weeks, rs = seeds.setdefault(names[t], ([], []))
+        weeks.append(week)
+        rs.append(r)
+    for weeks, rs in seeds.values():
+        order = sorted(range(len(weeks)), key=weeks.__getitem__)
+        weeks[:] = [weeks[i] for i in order]
+        rs[:] = [rs[i] for i in order]
+    return seeds
+
+
+def seeded_r(seed, week, previous_week=None, previous_r=0.0):
+    """gets the r a new team-week starts from
+
+    the seed at or before the week is used unless the week before it was known later, then its r is kept like
+    without a seed. Before the first seeded week, the first seed is used
+
+    Args:
+        seed (tuple(list[float], list[float])): the seeded weeks and r of the team, None without seed
+        week (int): the new week
+        previous_week (int, optional): the week before it in the team, None for a first week
+        previous_r (float, optional): its r
+
+    Returns:
+        float: the starting r
+    """
+    if seed is not None:
+        weeks, rs = seed
+        i = bisect.bisect_right(weeks, week) - 1
+        if previous_week is None or (i >= 0 and weeks[i] >= previous_week):
+            return rs[max(i, 0)]
+    return 0.0 if previous_week is None else previous_r
@@ -0,0 +1,314 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from whr.vectorized import ELO_TO_R, VectorizedBase
+
+
+class RatingsView:
+    """the ratings of one snapshot, read-only once loaded
+
+    the snapshot is loaded into a VectorizedBase, its uncertainties are computed once if the snapshot does not have
+    them, and the current leaderboard is precomputed, so queries only read arrays and any number of
+    threads can share a view. The leaderboards of past weeks are kept for the last weeks_cached weeks asked for
+
+    Attributes:
+        weeks_cached (int): the number of past week leaderboards kept
+    """
+
+    weeks_cached = 16
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): a snapshot written by save_base (see whr.snapshot.publish_base)
+        """
+        self.path = path
+        base = VectorizedBase.load_base(path)
+        base.update_uncertainty()
+        self._base = base
+        names, elo, deviation = base.ratings_as_of(None)
+        self.names = names
+        self._current = self._order(elo, deviation)
+        # week -> leaderboard, least recently used first
+        self._leaderboards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _order(elo, deviation):
+        played = np.flatnonzero(~np.isnan(elo))
+        order = played[np.argsort(-elo[played], kind='stable')]
+        return order, elo, deviation
+
+    def rating(self, name, week=None):
+        """gets the rating of a team, see VectorizedBase.rating_at
+
+        Returns:
+            dict: the name, week, elo and standard deviation, None for an unknown team or before its first week
+        """
+        rating = self._base.rating_at(name, week)
+        if rating is None:
+            return None
+        return {'name': name, 'week': week, 'elo': rating[0], 'deviation': rating[1]}
+
+    def history(self, name):
+        """gets the weeks played by a team
+
+        Returns:
+            list[dict]: the week, elo and standard deviation of every week played, None for an unknown team
+        """
+        base = self._base
+        if name not in base.team_ids:
+            return None
+        s = base._team_slice(name)
+        return [{'week': w, 'elo': r / ELO_TO_R, 'deviation': math.sqrt(u) / ELO_TO_R}
+                for w, r, u in zip(base.tw_week[s].tolist(), base.r[s].tolist(), base.uncertainty[s].tolist())]
+
+    def leaderboard(self, week=None, limit=None):
+        """gets the teams ordered by rating, best first
+
+        Args:
+            week (int, optional): the ratings as of this week, None for the current ones
+            limit (int, optional): the number of teams, all by default
+
+        Returns:
+            list[dict]: the rank, name, elo and standard deviation of each team
+        """
+        order, elo, deviation = self._current if week is None else self._leaderboard(week)
+        order = order[:limit] if limit is not None else order
+        return [{'rank': i + 1, 'name': self.names[t], 'elo': float(elo[t]), 'deviation': float(deviation[t])}
+                for i, t in enumerate(order.tolist())]
+
+    def _leaderboard(self, week):
+        with self._lock:
+            entry = self._leaderboards.get(week)
+            if entry is not None:
+                self._leaderboards.move_to_end(week)
+                return entry
+        # computed outside the lock, several threads may compute the same week and store the same result
+        _, elo, deviation = self._base.ratings_as_of(week)
+        entry = self._order(elo, deviation)
+        with self._lock:
+            self._leaderboards[week] = entry
+            while len(self._leaderboards) > self.weeks_cached:
+                self._leaderboards.popitem(last=False)
+        return entry
+
+    def predict(self, home, away, handicap=0.0, week=None):
+        """gets the probability that home beats away, with the uncertainty of both ratings folded in
+
+        Returns:
+            float: the probability
+        """
+        return float(self._base.predict_many([(home, away)], [handicap], week, uncertainty=True)[0])
+
+
+class RatingsService:
+    """serves the ratings of a snapshot, or of a folder of snapshots (one category per .npz file)
+
+    requests read views, a dict of category -> RatingsView, that are never modified: a reload builds new views and
+    replaces the reference at once, so requests in flight finish on the views they started with
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): a snapshot, or a folder of snapshots
+        """
+        self.path = path
+        self.views = {}
+        self.version = 0
+        self.loaded = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.reload()
+
+    def _files(self):
+        if os.path.isdir(self.path):
+            return {n[:-len('.npz')]: os.path.join(self.path, n) for n in sorted(os.listdir(self.path))
+                    if n.endswith('.npz')}
+        return {os.path.splitext(os.path.basename(self.path))[0]: self.path}
+
+    def signature(self):
+        """gets the inode, modification time and size of every snapshot, to notice new ones"""
+        result = []
+        for category, path in self._files().items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            result.append((category, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(result)
+
+    def reload(self):
+        """loads every snapshot into new views and swaps them in
+
+        Returns:
+            bool: True if the views were swapped, False if a snapshot could not be read (the old views are kept)
+        """
+        with self._lock:
+            signature = self.signature()
+            try:
+                views = {category: RatingsView(path) for category, path in self._files().items()}
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+                print("Could not load {}: {}".format(self.path, e), file=sys.stderr)
+                return False
+            self.views = views
+            self._signature = signature
+            self.version += 1
+            self.loaded = time.time()
+            return True
+
+    def watch(self, interval=1.0):
+        """reloads the snapshots whenever they change, from a background thread
+
+        Args:
+            interval (float, optional): the seconds between two checks
+
+        Returns:
+            threading.Thread: the thread, stopped by close
+        """
+        def run():
+            while not self._stop.wait(interval):
+                if self.signature() != self._signature:
+                    self.reload()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self._stop.set()
+
+    def view(self, category=None):
+        """gets the view of a category, the only one when category is None and there is only one
+
+        Raises:
+            KeyError: for an unknown category
+        """
+        views = self.views
+        if category is None and len(views) == 1:
+            return next(iter(views.values()))
+        return views[category]
+
+
+class RatingsHandler(BaseHTTPRequestHandler):
+    """answers GET requests with json:
+
+    /health, /categories, /ratings/<name>?week=, /history/<name>, /leaderboard?week=&limit= and
+    /predict?home=&away=&handicap=&week=, each with an optional category= when several are served
+    """
+
+    # keep-alive connections, answered without waiting on Nagle's algorithm (headers and body are two writes)
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if parts == ['health']:
+            self._send(200, {'path': service.path, 'version': service.version, 'loaded': service.loaded,
+                             'categories': {c: len(v) for c, v in service.views.items()}})
+            return
+        if parts == ['categories']:
+            self._send(200, sorted(service.views))
+            return
+        try:
+            # the view is read once, a swap during the request does not affect it
+            view = service.view(query.get('category'))
+        except KeyError:
+            self._send(404, {'error': 'unknown category {}, see /categories'.format(query.get('category'))})
+            return
+        try:
+            week = int(query['week']) if 'week' in query else None
+            if len(parts) == 2 and parts[0] == 'ratings':
+                result = view.rating(parts[1], week)
+            elif len(parts) == 2 and parts[0] == 'history':
+                result = view.history(parts[1])
+            elif parts == ['leaderboard']:
+                result = view.leaderboard(week, int(query['limit']) if 'limit' in query else None)
+            elif parts == ['predict']:
+                if 'home' not in query or 'away' not in query:
+                    raise ValueError('predict needs home and away')
+                result = {'home': query['home'], 'away': query['away'],
+                          'probability': view.predict(query['home'], query['away'],
+                                                      float(query.get('handicap', 0)), week)}
+            else:
+                self._send(404, {'error': 'unknown path {}'.format(url.path)})
+                return
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+            return
+        if result is None:
+            self._send(404, {'error': 'unknown team {}'.format(parts[1])})
+        else:
+            self._send(200, result)
+
+
+def make_server(service, host='127.0.0.1', port=8000, verbose=False):
+    """creates the http server of a service, one thread per connection
+
+    Args:
+        service (RatingsService): the service
+        host (str, optional): the address to listen on
+        port (int, optional): the port, 0 for any free one (see server.server_address)
+        verbose (bool, optional): True to log every request
+
+    Returns:
+        ThreadingHTTPServer: the server, run it with serve_forever
+    """
+    server = ThreadingHTTPServer((host, port), RatingsHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='serves the ratings of snapshots written by save_base')
+    parser.add_argument('path', help='a snapshot, or a folder of snapshots named after their category')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--watch', type=float, default=1.0, help='seconds between checks for new snapshots')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    service = RatingsService(args.path)
+    service.watch(args.watch)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print("Serving {} on http://{}:{}".format(args.path, *server.server_address[:2]), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        server.server_close()
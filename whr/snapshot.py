@@ -0,0 +1,113 @@
+import os
+import zipfile
+
+import numpy as np
+
+SNAPSHOT_VERSION = 2
+
+FIELDS = ('names', 'tw_team', 'tw_week', 'r', 'uncertainty', 'next_covariance', 'home', 'away', 'home_won', 'week',
+          'handicap', 'w2')
+
+
+def save_snapshot(path, names, tw_team, tw_week, r, uncertainty, next_covariance, home, away, home_won, week, handicap,
+                  w2):
+    """writes a rating base to an uncompressed .npz file
+
+    Args:
+        path (str): where to write the snapshot
+        names (list[str]): the team names, indexed by team id
+        tw_team (np.ndarray): the team id of each team-week
+        tw_week (np.ndarray): the week of each team-week
+        r (np.ndarray): the rating of each team-week
+        uncertainty (np.ndarray): the variance of each team-week, NaN where it was never computed
+        next_covariance (np.ndarray): the covariance of each team-week with the team's next one, NaN where it was
+            never computed
+        home (np.ndarray): the home team id of each play
+        away (np.ndarray): the away team id of each play
+        home_won (np.ndarray): True where the home team won the play
+        week (np.ndarray): the week of each play
+        handicap (np.ndarray): the handicap of each play
+        w2 (float): the w2 of the config
+    """
+    with open(path, 'wb') as outfile:
+        np.savez(outfile,
+                 version=np.array([SNAPSHOT_VERSION]),
+                 names=np.array(names, dtype=str),
+                 tw_team=np.asarray(tw_team, dtype=np.int64),
+                 tw_week=np.asarray(tw_week, dtype=np.int64),
+                 r=np.asarray(r, dtype=np.float64),
+                 uncertainty=np.asarray(uncertainty, dtype=np.float64),
+                 next_covariance=np.asarray(next_covariance, dtype=np.float64),
+                 home=np.asarray(home, dtype=np.int64),
+                 away=np.asarray(away, dtype=np.int64),
+                 home_won=np.asarray(home_won, dtype=bool),
+                 week=np.asarray(week, dtype=np.int64),
+                 handicap=np.asarray(handicap, dtype=np.float64),
+                 w2=np.array([w2], dtype=np.float64))
+
+
+def publish_base(base, path):
+    """saves a base to a temporary file next to path, then renames it over path
+
+    readers of path (like whr.service) never see a partly written snapshot, and the ones that memory-mapped the
+    previous one keep reading it
+
+    Args:
+        base (Base|VectorizedBase): the base
+        path (str): where to publish the snapshot
+    """
+    temporary = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        base.save_base(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def _mmap_member(path, zf, name):
+    """memory-maps an array stored (not compressed) in an .npz file"""
+    info = zf.getinfo(name + '.npy')
+    with open(path, 'rb') as f:
+        # skip the zip local file header to reach the .npy data
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        major, _ = np.lib.format.read_magic(f)
+        if major == 1:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_snapshot(path, mmap=True):
+    """reads a snapshot written by save_snapshot
+
+    version 1 snapshots, which did not store next_covariance, are read with a NaN one
+
+    Args:
+        path (str): the snapshot to read
+        mmap (bool, optional): True to memory-map the arrays read-only instead of reading them
+
+    Returns:
+        dict[str, np.ndarray]: the arrays, keyed like the arguments of save_snapshot
+    """
+    with np.load(path) as data:
+        version = int(data['version'][0])
+        if version not in (1, SNAPSHOT_VERSION):
+            raise ValueError("Unsupported snapshot version {} in {}".format(version, path))
+        fields = [f for f in FIELDS if f in data.files]
+        if not mmap:
+            result = {f: data[f] for f in fields}
+    if mmap:
+        with zipfile.ZipFile(path) as zf:
+            result = {f: _mmap_member(path, zf, f) for f in fields}
+    if 'next_covariance' not in result:
+        result['next_covariance'] = np.full(len(result['r']), np.nan)
+    result['w2'] = float(result['w2'][0])
+    return result
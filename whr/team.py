@@ -1,203 +1,433 @@
+import bisect
 import math
-import sys
 
 import numpy as np
 
+from whr.seed import seeded_r
 from whr.teamweek import TeamWeek
 
 
+def wiener_posterior(alpha, span, variance_before, variance_after, covariance, w2):
+    """gets the variance of r at a week between two weeks played, a fraction alpha of the span between them
+
+    given both weeks, r follows a Brownian bridge: its mean is interpolated linearly, and its variance is the
+    variance of that interpolation of the two (correlated) weeks plus the bridge's own, alpha (1 - alpha) span w2.
+    Works on arrays as well
+
+    Args:
+        alpha (float): (week - week before) / span
+        span (float): the number of weeks between the two weeks played
+        variance_before (float): the variance of the week before
+        variance_after (float): the variance of the week after
+        covariance (float): their covariance
+        w2 (float): the variance of the Wiener process per week, in r^2
+
+    Returns:
+        float: the variance
+    """
+    return ((1 - alpha) ** 2 * variance_before + alpha ** 2 * variance_after + 2 * alpha * (1 - alpha) * covariance
+            + alpha * (1 - alpha) * span * w2)
+
+
 class Team():
+    __slots__ = ('name', 'team_id', 'w2', 'weeks', '_by_week', 'opponents', '_sigma2', '_uncertainty_version',
+                 'frozen', '_frozen_posterior', 'seed', '_week_numbers')
 
-    def __init__(self, name, config):
+    def __init__(self, name, config, team_id=None):
         self.name = name
+        # the index of the team in the play table of its base
+        self.team_id = team_id
         self.w2 = (math.sqrt(config["w2"]) * math.log(10) / 400) ** 2  # Convert from elo^2 to r^2
         self.weeks = []
+        self._by_week = {}
+        self.opponents = set()
+        self._sigma2 = None
+        # the sorted week numbers, searched by week_at and rating_at
+        self._week_numbers = None
+        self._uncertainty_version = None
+        # the first frozen weeks are not iterated anymore, the posterior (mean, variance) of the last one given the
+        # plays up to it is the prior of the first active week
+        self.frozen = 0
+        self._frozen_posterior = None
+        # known ratings new weeks start from, see whr.seed
+        self.seed = None
+
+    def set_seed(self, seed):
+        """seeds the team, restarting every week from the seed
+
+        Args:
+            seed (tuple(list[float], list[float])): the seeded weeks and their r, see whr.seed.parse_seeds
+        """
+        self.seed = seed
+        self.thaw()
+        for w in self.weeks:
+            w.r = seeded_r(seed, w.week)
+
+    def active_weeks(self):
+        """gets the weeks that are iterated, the ones after the frozen weeks"""
+        return self.weeks[self.frozen:] if self.frozen else self.weeks
+
+    def active_prior(self):
+        """gets the Gaussian prior that the frozen weeks put on the first active week
+
+        Returns:
+            tuple(float, float): the mean and variance of the prior, None if no week is frozen or none is active
+        """
+        if self._frozen_posterior is None or self.frozen >= len(self.weeks):
+            return None
+        mean, variance = self._frozen_posterior
+        # the last frozen posterior, drifted by the Wiener process up to the first active week
+        return mean, variance + abs(self.weeks[self.frozen].week - self.weeks[self.frozen - 1].week) * self.w2
+
+    def freeze(self, count):
+        """freezes the first count weeks, summarizing them as a prior on the first active week
+
+        Args:
+            count (int): the number of weeks to freeze
+        """
+        count = min(count, len(self.weeks))
+        if count <= self.frozen:
+            return
+        self.update_uncertainty()
+        self._frozen_posterior = self._filtered_posterior(count - self.frozen - 1)
+        self.frozen = count
+        self._uncertainty_version = None
+
+    def _filtered_posterior(self, k):
+        """gets the posterior of the k-th active week given the plays up to it only
+
+        the full posterior of the week also holds the plays of the later weeks, which stay active and would be
+        counted twice by the prior. Eliminating the first k weeks of the Newton system (the forward pass of
+        solve_tridiagonal) and removing the Wiener link to week k + 1 leaves the quadratic model of the plays and
+        prior up to week k
+
+        Args:
+            k (int): the index of the week among the active weeks
+
+        Returns:
+            tuple(float, float): the mean and variance of r
+        """
+        weeks, r, lower, diag, upper, g = self._active_system()
+        d, y = diag[0], g[0]
+        for i in range(1, k + 1):
+            a = lower[i - 1] / d
+            d = diag[i] - a * upper[i - 1]
+            y = g[i] - a * y
+        if k + 1 < len(weeks):
+            inv_sigma2 = upper[k]
+            d += inv_sigma2
+            y += (r[k] - r[k + 1]) * inv_sigma2
+        return r[k] - y / d, -1.0 / d
+
+    def thaw(self):
+        """makes every week active again"""
+        self.frozen = 0
+        self._frozen_posterior = None
+        self._uncertainty_version = None
+
+    def _active_system(self):
+        """gets the active weeks, their r, and the diagonals of the hessian and the gradient, with the frozen prior
+
+        Returns:
+            tuple(list[TeamWeek], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray): the weeks, r, the
+            lower, main and upper diagonals of the hessian, and the gradient
+        """
+        weeks = self.active_weeks()
+        r = np.array([w.r for w in weeks])
+        sigma2 = self.compute_sigma2()[self.frozen:]
+        lower, diag, upper = self.hessian(weeks, sigma2)
+        g = self.gradient(r, weeks, sigma2)
+        prior = self.active_prior()
+        if prior is not None:
+            mean, variance = prior
+            diag[0] -= 1.0 / variance
+            g[0] -= (r[0] - mean) / variance
+        return weeks, r, lower, diag, upper, g
 
     def log_likelihood(self):
-        result = 0.0
-        sigma2 = self.compute_sigma2()
-        n = len(self.weeks)
-        for i in range(n):
-            prior = 0
-            if i < (n - 1):
-                rd = self.weeks[i].r - self.weeks[i + 1].r
-                prior += (1 / math.sqrt(2 * math.pi))
-            if i > 0:
-                rd = self.weeks[i].r - self.weeks[i - 1].r
-                prior += (1 / (math.sqrt(2 * math.pi *
-                                         sigma2[i - 1]))) * math.exp(-(rd ** 2) / 2 * sigma2[i - 1])
-            if prior == 0:
-                result += self.weeks[i].log_likelihood()
-            else:
-                if self.weeks[i].log_likelihood() >= sys.maxsize or math.log(prior) >= sys.maxsize:
-                    print(
-                        "Infinity at {}: {} + {}: prior = {}, weeks = {}".format(self.__str__(),
-                                                                                 self.weeks[i].log_likelihood(),
-                                                                                 math.log(prior), prior, self.weeks))
-                    return
-                result += self.weeks[i].log_likelihood() + math.log(prior)
+        """gets the log likelihood of the team's plays and of the Wiener process prior between its active weeks"""
+        weeks = self.active_weeks()
+        result = sum(w.log_likelihood() for w in weeks)
+        sigma2 = self.compute_sigma2()[self.frozen:]
+        for i in range(len(weeks) - 1):
+            rd = weeks[i + 1].r - weeks[i].r
+            result += -(rd ** 2) / (2 * sigma2[i]) - 0.5 * math.log(2 * math.pi * sigma2[i])
+        prior = self.active_prior()
+        if prior is not None:
+            mean, variance = prior
+            result += -((weeks[0].r - mean) ** 2) / (2 * variance) - 0.5 * math.log(2 * math.pi * variance)
         return result
 
     @staticmethod
     def hessian(weeks, sigma2):
+        """builds the tridiagonal hessian as its three diagonals (lower, diagonal, upper)"""
         n = len(weeks)
-        mat = np.zeros((n, n))
-        for row in range(n):
-            for col in range(n):
-                if row == col:
-                    prior = 0
-                    if row < (n - 1):
-                        prior += -1.0 / sigma2[row]
-                    if row > 0:
-                        prior += -1.0 / sigma2[row - 1]
-                    mat[row, col] = weeks[row].log_likelihood_second_derivative() + \
-                                    prior - 0.001
-                elif row == col - 1:
-                    mat[row, col] = 1.0 / sigma2[row]
-                elif row == col + 1:
-                    mat[row, col] = 1.0 / sigma2[col]
-                else:
-                    mat[row, col] = 0
-        return mat
+        inv_sigma2 = 1.0 / sigma2
+        prior = np.zeros(n)
+        prior[:-1] -= inv_sigma2
+        prior[1:] -= inv_sigma2
+        diag = np.array([w.log_likelihood_second_derivative() for w in weeks]) + prior - 0.001
+        return inv_sigma2, diag, inv_sigma2
 
     @staticmethod
     def gradient(r, weeks, sigma2):
-        g = []
-        n = len(weeks)
-        for idx, week in enumerate(weeks):
-            prior = 0
-            if idx < (n - 1):
-                prior += -(r[idx] - r[idx + 1]) / sigma2[idx]
-            if idx > 0:
-                prior += -(r[idx] - r[idx - 1]) / sigma2[idx - 1]
-            g.append(week.log_likelihood_derivative() + prior)
-        return g
-
-    def run_one_newton_iteration(self):
-        for week in self.weeks:
-            week.clear_play_terms_cache()
-        if len(self.weeks) == 1:
-            self.weeks[0].update_by_1d_newtons_method()
-        elif len(self.weeks) > 1:
-            self.update_by_ndim_newton()
+        r = np.asarray(r, dtype=np.float64)
+        prior = np.zeros(len(weeks))
+        dr = (r[:-1] - r[1:]) / sigma2
+        prior[:-1] -= dr
+        prior[1:] += dr
+        return np.array([w.log_likelihood_derivative() for w in weeks]) + prior
 
-    def compute_sigma2(self):
-        sigma2 = []
-        for d1, d2 in zip(*(self.weeks[i:] for i in range(2))):
-            sigma2.append(abs(d2.week - d1.week) * self.w2)
-        return sigma2
+    @staticmethod
+    def solve_tridiagonal(lower, diag, upper, rhs):
+        """solves a tridiagonal system with the Thomas algorithm in O(n)
 
-    def update_by_ndim_newton(self):
-        # r
-        r = [d.r for d in self.weeks]
+        Args:
+            lower (np.ndarray): the n - 1 entries below the diagonal
+            diag (np.ndarray): the n diagonal entries
+            upper (np.ndarray): the n - 1 entries above the diagonal
+            rhs (np.ndarray): the right hand side
 
-        # sigma squared (used in the prior)
-        sigma2 = self.compute_sigma2()
+        Returns:
+            np.ndarray: x such that H x = rhs
+        """
+        n = len(diag)
+        d = np.array(diag, dtype=np.float64)
+        y = np.array(rhs, dtype=np.float64)
+        for i in range(1, n):
+            a = lower[i - 1] / d[i - 1]
+            d[i] -= a * upper[i - 1]
+            y[i] -= a * y[i - 1]
+        x = np.zeros(n)
+        x[n - 1] = y[n - 1] / d[n - 1]
+        for i in range(n - 2, -1, -1):
+            x[i] = (y[i] - upper[i] * x[i + 1]) / d[i]
+        return x
 
-        h = self.hessian(self.weeks, sigma2)
-        g = self.gradient(r, self.weeks, sigma2)
-        n = len(r)
-        a = np.zeros((n,))
-        d = np.zeros((n,))
-        b = np.zeros((n,))
-        d[0] = h[0, 0]
-        b[0] = h[0, 1]
+    def run_one_newton_iteration(self, omega=1.0):
+        """runs one Newton step on the ratings of every week
 
-        for i in range(1, n):
-            a[i] = h[i, i - 1] / d[i - 1]
-            d[i] = h[i, i] - a[i] * b[i - 1]
-            if i < n - 1:
-                b[i] = h[i, i + 1]
+        Args:
+            omega (float, optional): the factor stretching the step, above 1 for over-relaxation
 
-        y = np.zeros((n,))
-        y[0] = g[0]
-        for i in range(1, n):
-            y[i] = g[i] - a[i] * y[i - 1]
+        Returns:
+            float: the largest change of r among the weeks
+        """
+        weeks = self.active_weeks()
+        old = [w.r for w in weeks]
+        if len(weeks) == 1 and self._frozen_posterior is None:
+            weeks[0].update_by_1d_newtons_method()
+        elif len(weeks) > 0:
+            self.update_by_ndim_newton()
+        if omega != 1.0:
+            for w, r in zip(weeks, old):
+                w.r = r + omega * (w.r - r)
+        return max((abs(w.r - r) for w, r in zip(weeks, old)), default=0.0)
 
-        x = np.zeros((n,))
-        x[n - 1] = y[n - 1] / d[n - 1]
-        for i in range(n - 2, -1, -1):
-            x[i] = (y[i] - b[i] * x[i + 1]) / d[i]
+    def gradient_norm(self):
+        """gets the largest component of the log likelihood gradient, the residual of the current ratings"""
+        if len(self.active_weeks()) == 0:
+            return 0.0
+        g = self._active_system()[-1]
+        return float(np.max(np.abs(g)))
+
+    def compute_sigma2(self):
+        # only changes when weeks are added, see add_play
+        if self._sigma2 is None:
+            weeks = np.array([w.week for w in self.weeks], dtype=np.float64)
+            self._sigma2 = np.abs(np.diff(weeks)) * self.w2
+        return self._sigma2
+
+    def update_by_ndim_newton(self):
+        weeks, r, lower, diag, upper, g = self._active_system()
+        x = self.solve_tridiagonal(lower, diag, upper, g)
 
-        new_r = [ri - xi for ri, xi in zip(r, x)]
+        new_r = r - x
 
-        for r in new_r:
-            if r > 650:
-                # raise UnstableRatingException, "Unstable r (#{new_r}) on player #{inspect}"
-                raise Exception("unstable r on player")
+        if np.any(new_r > 650):
+            # raise UnstableRatingException, "Unstable r (#{new_r}) on player #{inspect}"
+            raise Exception("unstable r on player")
 
-        for idx, week in enumerate(self.weeks):
-            week.r = week.r - x[idx]
+        for idx, week in enumerate(weeks):
+            week.r = new_r[idx]
 
     def covariance(self):
-        r = [d.r for d in self.weeks]
+        """gets the diagonal and first off-diagonal of the covariance (the inverse of minus the hessian)
 
-        sigma2 = self.compute_sigma2()
-        h = self.hessian(self.weeks, sigma2)
-        #g = self.gradient(r, self.weeks, sigma2)
-        n = len(r)
+        Returns:
+            tuple(np.ndarray, np.ndarray): the variance of each active week, and the covariance of each active week
+            with the next
+        """
+        _, _, lower, diag, upper, _ = self._active_system()
+        n = len(diag)
 
+        # forward elimination
         a = np.zeros((n,))
-        d = np.zeros((n,))
-        b = np.zeros((n,))
-        d[0] = h[0, 0]
-        b[0] = h[0, 1] if h.size > 2 else 0
-
+        d = np.array(diag)
         for i in range(1, n):
-            a[i] = h[i, i - 1] / d[i - 1]
-            d[i] = h[i, i] - a[i] * b[i - 1]
-            if i < n - 1:
-                b[i] = h[i, i + 1]
-
-        dp = np.zeros((n,))
-        dp[n - 1] = h[n - 1, n - 1]
-        bp = np.zeros((n,))
-        bp[n - 1] = h[n - 1, n - 2]
-        ap = np.zeros((n,))
+            a[i] = lower[i - 1] / d[i - 1]
+            d[i] = diag[i] - a[i] * upper[i - 1]
+
+        # backward elimination
+        dp = np.array(diag)
         for i in range(n - 2, -1, -1):
-            ap[i] = h[i, i + 1] / dp[i + 1]
-            dp[i] = h[i, i] - ap[i] * bp[i + 1]
-            if i > 0:
-                bp[i] = h[i, i - 1]
+            dp[i] = diag[i] - upper[i] / dp[i + 1] * lower[i]
 
         v = np.zeros((n,))
         for i in range(n - 1):
-            v[i] = dp[i + 1] / (b[i] * bp[i + 1] - d[i] * dp[i + 1])
+            v[i] = dp[i + 1] / (upper[i] * lower[i] - d[i] * dp[i + 1])
         v[n - 1] = -1 / d[n - 1]
 
-        mat = np.zeros((n, n))
-        for row in range(n):
-            for col in range(n):
-                if row == col:
-                    mat[row, col] = v[row]
-                elif row == col - 1:
-                    mat[row, col] = -1 * a[col] * v[col]
-                else:
-                    mat[row, col] = 0
-
-        return mat
-
-    def update_uncertainty(self):
-        if len(self.weeks) > 0:
-            c = self.covariance()
-            u = [c[i, i] for i in range(len(self.weeks))]  # u = variance
-            for i, d in enumerate(self.weeks):
+        return v, -a[1:] * v[1:]
+
+    def update_uncertainty(self, version=None):
+        """sets the uncertainty of every week, unless it was already computed for this ratings version
+
+        Args:
+            version (int, optional): the ratings version of the base, None to always recompute
+        """
+        if len(self.active_weeks()) > 0:
+            if version is not None and version == self._uncertainty_version:
+                return None
+            u, c = self.covariance()  # u = variance
+            for i, d in enumerate(self.active_weeks()):
                 d.uncertainty = u[i]
+                d.next_covariance = c[i] if i < len(c) else 0.0
+            self._uncertainty_version = version
+            return None
+        elif len(self.weeks) > 0:
+            # every week is frozen, their uncertainty is kept
             return None
         else:
             return 5
 
+    def week_at(self, week=None):
+        """gets the last week played up to week
+
+        Args:
+            week (int, optional): the week, None for the last week played
+
+        Returns:
+            TeamWeek: the week, None if the team had not played yet
+        """
+        if len(self.weeks) == 0:
+            return None
+        if week is None:
+            return self.weeks[-1]
+        i = bisect.bisect_right(self.week_numbers(), week)
+        return self.weeks[i - 1] if i > 0 else None
+
+    def week_numbers(self):
+        """gets the weeks played, in order (cached until a week is added)"""
+        if self._week_numbers is None:
+            self._week_numbers = [w.week for w in self.weeks]
+        return self._week_numbers
+
+    def rating_at(self, week=None, variance=True):
+        """gets the posterior rating of the team in any week, played or not
+
+        between two weeks played, the Wiener process is pinned at both ends (see wiener_posterior); after the last
+        week played, the variance keeps growing by w2 per week. The uncertainties must be up to date (see
+        update_uncertainty)
+
+        Args:
+            week (int, optional): the week, None for the last week played
+            variance (bool, optional): False to skip the variance
+
+        Returns:
+            tuple(float, float): the mean and variance of r (None without variance), None before the first week
+            played
+        """
+        if len(self.weeks) == 0:
+            return None
+        numbers = self.week_numbers()
+        if week is None:
+            week = numbers[-1]
+        i = bisect.bisect_right(numbers, week)
+        if i == 0:
+            return None
+        before = self.weeks[i - 1]
+        after = self.weeks[i] if i < len(self.weeks) and before.week != week else None
+        if after is None:
+            if not variance:
+                return before.r, None
+            return before.r, (before.uncertainty or 0.0) + (week - before.week) * self.w2
+        alpha = (week - before.week) / (after.week - before.week)
+        mean = (1 - alpha) * before.r + alpha * after.r
+        if not variance:
+            return mean, None
+        return mean, wiener_posterior(alpha, after.week - before.week, before.uncertainty or 0.0,
+                                      after.uncertainty or 0.0, before.next_covariance or 0.0, self.w2)
+
+    def week_exact(self, week):
+        """gets the team-week of a week the team played, None if it did not play that week"""
+        return self._by_week.get(week)
+
     def add_play(self, play):
+        if self.frozen and play.week <= self.weeks[self.frozen - 1].week:
+            # a correction to a frozen week
+            self.thaw()
+        if len(self.weeks) > 0 and play.week < self.weeks[-1].week:
+            # out of order, so the week may already exist or go in between
+            away = play.away_team is self
+            won = play.winner == ("A" if away else "H")
+            self.add_counts([(play.week, play.opponent(self), play.handicap if away else -play.handicap,
+                              int(won), int(not won))])
+            if away:
+                play.apd = self._by_week[play.week]
+            else:
+                play.hpd = self._by_week[play.week]
+            return
         if len(self.weeks) == 0 or self.weeks[-1].week != play.week:
             new_tweek = TeamWeek(self, play.week)
             if len(self.weeks) == 0:
                 new_tweek.is_first_week = True
-                new_tweek.set_gamma(1)
+                new_tweek.r = seeded_r(self.seed, play.week)
             else:
-                new_tweek.set_gamma(self.weeks[-1].gamma())
+                new_tweek.r = seeded_r(self.seed, play.week, self.weeks[-1].week, self.weeks[-1].r)
             self.weeks.append(new_tweek)
+            self._by_week[play.week] = new_tweek
+            self._sigma2 = None
+            self._week_numbers = None
+        self.opponents.add(play.opponent(self))
         if play.away_team == self:
             play.apd = self.weeks[-1]
         else:
             play.hpd = self.weeks[-1]
         self.weeks[-1].add_play(play)
+
+    def add_counts(self, counts):
+        """adds plays already counted by week and opponent, in any week order
+
+        counts go into the existing weeks, and missing weeks are created in one go and sorted in
+
+        Args:
+            counts (list[tuple(int, Team, float, int, int)]): the week, the opponent, the elo added to the opponent
+                (the handicap as seen from this team), and the number of plays won and lost against it
+        """
+        if self.frozen and min(c[0] for c in counts) <= self.weeks[self.frozen - 1].week:
+            # a correction to a frozen week
+            self.thaw()
+        by_week = self._by_week
+        new_weeks = set()
+        opponents = self.opponents
+        for week, opponent, offset, wins, losses in counts:
+            tweek = by_week.get(week)
+            if tweek is None:
+                tweek = TeamWeek(self, week)
+                by_week[week] = tweek
+                new_weeks.add(tweek)
+            opponents.add(opponent)
+            tweek.count_plays(opponent, offset, wins, losses)
+        if new_weeks:
+            self.weeks = sorted(by_week.values(), key=lambda w: w.week)
+            for i, tweek in enumerate(self.weeks):
+                tweek.is_first_week = i == 0
+                if tweek in new_weeks:
+                    # like add_play, a new week starts from its seed or the week before
+                    if i > 0:
+                        tweek.r = seeded_r(self.seed, tweek.week, self.weeks[i - 1].week, self.weeks[i - 1].r)
+                    else:
+                        tweek.r = seeded_r(self.seed, tweek.week)
+            self._sigma2 = None
+            self._week_numbers = None
@@ -3,14 +3,37 @@ import sys
 
 
 class TeamWeek:
+    __slots__ = ('_r', 'version', 'week', 'team', 'is_first_week', 'uncertainty', 'next_covariance', 'play_counts',
+                 'play_count', '_matchups', '_matchup_play_count', '_play_terms', '_term_versions',
+                 '_terms_first_week')
 
     def __init__(self, team, week):
-        self.r = None
+        self._r = None
+        # bumped whenever r changes, so opponents know when their cached play terms are stale
+        self.version = 0
         self.week = week
         self.team = team
         self.is_first_week = False
-        self.won_plays = []
-        self.lost_plays = []
+        self.uncertainty = None
+        self.next_covariance = None
+        # (opponent team, handicap added to the opponent) -> [plays won, plays lost] for each opponent of the week,
+        # the plays themselves are not kept
+        self.play_counts = {}
+        self.play_count = 0
+        self._matchups = None
+        self._matchup_play_count = 0
+        self._play_terms = None
+        self._term_versions = None
+        self._terms_first_week = None
+
+    @property
+    def r(self):
+        return self._r
+
+    @r.setter
+    def r(self, value):
+        self._r = value
+        self.version += 1
 
     def set_gamma(self, value):
         self.r = math.log(value)
@@ -24,64 +47,98 @@ class TeamWeek:
     def elo(self):
         return (self.r * 400) / (math.log(10))
 
-    def clear_play_terms_cache(self):
-        self._won_play_terms = None
-        self._lost_play_terms = None
-
-    def won_play_terms(self):
-        if self._won_play_terms is None:
-            self._won_play_terms = []
-            for g in self.won_plays:
-                other_gamma = g.opponents_adjusted_gamma(self.team)
-                if other_gamma == 0 or other_gamma is None or other_gamma > sys.maxsize:
-                    print(f"other_gamma ({g.opponent(self.team).__str__()}) = {other_gamma}")
-                self._won_play_terms.append([1.0, 0.0, 1.0, other_gamma])
-            if self.is_first_week:
-                # win against virtual team ranked with gamma = 1.0
-                self._won_play_terms.append([1.0, 0.0, 1.0, 1.0])
-        return self._won_play_terms
-
-    def lost_play_terms(self):
-        if self._lost_play_terms is None:
-            self._lost_play_terms = []
-            for g in self.lost_plays:
-                other_gamma = g.opponents_adjusted_gamma(self.team)
-                if other_gamma == 0 or other_gamma is None or other_gamma > sys.maxsize:
-                    print("other_gamma ({}) = {}".format(g.opponent(self.team).__str__(), other_gamma))
-                self._lost_play_terms.append([0.0, other_gamma, 1.0, other_gamma])
+    def matchups(self):
+        """groups the plays of the week by opponent team-week
+
+        play-by-play data repeats the same matchup many times per game, and every play against the same opponent
+        team-week (with the same handicap) contributes the same term to the likelihood, only weighted
+
+        Returns:
+            list[list[TeamWeek, float, int, int]]: for each opponent team-week, the elo added to the opponent
+            (handicap), the number of plays won and lost against it
+        """
+        if self._matchups is None or self._matchup_play_count != self.play_count:
+            self._matchups = [[opponent.week_exact(self.week), offset, wins, losses]
+                              for (opponent, offset), (wins, losses) in self.play_counts.items()]
+            self._matchup_play_count = self.play_count
+            self._play_terms = None
+        return self._matchups
+
+    def count_plays(self, opponent, offset, wins, losses):
+        """counts plays against opponent in this week
+
+        Args:
+            opponent (Team): the opponent
+            offset (float): the elo added to the opponent, the handicap as seen from this team
+            wins (int): the number of plays this team won
+            losses (int): the number of plays this team lost
+        """
+        counts = self.play_counts.get((opponent, offset))
+        if counts is None:
+            self.play_counts[(opponent, offset)] = [wins, losses]
+        else:
+            counts[0] += wins
+            counts[1] += losses
+        self.play_count += wins + losses
+
+    def play_terms(self):
+        """gets one weighted term per opponent team-week
+
+        terms are cached, and only the terms of opponents whose rating changed since (see version) are rebuilt
+
+        Returns:
+            list[list[float, float, float]]: the number of plays won and lost against the opponent, and the
+            opponent's gamma adjusted by the handicap
+        """
+        matchups = self.matchups()
+        if self._play_terms is None or self._terms_first_week != self.is_first_week:
+            self._play_terms = [[wins, losses, None] for _, _, wins, losses in matchups]
+            self._term_versions = [None] * len(matchups)
             if self.is_first_week:
-                # win against virtual team ranked with gamma = 1.0
-                self._lost_play_terms.append([0.0, 1.0, 1.0, 1.0])
-        return self._lost_play_terms
+                # a win and a loss against a virtual team ranked with gamma = 1.0
+                self._play_terms.append([1, 1, 1.0])
+            self._terms_first_week = self.is_first_week
+        terms, versions = self._play_terms, self._term_versions
+        for i, (opponent, offset, _, _) in enumerate(matchups):
+            if versions[i] != opponent.version:
+                other_gamma = 10 ** ((opponent.elo() + offset) / 400.0)
+                if other_gamma == 0 or other_gamma > sys.maxsize:
+                    print(f"other_gamma ({opponent.team.__str__()}) = {other_gamma}")
+                terms[i][2] = other_gamma
+                versions[i] = opponent.version
+        return terms
 
     def log_likelihood_second_derivative(self):
         result = 0.0
-        for a, b, c, d in self.won_play_terms() + self.lost_play_terms():
-            result += (c * d) / ((c * self.gamma() + d) ** 2.0)
-        return -1 * self.gamma() * result
+        gamma = self.gamma()
+        for wins, losses, d in self.play_terms():
+            result += (wins + losses) * d / ((gamma + d) ** 2.0)
+        return -1 * gamma * result
 
     def log_likelihood_derivative(self):
         tally = 0.0
-        for a, b, c, d in (self.won_play_terms() + self.lost_play_terms()):
-            tally += c / (c * self.gamma() + d)
-        return len(self.won_play_terms()) - self.gamma() * tally
+        won = 0
+        gamma = self.gamma()
+        for wins, losses, d in self.play_terms():
+            tally += (wins + losses) / (gamma + d)
+            won += wins
+        return won - gamma * tally
 
     def log_likelihood(self):
         tally = 0.0
-        for a, b, c, d in self.won_play_terms():
-            tally += math.log(a * self.gamma())
-            tally -= math.log(c * self.gamma() + d)
-        for a, b, c, d in self.lost_play_terms():
-            tally += math.log(b)
-            tally -= math.log(c * self.gamma() + d)
+        gamma = self.gamma()
+        for wins, losses, d in self.play_terms():
+            tally += wins * math.log(gamma) + losses * math.log(d)
+            tally -= (wins + losses) * math.log(gamma + d)
         return tally
 
     def add_play(self, play):
-        if (play.winner == "A" and play.away_team == self.team) or (
-                play.winner == "H" and play.home_team == self.team):
-            self.won_plays.append(play)
+        if play.away_team == self.team:
+            won = play.winner == "A"
+            self.count_plays(play.home_team, play.handicap, int(won), int(not won))
         else:
-            self.lost_plays.append(play)
+            won = play.winner == "H"
+            self.count_plays(play.away_team, -play.handicap, int(won), int(not won))
 
     def update_by_1d_newtons_method(self):
         dr = (self.log_likelihood_derivative() /
@@ -0,0 +1,729 @@
+import csv
+import math
+import os
+import time
+from itertools import islice
+
+import numpy as np
+
+from whr.newton import SparseNewton
+from whr.seed import parse_seeds, seeded_r, snapshot_seeds
+from whr.snapshot import load_snapshot, save_snapshot
+from whr.team import wiener_posterior
+from whr.whole_history_rating import UnstableRatingException, win_probabilities
+
+ELO_TO_R = math.log(10) / 400
+
+
+def unique_rows(*columns):
+    """finds the distinct rows of a table given as columns, like np.unique(..., axis=0) but sorting one int64 key
+
+    each column is replaced by the rank of its values, and the ranks are packed into a single integer per row
+
+    Args:
+        *columns (np.ndarray): the columns, of the same length
+
+    Returns:
+        tuple(list[np.ndarray], np.ndarray): the columns of the distinct rows, sorted like np.unique sorts them,
+        and the index of each row among them
+    """
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    size = 1
+    for column in columns:
+        values, codes = np.unique(column, return_inverse=True)
+        size *= max(len(values), 1)
+        if size >= 2 ** 62:
+            rows, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_inverse=True)
+            return [rows[:, i].astype(c.dtype) for i, c in enumerate(columns)], inverse.reshape(-1)
+        key = key * len(values) + codes.reshape(-1)
+    _, index, inverse = np.unique(key, return_index=True, return_inverse=True)
+    return [c[index] for c in columns], inverse.reshape(-1)
+
+
+def color_teams(home, away, team_count):
+    """greedily colors the team graph so that no two teams sharing a color ever played each other
+
+    teams of the same color do not appear in each other's likelihood, so all of them can take their
+    Newton step at once and the sweep stays equivalent to the serial Gauss-Seidel order
+
+    Args:
+        home (np.ndarray): home team id of each play
+        away (np.ndarray): away team id of each play
+        team_count (int): number of teams
+
+    Returns:
+        np.ndarray: the color of each team, starting at 0
+    """
+    (t_ids, o_ids), _ = unique_rows(np.concatenate([home, away]), np.concatenate([away, home]))
+    neighbours = [[] for _ in range(team_count)]
+    for t, o in zip(t_ids.tolist(), o_ids.tolist()):
+        neighbours[t].append(o)
+    colors = np.full(team_count, -1, dtype=np.int64)
+    # offense units only ever face defense units, so try a two coloring first
+    bipartite = True
+    for root in range(team_count):
+        if colors[root] >= 0:
+            continue
+        colors[root] = 0
+        stack = [root]
+        while stack and bipartite:
+            t = stack.pop()
+            for o in neighbours[t]:
+                if colors[o] < 0:
+                    colors[o] = 1 - colors[t]
+                    stack.append(o)
+                elif colors[o] == colors[t]:
+                    bipartite = False
+                    break
+    if bipartite:
+        return colors
+    colors[:] = -1
+    # most connected teams first, which keeps the number of colors low
+    for t in sorted(range(team_count), key=lambda x: -len(neighbours[x])):
+        used = {colors[o] for o in neighbours[t]}
+        c = 0
+        while c in used:
+            c += 1
+        colors[t] = c
+    return colors
+
+
+class VectorizedBase:
+    """array-backed whole history rating, with the same interface as whr.whole_history_rating.Base
+
+    plays are kept as flat arrays of team-week indices and ratings as one r vector, so the derivatives of every
+    team-week are computed in a single batched pass instead of walking Team -> TeamWeek -> Play objects
+    """
+
+    def __init__(self, config=None):
+        if config is None:
+            config = {}
+        self.config = config
+        if self.config.get("debug") is None:
+            self.config["debug"] = False
+        if self.config.get("w2") is None:
+            self.config["w2"] = 300.0
+        self.w2 = (math.sqrt(self.config["w2"]) * ELO_TO_R) ** 2  # Convert from elo^2 to r^2
+        self.names = []
+        self.team_ids = {}
+        # the known ratings teams start from, see seed_ratings
+        self.seeds = {}
+        # plays already built into arrays, then plays appended since the last build
+        self.home = np.zeros(0, dtype=np.int64)
+        self.away = np.zeros(0, dtype=np.int64)
+        self.home_won = np.zeros(0, dtype=np.float64)
+        self.week = np.zeros(0, dtype=np.int64)
+        self.handicap = np.zeros(0, dtype=np.float64)
+        self._home = []
+        self._away = []
+        self._home_won = []
+        self._week = []
+        self._handicap = []
+        self._dirty = False
+        # bumped whenever ratings change, so the cached uncertainty knows it is stale
+        self.ratings_version = 0
+        self._uncertainty_version = None
+        self.r = np.zeros(0)
+        self.uncertainty = np.zeros(0)
+        self.next_covariance = np.zeros(0)
+        self.tw_team = np.zeros(0, dtype=np.int64)
+        self.tw_week = np.zeros(0, dtype=np.int64)
+        self.team_start = np.zeros(1, dtype=np.int64)
+        # the (empty) team-week index, so an empty base can be iterated and queried like Base
+        self._build()
+
+    def team_id(self, name):
+        """gets the integer id of a team, registering the name if it is new
+
+        Args:
+            name (str): the name of the team
+
+        Returns:
+            int: the team id
+        """
+        tid = self.team_ids.get(name)
+        if tid is None:
+            tid = len(self.names)
+            self.team_ids[name] = tid
+            self.names.append(name)
+        return tid
+
+    def create_play(self, home, away, winner, time_step, handicap=0):
+        """creates a new play to be added to the base
+
+        Args:
+            home (str): the home name
+            away (str): the away name
+            winner (str): "H" if home won, "A" if away won
+            time_step (int): the week of the match from origin
+            handicap (float, optional): elo bonus given to the home team
+        """
+        if home == away:
+            raise (AttributeError("Invalid play (home team == away team)"))
+        self._home.append(self.team_id(home))
+        self._away.append(self.team_id(away))
+        self._home_won.append(winner == "H")
+        self._week.append(int(time_step))
+        self._handicap.append(handicap)
+        self._dirty = True
+        self.ratings_version += 1
+
+    def load_plays(self, games, separator=',', chunk_size=10000):
+        """loads all games at once, streaming the file in chunks
+
+        Args:
+            games (str|iterable[list[str]]): a csv path or rows of "home_name,away_name,winner,time_step,handicap"
+            separator (str, optional): the csv delimiter
+            chunk_size (int, optional): the number of rows appended at once
+        """
+        if isinstance(games, str):
+            with open(games, 'r', newline='') as f:
+                self._load_rows(csv.reader(f, delimiter=separator), chunk_size)
+        else:
+            self._load_rows(games, chunk_size)
+
+    def _load_rows(self, rows, chunk_size):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if any(line[0] == line[1] for line in chunk):
+                raise (AttributeError("Invalid play (home team == away team)"))
+            self._home.extend(self.team_id(line[0]) for line in chunk)
+            self._away.extend(self.team_id(line[1]) for line in chunk)
+            self._home_won.extend(line[2] == "H" for line in chunk)
+            self._week.extend(int(line[3]) for line in chunk)
+            self._handicap.extend(float(line[4]) if len(line) > 4 and line[4] != '' else 0 for line in chunk)
+            self._dirty = True
+            self.ratings_version += 1
+
+    def _build(self):
+        """turns the appended plays into the team-week index, keeping the ratings of known team-weeks"""
+        old = {(t, w): r for t, w, r in zip(self.tw_team.tolist(), self.tw_week.tolist(), self.r.tolist())}
+
+        if self._home:
+            self.home = np.concatenate([self.home, np.asarray(self._home, dtype=np.int64)])
+            self.away = np.concatenate([self.away, np.asarray(self._away, dtype=np.int64)])
+            self.home_won = np.concatenate([self.home_won, np.asarray(self._home_won, dtype=np.float64)])
+            self.week = np.concatenate([self.week, np.asarray(self._week, dtype=np.int64)])
+            self.handicap = np.concatenate([self.handicap, np.asarray(self._handicap, dtype=np.float64)])
+            self._home, self._away, self._home_won, self._week, self._handicap = [], [], [], [], []
+        self.hk = self.handicap * ELO_TO_R
+        team_count = len(self.names)
+        n_plays = len(self.home)
+
+        (self.tw_team, self.tw_week), inverse = unique_rows(np.concatenate([self.home, self.away]),
+                                                            np.concatenate([self.week, self.week]))
+        n = len(self.tw_team)
+
+        # identical plays only differ by their outcome, so each (home team-week, away team-week, handicap)
+        # matchup becomes one term weighted by its number of plays and of home wins
+        (self.m_home, self.m_away, self.m_hk), group = unique_rows(inverse[:n_plays], inverse[n_plays:], self.hk)
+        self.m_count = np.bincount(group, minlength=len(self.m_home)).astype(np.float64)
+        self.m_wins = np.bincount(group, self.home_won, minlength=len(self.m_home))
+
+        self.team_start = np.searchsorted(self.tw_team, np.arange(team_count + 1))
+        counts = np.diff(self.team_start)
+        self.pos = np.arange(n) - self.team_start[self.tw_team]
+        self.first = self.pos == 0
+        # a sorted (team, week) key of every team-week, searched by the as-of-week queries
+        self._first_week = int(self.tw_week.min()) if n else 0
+        self._week_span = int(self.tw_week.max()) - self._first_week + 2 if n else 1
+        self._week_key = self.tw_team * self._week_span + (self.tw_week - self._first_week)
+        self.max_weeks = int(counts.max()) if team_count > 0 else 0
+        self.single = counts[self.tw_team] == 1
+
+        # sigma2[i] couples team-week i with i + 1, 0 where i is the last week of its team
+        self.has_next = np.zeros(n, dtype=bool)
+        self.has_next[:-1] = self.tw_team[1:] == self.tw_team[:-1]
+        self.sigma2 = np.zeros(n)
+        self.sigma2[:-1] = np.abs(self.tw_week[1:] - self.tw_week[:-1]) * self.w2
+        self.inv_sigma2 = np.zeros(n)
+        self.inv_sigma2[self.has_next] = 1.0 / self.sigma2[self.has_next]
+
+        # new team-weeks start from their seed or the previous week of the same team, like Team.add_play does
+        r = np.zeros(n)
+        weeks = self.tw_week.tolist()
+        for i, (t, w) in enumerate(zip(self.tw_team.tolist(), weeks)):
+            if (t, w) in old:
+                r[i] = old[(t, w)]
+            elif self.first[i]:
+                r[i] = seeded_r(self.seeds.get(self.names[t]), w)
+            else:
+                r[i] = seeded_r(self.seeds.get(self.names[t]), w, weeks[i - 1], r[i - 1])
+        self.r = r
+        self.uncertainty = np.zeros(n)
+        self.next_covariance = np.zeros(n)
+
+        colors = color_teams(self.home, self.away, team_count)
+        home_color = colors[self.tw_team[self.m_home]]
+        away_color = colors[self.tw_team[self.m_away]]
+        self.color_groups = []
+        for c in range(int(colors.max()) + 1 if team_count > 0 else 0):
+            teams = np.flatnonzero(colors == c)
+            self.color_groups.append((teams, np.flatnonzero(home_color == c), np.flatnonzero(away_color == c)))
+        self._newton = None
+        self._dirty = False
+
+    def _ensure_built(self):
+        if self._dirty:
+            self._build()
+
+    def seed_ratings(self, ratings):
+        """warm starts the fit from known ratings, like Base.seed_ratings
+
+        Args:
+            ratings (dict[str, float|list]|list[tuple]): for each team name, its elo, or its [week, elo, ...] for
+                each known week, see whr.seed.parse_seeds
+        """
+        self._seed(parse_seeds(ratings))
+
+    def seed_from_snapshot(self, path):
+        """warm starts the fit from the ratings of a saved base, see seed_ratings
+
+        Args:
+            path (str): the snapshot
+        """
+        self._seed(snapshot_seeds(path))
+
+    def _seed(self, seeds):
+        self.seeds.update(seeds)
+        self._ensure_built()
+        for name, seed in seeds.items():
+            tid = self.team_ids.get(name)
+            if tid is not None:
+                start, end = self.team_start[tid], self.team_start[tid + 1]
+                self.r[start:end] = [seeded_r(seed, w) for w in self.tw_week[start:end].tolist()]
+        self.ratings_version += 1
+
+    def _padded(self, teams, values, fill):
+        """lays out per team-week values as a (teams, max_weeks) matrix padded with fill"""
+        out = np.full((len(teams), self.max_weeks), fill, dtype=np.float64)
+        counts = self.team_start[teams + 1] - self.team_start[teams]
+        rows = np.repeat(np.arange(len(teams)), counts)
+        idx = self._team_weeks(teams)
+        out[rows, self.pos[idx]] = values[idx]
+        return out, rows, idx
+
+    def _team_weeks(self, teams):
+        starts = self.team_start[teams]
+        counts = self.team_start[teams + 1] - starts
+        return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    def _derivatives(self, home_matchups, away_matchups):
+        """gradient and hessian diagonal of the play likelihood for every team-week"""
+        n = len(self.r)
+        g = np.zeros(n)
+        h = np.zeros(n)
+        for m, sign in ((home_matchups, 1.0), (away_matchups, -1.0)):
+            hw = self.m_home[m]
+            aw = self.m_away[m]
+            count = self.m_count[m]
+            # probability the home team wins, i.e. gamma / (gamma + adjusted opponent gamma)
+            p = 1.0 / (1.0 + np.exp(self.r[aw] - self.r[hw] - self.m_hk[m]))
+            target = hw if sign > 0 else aw
+            won = self.m_wins[m] if sign > 0 else count - self.m_wins[m]
+            expected = p if sign > 0 else 1.0 - p
+            g += np.bincount(target, won - count * expected, minlength=n)
+            h -= np.bincount(target, count * p * (1.0 - p), minlength=n)
+        # a win and a loss against a virtual team with gamma = 1.0 in each first week
+        gamma = np.exp(self.r[self.first])
+        g[self.first] += 1.0 - 2.0 * gamma / (gamma + 1.0)
+        h[self.first] -= 2.0 * gamma / (gamma + 1.0) ** 2
+        return g, h
+
+    def _prior(self, g, h):
+        """adds the Wiener process prior between consecutive weeks to the gradient and hessian diagonal"""
+        dr = np.zeros(len(self.r))
+        dr[:-1] = (self.r[:-1] - self.r[1:]) * self.inv_sigma2[:-1]
+        g -= dr
+        g[1:] += dr[:-1]
+        h -= self.inv_sigma2
+        h[1:] -= self.inv_sigma2[:-1]
+        h[~self.single] -= 0.001
+        return g, h
+
+    def _update_teams(self, teams, home_plays, away_plays):
+        g, h = self._prior(*self._derivatives(home_plays, away_plays))
+        hp, rows, idx = self._padded(teams, h, 1.0)
+        gp, _, _ = self._padded(teams, g, 0.0)
+        bp, _, _ = self._padded(teams, self.inv_sigma2, 0.0)
+        x = self._solve_tridiagonal(hp, bp, gp)
+        new_r = self.r[idx] - x[rows, self.pos[idx]]
+        if np.any(new_r > 650):
+            raise UnstableRatingException("unstable r on team")
+        self.r[idx] = new_r
+
+    def save_base(self, path):
+        """saves the current state of the base to a snapshot file at "path", see whr.snapshot
+
+        Args:
+            path (str): the path where to save the base
+        """
+        self._ensure_built()
+        if self._uncertainty_version == self.ratings_version:
+            uncertainty, covariance = self.uncertainty, self.next_covariance
+        else:
+            uncertainty = covariance = np.full(self.r.shape, np.nan)
+        save_snapshot(path, self.names, self.tw_team, self.tw_week, self.r, uncertainty, covariance,
+                      self.home, self.away, self.home_won > 0, self.week, self.handicap, self.config["w2"])
+
+    @staticmethod
+    def load_base(path, config=None, mmap=True):
+        """loads a saved base, with the ratings it was saved with (no iteration needed)
+
+        Args:
+            path (str): the path to the saved base
+            config (dict, optional): the config of the loaded base, w2 is taken from the snapshot
+            mmap (bool, optional): True to memory-map the play arrays read-only, so that processes loading
+                the same snapshot share them
+
+        Returns:
+            VectorizedBase: the loaded base
+        """
+        data = load_snapshot(path, mmap=mmap)
+        result = VectorizedBase(config=dict(config or {}, w2=data["w2"]))
+        for name in data["names"].tolist():
+            result.team_id(name)
+        result.home, result.away, result.week, result.handicap = data["home"], data["away"], data["week"], \
+            data["handicap"]
+        result.home_won = data["home_won"].astype(np.float64)
+        result.tw_team, result.tw_week, result.r = data["tw_team"], data["tw_week"], data["r"]
+        result._build()
+        if not (np.isnan(data["uncertainty"]).any() or np.isnan(data["next_covariance"]).any()):
+            if np.array_equal(result.tw_team, data["tw_team"]) and np.array_equal(result.tw_week, data["tw_week"]):
+                result.uncertainty = np.array(data["uncertainty"])
+                result.next_covariance = np.array(data["next_covariance"])
+            else:
+                saved = {k: (u, c) for k, u, c in zip(zip(data["tw_team"].tolist(), data["tw_week"].tolist()),
+                                                      data["uncertainty"].tolist(),
+                                                      data["next_covariance"].tolist())}
+                u, c = zip(*[saved[k] for k in zip(result.tw_team.tolist(), result.tw_week.tolist())])
+                result.uncertainty, result.next_covariance = np.array(u), np.array(c)
+            result._uncertainty_version = result.ratings_version
+        return result
+
+    @staticmethod
+    def _solve_tridiagonal(d, b, y):
+        """solves every row's symmetric tridiagonal system (diagonal d, off-diagonal b) at once"""
+        d = d.copy()
+        y = y.copy()
+        for i in range(1, d.shape[1]):
+            a = b[:, i - 1] / d[:, i - 1]
+            d[:, i] -= a * b[:, i - 1]
+            y[:, i] -= a * y[:, i - 1]
+        x = np.zeros_like(y)
+        x[:, -1] = y[:, -1] / d[:, -1]
+        for i in range(d.shape[1] - 2, -1, -1):
+            x[:, i] = (y[:, i] - b[:, i] * x[:, i + 1]) / d[:, i]
+        return x
+
+    def _run_one_iteration(self):
+        """runs one iteration of the whr algorithm, one batched Newton step per color of teams
+
+        with config["solver"] set to "newton", one global Newton step on every team-week instead (see
+        whr.newton.SparseNewton)
+        """
+        if self.config.get("solver") == "newton":
+            if self._newton is None:
+                count = self.m_count - self.m_wins
+                self._newton = SparseNewton(self.team_start, self.inv_sigma2, self.first,
+                                            np.concatenate([self.m_home, self.m_away]),
+                                            np.concatenate([self.m_away, self.m_home]),
+                                            np.concatenate([-self.m_hk, self.m_hk]),
+                                            np.concatenate([self.m_wins, count]),
+                                            np.concatenate([count, self.m_wins]))
+            new_r = self._newton.step(self.r)
+            if np.any(new_r > 650):
+                raise UnstableRatingException("unstable r on team")
+            self.r = new_r
+        else:
+            for teams, home_plays, away_plays in self.color_groups:
+                self._update_teams(teams, home_plays, away_plays)
+        self.ratings_version += 1
+
+    def update_uncertainty(self):
+        """computes the variance of every team-week from the diagonal of the inverse hessian, if ratings changed"""
+        self._ensure_built()
+        if self._uncertainty_version == self.ratings_version:
+            return
+        if len(self.r) == 0:
+            self._uncertainty_version = self.ratings_version
+            return
+        _, h = self._prior(*self._derivatives(np.arange(len(self.m_home)), np.arange(len(self.m_home))))
+        teams = np.arange(len(self.names))
+        d, rows, idx = self._padded(teams, h, 1.0)
+        b, _, _ = self._padded(teams, self.inv_sigma2, 0.0)
+        m = d.shape[1]
+        df = d.copy()
+        for i in range(1, m):
+            df[:, i] -= b[:, i - 1] ** 2 / df[:, i - 1]
+        db = d.copy()
+        for i in range(m - 2, -1, -1):
+            db[:, i] -= b[:, i] ** 2 / db[:, i + 1]
+        v = np.empty_like(d)
+        v[:, :-1] = db[:, 1:] / (b[:, :-1] ** 2 - df[:, :-1] * db[:, 1:])
+        v[:, -1] = -1 / df[:, -1]
+        # the covariance of each week with the next, like Team.covariance
+        c = np.zeros_like(d)
+        c[:, :-1] = -b[:, :-1] * v[:, 1:] / df[:, :-1]
+        self.uncertainty = np.zeros(len(self.r))
+        self.uncertainty[idx] = v[rows, self.pos[idx]]
+        self.next_covariance = np.zeros(len(self.r))
+        self.next_covariance[idx] = c[rows, self.pos[idx]]
+        self._uncertainty_version = self.ratings_version
+
+    def iterate(self, count):
+        """do a number of "count" iterations of the algorithm
+
+        uncertainties are not updated here, see update_uncertainty
+
+        Args:
+            count (int): the number of iterations desired
+        """
+        self._ensure_built()
+        for _ in range(count):
+            self._run_one_iteration()
+
+    def auto_iterate(self, time_limit=10, precision=10E-3, monitor=False):
+        """iterates until the elo of every team-week moves less than precision between two rounds of 10 iterations
+
+        Args:
+            time_limit (int, optional): the maximal time after which no more iteration are launched
+            precision (float, optional): the precision of the stability desired
+
+        Returns:
+            tuple(int, bool): the number of iterations and True if it has reached stability, False otherwise
+        """
+        start = time.time()
+        self.iterate(10)
+        a = self.r.copy()
+        i = 10
+        while True:
+            if monitor:
+                print("Elapsed time: {}".format(time.time() - start))
+            self.iterate(10)
+            i += 10
+            if np.max(np.abs(self.r - a), initial=0.0) / ELO_TO_R <= precision:
+                self.update_uncertainty()
+                return i, True
+            if time.time() - start > time_limit:
+                self.update_uncertainty()
+                return i, False
+            a = self.r.copy()
+
+    def _team_slice(self, name):
+        self._ensure_built()
+        tid = self.team_ids.get(name)
+        if tid is None:
+            return slice(0, 0)
+        return slice(self.team_start[tid], self.team_start[tid + 1])
+
+    def ratings_for_team(self, name, current=False):
+        """gets all rating for each week played for the team
+
+        Args:
+            name (str): the team's name
+
+        Returns:
+            list[list[int,float,float]]: for each week, the time_step the elo the uncertainty
+        """
+        s = self._team_slice(name)
+        self.update_uncertainty()
+        weeks, elos, uncertainty = self.tw_week[s], self.r[s] / ELO_TO_R, self.uncertainty[s]
+        if current:
+            return round(elos[-1]), round(uncertainty[-1] * 100)
+        return [[int(w), round(e), round(u * 100)] for w, e, u in zip(weeks, elos, uncertainty)]
+
+    def get_ordered_ratings(self, current=False, compact=False):
+        """gets all ratings for each team (for each week in the season) ordered
+
+        Returns:
+            list[list[float]]: for each team and each week in the season, the corresponding elo
+
+        Args:
+            current (bool, optional): True to let only the last estimation of the elo, False gets all estimation for each week played
+            compact (bool, optional): True to get only a list of elos, False to get the name before
+        """
+        self._ensure_built()
+        elo = self.r / ELO_TO_R
+        teams = [t for t in range(len(self.names)) if self.team_start[t + 1] > self.team_start[t]]
+        teams.sort(key=lambda t: self.r[self.team_start[t + 1] - 1])
+        result = []
+        for t in teams:
+            s = slice(self.team_start[t], self.team_start[t + 1])
+            if current:
+                result.append((self.names[t], elo[s.stop - 1]))
+            elif compact:
+                result.append(elo[s].tolist())
+            else:
+                result.append((self.names[t], elo[s].tolist()))
+        return result
+
+    def print_ordered_ratings(self, current=False):
+        """displays all ratings for each team (for each week in the season) ordered
+        """
+        for name, elos in self.get_ordered_ratings(current=current):
+            print("{} => {}".format(name, elos))
+
+    def log_likelihood(self):
+        """gets the likelihood of the current state, the same value as Base.log_likelihood
+
+        like Base, which sums the likelihood of every team, each play is counted once for each of its two teams
+
+        Returns:
+            float: the likelihood
+        """
+        self._ensure_built()
+        x = self.r[self.m_home] - self.r[self.m_away] + self.m_hk
+        score = -2 * np.sum(self.m_wins * np.logaddexp(0.0, -x) +
+                            (self.m_count - self.m_wins) * np.logaddexp(0.0, x))
+        score -= 2 * np.sum(np.logaddexp(0.0, self.r[self.first])) - np.sum(self.r[self.first])
+        dr = (self.r[1:] - self.r[:-1])[self.has_next[:-1]]
+        s2 = self.sigma2[:-1][self.has_next[:-1]]
+        score -= np.sum(0.5 * dr ** 2 / s2 + 0.5 * np.log(2 * math.pi * s2))
+        return float(score)
+
+    def probability_future_match(self, name1, name2):
+        """gets the probability of winning for an hypothetical match against name1 and name2
+
+        Args:
+          name1 (str): name1's name
+          name2 (str): name2's name
+
+        Returns:
+          tuple(float,float): the probability between 0 and 1 for name1 first then name2
+        """
+        if name1 == name2:
+            raise (AttributeError("Invalid play (home == away)"))
+        s1, s2 = self._team_slice(name1), self._team_slice(name2)
+        r1 = self.r[s1.stop - 1] if s1.stop > s1.start else 0.0
+        r2 = self.r[s2.stop - 1] if s2.stop > s2.start else 0.0
+        team1_prob = 1.0 / (1.0 + math.exp(r2 - r1))
+        print("win probability: {}:{:10.2f}; {}:{:10.2f}".format(name1, team1_prob, name2, 1.0 - team1_prob))
+        return team1_prob, 1.0 - team1_prob
+
+    def _as_of(self, tids, week=None, uncertainty=False):
+        """gets the posterior r (and variance) of teams in a week, like Team.rating_at
+
+        Args:
+            tids (np.ndarray): the team ids
+            week (int, optional): the week, None for the last week of each team
+            uncertainty (bool, optional): True to also get the variances
+
+        Returns:
+            tuple(np.ndarray, np.ndarray, np.ndarray): the r and variance (None unless uncertainty) of each team, 0
+            where it had not played yet, and True where it had
+        """
+        if len(self.r) == 0:
+            zero = np.zeros(len(tids))
+            return zero, zero if uncertainty else None, np.zeros(len(tids), dtype=bool)
+        start, stop = self.team_start[tids], self.team_start[tids + 1]
+        if week is None:
+            idx = stop - 1
+        else:
+            # team-weeks are sorted by (team, week), so one search on a (team, week) key finds every team's week
+            idx = np.searchsorted(self._week_key, tids * self._week_span + np.clip(week - self._first_week, -1,
+                                                                                     self._week_span - 1),
+                                  side='right') - 1
+        known = (idx >= start) & (idx < stop)
+        idx = np.where(known, idx, 0)
+        before = self.tw_week[idx]
+        after = np.minimum(idx + 1, len(self.r) - 1)
+        between = known & (idx + 1 < stop) & (before != week) if week is not None else np.zeros(len(idx), bool)
+        span = np.where(between, self.tw_week[after] - before, 1)
+        alpha = np.where(between, (week - before) / span if week is not None else 0.0, 0.0)
+        r = np.where(known, (1 - alpha) * self.r[idx] + alpha * self.r[after], 0.0)
+        if not uncertainty:
+            return r, None, known
+        self.update_uncertainty()
+        ahead = 0.0 if week is None else (week - before) * self.w2
+        v = np.where(between, wiener_posterior(alpha, span, self.uncertainty[idx], self.uncertainty[after],
+                                               self.next_covariance[idx], self.w2),
+                     self.uncertainty[idx] + ahead)
+        return r, np.where(known, v, 0.0), known
+
+    def _lookup(self, names, week=None, uncertainty=False):
+        """gets the r (and variance) of each name as of week, 0 for teams that never played"""
+        self._ensure_built()
+        tids = np.array([self.team_ids.get(n, -1) for n in names], dtype=np.int64)
+        r, v, known = self._as_of(np.maximum(tids, 0), week, uncertainty)
+        known &= tids >= 0
+        return np.where(known, r, 0.0), np.where(known, v, 0.0) if uncertainty else None
+
+    def rating_at(self, name, week=None):
+        """gets the rating of a team in any week, like Base.rating_at
+
+        Args:
+            name (str): the team's name
+            week (int, optional): the week, None for the last week played
+
+        Returns:
+            tuple(float, float): the elo and its standard deviation, None if the team had not played yet
+        """
+        _, elo, deviation = self.ratings_as_of(week, [name])
+        if np.isnan(elo[0]):
+            return None
+        return float(elo[0]), float(deviation[0])
+
+    def ratings_as_of(self, week=None, names=None):
+        """gets the ratings of many teams in the same week at once, like Base.ratings_as_of
+
+        Args:
+            week (int, optional): the week, None for the last week each team played
+            names (list[str], optional): the teams, all of them by default
+
+        Returns:
+            tuple(list[str], np.ndarray, np.ndarray): the names, their elo and its standard deviation, NaN for the
+            teams that had not played yet
+        """
+        self._ensure_built()
+        if names is None:
+            names = list(self.names)
+        tids = np.array([self.team_ids.get(n, -1) for n in names], dtype=np.int64)
+        r, v, known = self._as_of(np.maximum(tids, 0), week, uncertainty=True)
+        known &= tids >= 0
+        return (names, np.where(known, r / ELO_TO_R, np.nan),
+                np.where(known, np.sqrt(np.where(known, v, 0.0)) / ELO_TO_R, np.nan))
+
+    def predict_many(self, pairs, handicaps=None, week=None, uncertainty=False):
+        """gets the probability of winning of the first team of each pair, for a whole slate of matches at once
+
+        Args:
+            pairs (list[tuple(str, str)]): the (home name, away name) of each match
+            handicaps (list[float], optional): the elo bonus given to the home team of each match
+            week (int, optional): use the ratings as of this week (see rating_at) instead of the latest ones
+            uncertainty (bool, optional): True to fold the variance of both ratings into the prediction
+
+        Returns:
+            np.ndarray: the probability that the home team wins each match
+        """
+        if len(pairs) == 0:
+            return np.zeros(0)
+        home, away = zip(*pairs)
+        r1, v1 = self._lookup(home, week, uncertainty)
+        r2, v2 = self._lookup(away, week, uncertainty)
+        handicap_r = 0.0 if handicaps is None else np.asarray(handicaps, dtype=np.float64) * ELO_TO_R
+        return win_probabilities(r1, r2, handicap_r, v1 + v2 if uncertainty else None)
+
+    def probability_matrix(self, names, week=None, uncertainty=False):
+        """gets the probability of winning of every team against every other one
+
+        Args:
+            names (list[str]): the teams
+            week (int, optional): use the ratings as of this week (see rating_at) instead of the latest ones
+            uncertainty (bool, optional): True to fold the variance of both ratings into the prediction
+
+        Returns:
+            np.ndarray: m[i, j] the probability that names[i] beats names[j]
+        """
+        r, v = self._lookup(names, week, uncertainty)
+        return win_probabilities(r[:, None], r[None, :], 0.0, v[:, None] + v[None, :] if uncertainty else None)
+
+
+if __name__ == "__main__":
+    whr = VectorizedBase(config={"w2": 14})
+    whr.load_plays(os.path.join(os.pardir, 'data', 'power.csv'))
+    print(whr.auto_iterate())
+    whr.print_ordered_ratings(current=True)
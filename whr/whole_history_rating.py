@@ -1,11 +1,19 @@
+import bisect
 import csv
-import json
 import math
 import os
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict
+from itertools import islice
 
-from whr.play import Play
+import numpy as np
+
+from whr.acceleration import make_acceleration
+from whr.instrumentation import IterationEvent
+from whr.newton import SparseNewton
+from whr.play import Play, PlayTable
+from whr.seed import parse_seeds, snapshot_seeds
+from whr.snapshot import load_snapshot, save_snapshot
 from whr.team import Team
 
 
@@ -13,6 +21,25 @@ class UnstableRatingException(Exception):
     pass
 
 
+def win_probabilities(r1, r2, handicap_r=0.0, variance=None):
+    """probability that teams with ratings r1 beat teams with ratings r2
+
+    Args:
+        r1 (np.ndarray): the r of the first teams
+        r2 (np.ndarray): the r of the second teams
+        handicap_r (np.ndarray|float, optional): a bonus added to r1
+        variance (np.ndarray, optional): the variance of r1 - r2, folded in with the probit approximation of the
+            logistic (the prediction gets closer to 0.5 as the ratings get less certain)
+
+    Returns:
+        np.ndarray: the probabilities
+    """
+    x = np.asarray(r1) - np.asarray(r2) + handicap_r
+    if variance is not None:
+        x = x / np.sqrt(1.0 + math.pi * np.asarray(variance) / 8.0)
+    return 1.0 / (1.0 + np.exp(-x))
+
+
 class Base:
 
     def __init__(self, config=None):
@@ -24,8 +51,28 @@ class Base:
                 self.config["debug"] = False
         if self.config.get("w2") is None:
             self.config["w2"] = 300.0
-        self.plays = []
+        self.plays = PlayTable()
         self.teams = {}
+        # the known ratings teams start from, see seed_ratings
+        self.seeds = {}
+        # bumped whenever ratings change, so cached uncertainties know they are stale
+        self.ratings_version = 0
+        self._parallel = None
+        # teams that got plays since the last iteration, the starting frontier of update()
+        self._pending = set()
+        # teams still moving, None when every team is
+        self._active = None
+        # (ratings_version, week) -> names index, ratings and variances used by predictions
+        self._rating_cache = {}
+        # the iterations run so far, and an optional whr.instrumentation.Observer receiving an event for each one
+        self.iterations = 0
+        self.observer = None
+        # the acceleration of the current fit (see config["acceleration"]), and the iterations it saved the last
+        # auto_iterate
+        self._acceleration = None
+        self._acceleration_system = None
+        self.iterations_saved = None
+        self._uncertainty_seconds = 0.0
 
     def print_ordered_ratings(self, current=False):
         """displays all ratings for each team (for each week in the season) ordered
@@ -86,7 +133,10 @@ class Base:
             team: the corresponding team
         """
         if self.teams.get(name, None) is None:
-            self.teams[name] = Team(name, self.config)
+            team = Team(name, self.config, len(self.plays.teams))
+            team.seed = self.seeds.get(name)
+            self.teams[name] = team
+            self.plays.teams.append(team)
         return self.teams[name]
 
     def ratings_for_team(self, name, current=False):
@@ -99,20 +149,21 @@ class Base:
             list[list[int,float,float]]: for each week, the time_step the elo the uncertainty
         """
         team = self.team_by_name(name)
+        team.update_uncertainty(self.ratings_version)
         if current:
             return (round(team.weeks[-1].elo()), round(team.weeks[-1].uncertainty * 100))
         else:
             return [[w.week, round(w.elo()), round(w.uncertainty * 100)] for w in team.weeks]
 
-    def _setup_play(self, home, away, winner, time_step):
+    def _setup_play(self, home, away, winner, time_step, handicap=0):
         if home == away:
             raise (AttributeError("Invalid play (home team == away team)"))
         away_team = self.team_by_name(away)
         home_team = self.team_by_name(home)
-        play = Play(home_team, away_team, winner, time_step)
+        play = Play(home_team, away_team, winner, time_step, handicap)
         return play
 
-    def create_play(self, home, away, winner, time_step):
+    def create_play(self, home, away, winner, time_step, handicap=0):
         """creates a new play to be added to the base
         
         Args:
@@ -120,11 +171,12 @@ class Base:
             away (str): the away name
             winner (str): "B" if home won, "W" if away won
             time_step (int): the day of the match from origin
+            handicap (float, optional): elo bonus given to the home team
 
         Returns:
             Play: the added play
         """
-        play = self._setup_play(home, away, winner, time_step)
+        play = self._setup_play(home, away, winner, time_step, handicap)
         return self._add_play(play)
 
     def _add_play(self, play):
@@ -133,62 +185,196 @@ class Base:
         if play.hpd is None:
             print("Bad play")
         self.plays.append(play)
+        self.ratings_version += 1
+        self._pending.update((play.home_team.name, play.away_team.name))
         return play
 
+    def add_week(self, plays):
+        """adds a new week of plays, to be fitted incrementally by update()
+
+        Args:
+            plays (list[list]): rows of "home_name,away_name,winner,time_step", like load_plays
+        """
+        for line in plays:
+            self.create_play(line[0], line[1], line[2], int(line[3]))
+
+    def seed_ratings(self, ratings):
+        """warm starts the fit from known ratings, like the ones of a previous fit
+
+        the team-weeks of the seeded teams, the ones already loaded and the ones loaded later, start from the seed
+        instead of 0 (a new week still starts from the week before it when that one is more recent than the seed)
+
+        Args:
+            ratings (dict[str, float|list]|list[tuple]): for each team name, its elo, or its [week, elo, ...] for
+                each known week, see whr.seed.parse_seeds
+        """
+        self._seed(parse_seeds(ratings))
+
+    def seed_from_snapshot(self, path):
+        """warm starts the fit from the ratings of a base saved with save_base, see seed_ratings
+
+        Args:
+            path (str): the snapshot
+        """
+        self._seed(snapshot_seeds(path))
+
+    def _seed(self, seeds):
+        self.seeds.update(seeds)
+        for name, seed in seeds.items():
+            team = self.teams.get(name)
+            if team is not None:
+                team.set_seed(seed)
+                self._pending.add(name)
+        self.ratings_version += 1
+
+    def update(self, tolerance=10E-3, max_sweeps=100):
+        """fits the plays added since the last iteration without re-iterating every team
+
+        starting from the current ratings, Newton updates run on the active set (see _run_one_iteration) starting
+        with the teams that got new plays
+
+        Args:
+            tolerance (float, optional): the elo shift under which a team does not push its opponents to the frontier
+            max_sweeps (int, optional): the maximal number of sweeps over the frontier
+
+        Returns:
+            dict[str, tuple(float, float)]: for each team whose ratings moved by more than tolerance, its current
+            elo before and after the update (a new week starts from the rating of the week before)
+        """
+        # teams without weeks (only seeded, or only looked up) have nothing to compare
+        before = {name: [w.r for w in team.weeks] for name, team in self.teams.items() if team.weeks}
+        self._active = self._pending
+        self._pending = set()
+        for _ in range(max_sweeps):
+            if not self._active:
+                break
+            self._run_one_iteration(tolerance)
+        self._active = None
+        self._apply_window()
+
+        changes = {}
+        for name, old in before.items():
+            team = self.teams[name]
+            if max((abs(w.r - r) for w, r in zip(team.weeks, old)), default=0.0) * 400 / math.log(10) > tolerance:
+                changes[name] = (old[-1] * 400 / math.log(10), team.weeks[-1].elo())
+        return changes
+
     def iterate(self, count):
         """do a number of "count" iterations of the algorithm
-        
+
+        uncertainties are not updated here, see update_uncertainty
+
         Args:
             count (int): the number of iterations desired
         """
+        self._active = None
+        self._start_acceleration()
         for _ in range(count):
-            self._run_one_iteration()
+            self._accelerated_iteration()
+        self._pending = set()
+        self._apply_window()
+
+    def update_uncertainty(self):
+        """updates the uncertainty of every team whose ratings changed since it was last computed
+        """
+        if self.observer is not None:
+            start = time.perf_counter()
         for name, team in self.teams.items():
-            team.update_uncertainty()
+            team.update_uncertainty(self.ratings_version)
+        if self.observer is not None:
+            self._uncertainty_seconds += time.perf_counter() - start
 
     def auto_iterate(self, time_limit=10, precision=10E-3, monitor=False):
-        """Summary
-        
+        """iterates until every team has converged
+
+        a team has converged when a sweep moves none of its weekly elos by more than a tenth of precision (the old
+        test compared elos 10 sweeps apart). It is then skipped until one of its opponents moves.
+
+        with config["acceleration"] set (see whr.acceleration), iterations_saved estimates how many more
+        iterations plain sweeps would have needed
+
         Args:
             time_limit (int, optional): the maximal time after which no more iteration are launched
             precision (float, optional): the precision of the stability desired
-        
+
         Returns:
             tuple(int, bool): the number of iterations and True if it has reached stability, False otherwise
         """
         start = time.time()
-        self.iterate(10)
-        a = self.get_ordered_ratings(compact=True)
-        i = 10
+        if self.observer is not None:
+            self.observer.start(self)
+        self._active = None
+        self._start_acceleration()
+        self.iterations_saved = None
+        i = 0
         while True:
-            if monitor:
-                print("Elapsed time: {}".format(time.time()-start))
-            self.iterate(10)
-            i += 10
-            b = self.get_ordered_ratings(compact=True)
-            if self._test_stability(a, b, precision):
-                return i, True
+            self._accelerated_iteration(precision / 10)
+            i += 1
+            if monitor and i % 10 == 0:
+                print("Elapsed time: {}, active teams: {}".format(time.time() - start, len(self._active)))
+            if not self._active:
+                self._active = None
+                self._pending = set()
+                return self._finish_auto_iterate(i, True, precision, monitor)
             if time.time() - start > time_limit:
-                return i, False
-            a = b
+                self._active = None
+                return self._finish_auto_iterate(i, False, precision, monitor)
+
+    def _finish_auto_iterate(self, iterations, stable, precision=None, monitor=False):
+        if stable and self._acceleration is not None:
+            plain = self._acceleration.plain_iterations(precision / 10 * math.log(10) / 400)
+            if plain is not None:
+                self.iterations_saved = plain - iterations
+                if monitor:
+                    print("{} iterations, about {} saved by {} ({} extrapolations, {} rejected)".format(
+                        iterations, self.iterations_saved, self.config["acceleration"],
+                        self._acceleration.extrapolations, self._acceleration.rejections))
+        self.update_uncertainty()
+        self._apply_window()
+        if self.observer is not None:
+            self.observer.finish(self, iterations, stable, self._uncertainty_seconds)
+            self._uncertainty_seconds = 0.0
+        return iterations, stable
+
+    def set_window(self, horizon):
+        """only iterates the last weeks of every team from now on
+
+        weeks played horizon weeks or more before the latest week are frozen after each fit (iterate, auto_iterate
+        or update): they are not iterated anymore, and the posterior of the last frozen week of a team given the
+        plays up to it becomes a Gaussian prior on its first active week, so iterations cost the same whatever
+        the length of the history. Nothing is frozen before the next fit, so weeks are never frozen before they
+        were iterated
 
-    def _test_stability(self, v1, v2, precision=10E-3):
-        """tests if two lists of lists of floats are equal but a certain precision
-        
         Args:
-            v1 (list[list[float]]): first list containing ints
-            v2 (list[list[float]]): second list containing ints
-            precision (float, optional): the precision after which v1 and v2 are not equal
-        
-        Returns:
-            bool: True if the two lists are close enough, False otherwise
+            horizon (int): the number of weeks kept active, None to stop freezing weeks (frozen weeks stay frozen,
+                see thaw)
+        """
+        if horizon is not None and horizon < 1:
+            raise (AttributeError("The horizon must be at least one week, got {}".format(horizon)))
+        self.config["window"] = horizon
+
+    def _apply_window(self):
+        horizon = self.config.get("window")
+        if horizon is None or len(self.teams) == 0:
+            return
+        latest = max((t.weeks[-1].week for t in self.teams.values() if t.weeks), default=None)
+        if latest is None:
+            return
+        for team in self.teams.values():
+            team.freeze(bisect.bisect_right([w.week for w in team.weeks], latest - horizon))
+
+    def thaw(self, names=None):
+        """makes frozen weeks active again, for instance to refit after a correction to an old week
+
+        a play added to a frozen week thaws its teams by itself. With a window set the weeks are frozen again after
+        the next fit, with their refitted posterior
+
+        Args:
+            names (list[str], optional): the teams to thaw, None for every team
         """
-        v1 = [x for y in v1 for x in y]
-        v2 = [x for y in v2 for x in y]
-        for x1, x2 in zip(v1, v2):
-            if abs(x2 - x1) > precision:
-                return False
-        return True
+        for name in self.teams if names is None else names:
+            self.teams[name].thaw()
+        self._active = None
 
     def probability_future_match(self, name1, name2):
         """gets the probability of winning for an hypothetical match against name1 and name2
@@ -224,59 +410,463 @@ class Base:
         print("win probability: {}:{:10.2f}; {}:{:10.2f}".format(name1, team1_prob, name2, team2_prob))
         return team1_prob, team2_prob
 
-    def _run_one_iteration(self):
+    def _rating_vector(self, week=None, uncertainty=False):
+        """gets the rating of every team, cached until the ratings change
+
+        Args:
+            week (int, optional): the ratings as of this week, interpolated between the weeks played (see
+                Team.rating_at), None for the latest
+            uncertainty (bool, optional): True to also get the variances
+
+        Returns:
+            tuple(dict[str, int], np.ndarray, np.ndarray): the index of each name, the r and the variance (None
+            unless uncertainty) of each team, 0 for the teams that had not played yet
+        """
+        key = (self.ratings_version, week)
+        if key not in self._rating_cache:
+            self._rating_cache = {k: v for k, v in self._rating_cache.items() if k[0] == self.ratings_version}
+            index = {name: i for i, name in enumerate(self.teams)}
+            r = np.zeros(len(self.teams))
+            for i, team in enumerate(self.teams.values()):
+                rating = team.rating_at(week, variance=False)
+                if rating is not None:
+                    r[i] = rating[0]
+            self._rating_cache[key] = [index, r, None]
+        entry = self._rating_cache[key]
+        if uncertainty and entry[2] is None:
+            self.update_uncertainty()
+            variance = np.zeros(len(self.teams))
+            for i, team in enumerate(self.teams.values()):
+                rating = team.rating_at(week)
+                if rating is not None:
+                    variance[i] = rating[1]
+            entry[2] = variance
+        return entry[0], entry[1], entry[2]
+
+    def rating_at(self, name, week=None):
+        """gets the rating of a team in any week, interpolated between the weeks it played and extrapolated after
+        the last one (see Team.rating_at)
+
+        Args:
+            name (str): the team's name
+            week (int, optional): the week, None for the last week played
+
+        Returns:
+            tuple(float, float): the elo and its standard deviation, None if the team had not played yet
+        """
+        team = self.teams.get(name)
+        if team is None:
+            return None
+        team.update_uncertainty(self.ratings_version)
+        rating = team.rating_at(week)
+        if rating is None:
+            return None
+        return float(rating[0]) * 400 / math.log(10), math.sqrt(rating[1]) * 400 / math.log(10)
+
+    def ratings_as_of(self, week=None, names=None):
+        """gets the ratings of many teams in the same week at once, see rating_at
+
+        Args:
+            week (int, optional): the week, None for the last week each team played
+            names (list[str], optional): the teams, all of them by default
+
+        Returns:
+            tuple(list[str], np.ndarray, np.ndarray): the names, their elo and its standard deviation, NaN for the
+            teams that had not played yet
+        """
+        if names is None:
+            names = list(self.teams)
+        index, r, variance = self._rating_vector(week, uncertainty=True)
+        elo = np.full(len(names), np.nan)
+        deviation = np.full(len(names), np.nan)
+        for i, name in enumerate(names):
+            team = self.teams.get(name)
+            if team is not None and len(team.weeks) > 0 and (week is None or team.weeks[0].week <= week):
+                elo[i] = r[index[name]]
+                deviation[i] = variance[index[name]]
+        return names, elo * 400 / math.log(10), np.sqrt(deviation) * 400 / math.log(10)
+
+    def _lookup(self, names, week=None, uncertainty=False):
+        """gets the r (and variance) of each name, 0 for teams that never played"""
+        index, r, variance = self._rating_vector(week, uncertainty)
+        idx = np.array([index.get(n, -1) for n in names], dtype=np.int64)
+        known = idx >= 0
+        if len(r) == 0:
+            zero = np.zeros(len(idx))
+            return zero, zero if uncertainty else None
+        idx = np.where(known, idx, 0)
+        result_r = np.where(known, r[idx], 0.0)
+        result_v = np.where(known, variance[idx], 0.0) if uncertainty else None
+        return result_r, result_v
+
+    def predict_many(self, pairs, handicaps=None, week=None, uncertainty=False):
+        """gets the probability of winning of the first team of each pair, for a whole slate of matches at once
+
+        Args:
+            pairs (list[tuple(str, str)]): the (home name, away name) of each match
+            handicaps (list[float], optional): the elo bonus given to the home team of each match
+            week (int, optional): use the ratings as of this week (see rating_at) instead of the latest ones
+            uncertainty (bool, optional): True to fold the variance of both ratings into the prediction
+
+        Returns:
+            np.ndarray: the probability that the home team wins each match
+        """
+        if len(pairs) == 0:
+            return np.zeros(0)
+        home, away = zip(*pairs)
+        r1, v1 = self._lookup(home, week, uncertainty)
+        r2, v2 = self._lookup(away, week, uncertainty)
+        handicap_r = 0.0 if handicaps is None else np.asarray(handicaps, dtype=np.float64) * math.log(10) / 400
+        return win_probabilities(r1, r2, handicap_r, v1 + v2 if uncertainty else None)
+
+    def probability_matrix(self, names, week=None, uncertainty=False):
+        """gets the probability of winning of every team against every other one
+
+        Args:
+            names (list[str]): the teams
+            week (int, optional): use the ratings as of this week (see rating_at) instead of the latest ones
+            uncertainty (bool, optional): True to fold the variance of both ratings into the prediction
+
+        Returns:
+            np.ndarray: m[i, j] the probability that names[i] beats names[j]
+        """
+        r, v = self._lookup(names, week, uncertainty)
+        return win_probabilities(r[:, None], r[None, :], 0.0, v[:, None] + v[None, :] if uncertainty else None)
+
+    def _start_acceleration(self):
+        """creates the acceleration of config["acceleration"] for a new fit, see whr.acceleration"""
+        self._acceleration = None if self.config.get("solver") == "newton" else make_acceleration(self.config)
+        self._acceleration_system = None
+
+    def _accelerated_iteration(self, tolerance=None):
+        """runs one iteration, accelerated by config["acceleration"]
+
+        an over-relaxed sweep, or an extrapolated point, is only kept if the log posterior does not decrease
+
+        Args:
+            tolerance (float, optional): see _run_one_iteration
+        """
+        acceleration = self._acceleration
+        if acceleration is None:
+            self._run_one_iteration(tolerance)
+            return
+        if self._acceleration_system is None:
+            # the log posterior of the stacked ratings, its structure does not change during a fit
+            teams = [t for t in self.teams.values() if t.frozen < len(t.weeks)]
+            self._acceleration_system = (teams,) + self._global_system(teams)
+        teams, weeks, team_start, system = self._acceleration_system
+        x = np.array([w.r for w in weeks])
+        active = self._active
+        omega = acceleration.omega
+        self._run_one_iteration(tolerance, omega)
+        gx = np.array([w.r for w in weeks])
+        acceleration.observe(x, gx)
+
+        if omega != 1.0:
+            before = system.log_posterior(x)
+            if system.log_posterior(gx) < before - 1e-12 * abs(before):
+                acceleration.reject()
+                # back to the ratings, and so the teams to update, from before the sweep
+                for w, value in zip(weeks, x.tolist()):
+                    w.r = value
+                self._active = active
+                self.ratings_version += 1
+            return
+        proposal = acceleration.extrapolate(x, gx)
+        if proposal is None:
+            return
+        before = system.log_posterior(gx)
+        if system.log_posterior(proposal) < before - 1e-12 * abs(before):
+            acceleration.reject()
+            return
+        acceleration.accept()
+        for w, value in zip(weeks, proposal.tolist()):
+            w.r = value
+        self.ratings_version += 1
+        if tolerance is not None and self._active is not None:
+            # teams the extrapolation moved are not converged
+            moved = np.abs(proposal - gx) * 400 / math.log(10) > tolerance
+            for t, a, b in zip(teams, team_start[:-1], team_start[1:]):
+                if moved[a:b].any():
+                    self._active.add(t.name)
+                    self._active.update(o.name for o in t.opponents)
+
+    def _run_one_iteration(self, tolerance=None, omega=1.0):
         """runs one iteration of the whr algorithm
+
+        without tolerance every team takes a Newton step. With a tolerance only the active teams do, and the next
+        active set is every team whose weekly elos moved by more than tolerance, together with its opponents.
+
+        set config["schedule"] to "residual" to update the teams with the largest gradient first, or config["solver"]
+        to "newton" to take one global Newton step on every team-week instead of the per-team steps (see
+        whr.newton.SparseNewton)
+
+        Args:
+            tolerance (float, optional): the elo shift under which a team is considered converged
+            omega (float, optional): the factor stretching every Newton step (over-relaxation), ignored by the
+                parallel sweeps and the global Newton step
         """
-        for name, team in self.teams.items():
-            team.run_one_newton_iteration()
+        observer = self.observer
+        if self._active is None:
+            teams = list(self.teams.values())
+        else:
+            teams = [t for name, t in self.teams.items() if name in self._active]
+        # teams whose weeks are all frozen (see set_window) have nothing to update
+        teams = [t for t in teams if t.frozen < len(t.weeks)]
+        if self.config.get("schedule") == "residual":
+            teams.sort(key=lambda t: -t.gradient_norm())
+
+        if observer is not None:
+            start = time.perf_counter()
+        team_seconds = None
+        if self.config.get("solver") == "newton":
+            # a global step moves every team, the active set only serves as the convergence test
+            teams = [t for t in self.teams.values() if t.frozen < len(t.weeks)]
+            shifts = self._global_newton_step(teams)
+        elif self.config.get("workers"):
+            old = {t.name: [w.r for w in t.weeks] for t in teams}
+            self._parallel_sweep().run_one_iteration()
+            shifts = [max((abs(w.r - r) for w, r in zip(t.weeks, old[t.name])), default=0.0) for t in teams]
+        elif observer is None:
+            shifts = [t.run_one_newton_iteration(omega) for t in teams]
+        else:
+            shifts, team_seconds = [], []
+            for t in teams:
+                team_start = time.perf_counter()
+                shifts.append(t.run_one_newton_iteration(omega))
+                team_seconds.append(time.perf_counter() - team_start)
+
+        if observer is not None:
+            newton_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+        if tolerance is not None:
+            active = set()
+            for team, shift in zip(teams, shifts):
+                if shift * 400 / math.log(10) > tolerance:
+                    active.add(team.name)
+                    active.update(o.name for o in team.opponents)
+            self._active = active
+        self.ratings_version += 1
+        self.iterations += 1
+
+        if observer is not None:
+            stability_seconds = time.perf_counter() - start
+            slowest = sorted(zip(team_seconds or [], teams), key=lambda x: -x[0])[:observer.slowest]
+            observer.iteration(IterationEvent(
+                iteration=self.iterations,
+                newton_seconds=newton_seconds,
+                stability_seconds=stability_seconds,
+                uncertainty_seconds=self._uncertainty_seconds,
+                teams=len(teams),
+                play_terms=sum(len(w.matchups()) + w.is_first_week for t in teams for w in t.weeks),
+                max_shift=max(shifts, default=0.0) * 400 / math.log(10),
+                active_teams=None if self._active is None else len(self._active),
+                log_likelihood=self.log_likelihood() if observer.log_likelihood else None,
+                slowest_teams=[(t.name, seconds) for seconds, t in slowest]))
+            self._uncertainty_seconds = 0.0
+
+    def _global_system(self, teams):
+        """gathers the active weeks of every team into one system, see whr.newton.SparseNewton
+
+        Args:
+            teams (list[Team]): the teams with active weeks
+
+        Returns:
+            tuple(list[TeamWeek], np.ndarray, SparseNewton): the weeks, where the weeks of each team start (with a
+            last entry len(weeks)), and the system
+        """
+        weeks = [w for t in teams for w in t.active_weeks()]
+        index = {w: i for i, w in enumerate(weeks)}
+        team_start = np.cumsum([0] + [len(t.active_weeks()) for t in teams])
+        inv_sigma2 = np.zeros(len(weeks))
+        prior_index, prior_mean, prior_variance = [], [], []
+        for t, start in zip(teams, team_start):
+            sigma2 = t.compute_sigma2()[t.frozen:]
+            inv_sigma2[start:start + len(sigma2)] = 1.0 / sigma2
+            prior = t.active_prior()
+            if prior is not None:
+                prior_index.append(start)
+                prior_mean.append(prior[0])
+                prior_variance.append(prior[1])
+        rows, cols, offset, wins, losses, fixed = [], [], [], [], [], []
+        for i, w in enumerate(weeks):
+            for opponent, handicap, won, lost in w.matchups():
+                j = index.get(opponent, -1)
+                rows.append(i)
+                cols.append(j)
+                offset.append(handicap)
+                wins.append(won)
+                losses.append(lost)
+                fixed.append(opponent.r if j < 0 else 0.0)
+        system = SparseNewton(team_start, inv_sigma2, [w.is_first_week for w in weeks], rows, cols,
+                              np.array(offset, dtype=np.float64) * math.log(10) / 400, wins, losses, fixed,
+                              prior_index, prior_mean, prior_variance)
+        return weeks, team_start, system
+
+    def _global_newton_step(self, teams):
+        """takes one Newton step on the active weeks of every team at once
+
+        Args:
+            teams (list[Team]): the teams with active weeks
 
-    def load_plays(self, games, separator=','):
+        Returns:
+            list[float]: the largest change of r of each team
+        """
+        weeks, team_start, system = self._global_system(teams)
+        r = np.array([w.r for w in weeks])
+        new_r = system.step(r)
+        if np.any(new_r > 650):
+            raise UnstableRatingException("unstable r on team")
+        for w, value in zip(weeks, new_r.tolist()):
+            w.r = value
+        shift = np.abs(new_r - r)
+        return [float(shift[a:b].max(initial=0.0)) for a, b in zip(team_start[:-1], team_start[1:])]
+
+    def _parallel_sweep(self):
+        """gets the parallel sweep of the current plays, (re)starting it if plays were added
+
+        set config["workers"] to a number of workers to iterate in parallel, and config["parallel_backend"] to
+        "process" (default) or "thread"
+        """
+        from whr.parallel import ParallelSweep
+        if self._parallel is None or self._parallel.play_count != len(self.plays):
+            self.close()
+            self._parallel = ParallelSweep(self, self.config["workers"],
+                                           self.config.get("parallel_backend") or "process")
+        return self._parallel
+
+    def close(self):
+        """releases the workers and shared memory of the parallel mode, if it was used
+        """
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load_plays(self, games, separator=',', chunk_size=10000):
         """loads all games at once
 
-        given a string representing the path of a file or a list of string representing all games,
+        given a string representing the path of a csv file or rows representing all games,
         this function loads all games in the base
         all match must comply to this format:
-            "home_name away_name winner time_step"
+            "home_name,away_name,winner,time_step,handicap"
             home_name is required
             away_name is required
 
             winner is H or A is required
             time_step is required
+            handicap is optional (default=0)
+
+        the file is streamed, and each chunk of rows is grouped by team and week in one pass, so
+        plays do not need to be sorted by week
         Args:
-            games (str|list[str]): Description
+            games (str|iterable[list[str]]): the path of a csv file, or rows already split
+            separator (str, optional): the csv delimiter
+            chunk_size (int, optional): the number of rows grouped and added at once
         """
         if isinstance(games, str):
-            with open(games, 'r') as f:
-                data = f.readlines()
+            with open(games, 'r', newline='') as f:
+                self._load_rows(csv.reader(f, delimiter=separator), chunk_size)
         else:
-            data = games
-        for line in data:
-            home, away, winner, time_step = line[0], line[1], line[2], line[3]
-            time_step = int(time_step)
+            self._load_rows(games, chunk_size)
+
+    def _load_rows(self, rows, chunk_size):
+        rows = iter(rows)
+        teams = self.teams
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for line in chunk:
+                if line[1] not in teams or line[0] not in teams:
+                    # new teams get their ids in the order create_play would give them
+                    self.team_by_name(line[1])
+                    self.team_by_name(line[0])
+            home = [teams[line[0]].team_id for line in chunk]
+            away = [teams[line[1]].team_id for line in chunk]
+            if any(h == a for h, a in zip(home, away)):
+                raise (AttributeError("Invalid play (home team == away team)"))
+            self._add_plays(home, away, [line[2] == "H" for line in chunk], [int(line[3]) for line in chunk],
+                            [float(line[4]) if len(line) > 4 and line[4] != '' else 0 for line in chunk])
+
+    def _add_plays(self, home, away, home_won, week, handicap):
+        """adds plays given column-wise, in any week order
+
+        the columns go straight into the play table, and identical plays are counted once and added to their
+        team-weeks by count (see Team.add_counts), so no Play is built
 
-            self.create_play(home, away, winner, time_step)
+        Args:
+            home (list[int]): the home team id of each play
+            away (list[int]): the away team id of each play
+            home_won (list[bool]): True where the home team won the play
+            week (list[int]): the week of each play
+            handicap (list[float]): the handicap of each play
+        """
+        self.plays.extend(home, away, home_won, week, handicap)
+        teams = self.plays.teams
+        by_team = defaultdict(list)
+        for (h, a, w, hk, won), n in Counter(zip(home, away, week, handicap, home_won)).items():
+            home_team, away_team = teams[h], teams[a]
+            wins, losses = (n, 0) if won else (0, n)
+            by_team[home_team].append((w, away_team, -hk, wins, losses))
+            by_team[away_team].append((w, home_team, hk, losses, wins))
+        for team, counts in by_team.items():
+            team.add_counts(counts)
+        self.ratings_version += 1
+        self._pending.update(team.name for team in by_team)
 
     def save_base(self, path):
-        """saves the current state of the base to a file at "path"
+        """saves the current state of the base to a snapshot file at "path", see whr.snapshot
         
         Args:
             path (str): the path where to save the base
         """
-        json.dump([self.teams, self.plays, self.config["w2"]], open(path, 'wb'))
+        plays = self.plays
+        weeks = [(t.team_id, w) for t in plays.teams for w in t.weeks]
+        save_snapshot(path, [t.name for t in plays.teams],
+                      [t for t, _ in weeks],
+                      [w.week for _, w in weeks],
+                      [w.r for _, w in weeks],
+                      [np.nan if w.uncertainty is None else w.uncertainty for _, w in weeks],
+                      [np.nan if w.next_covariance is None else w.next_covariance for _, w in weeks],
+                      plays.home, plays.away, np.asarray(plays.home_won, dtype=bool), plays.week,
+                      np.zeros(len(plays)) if plays.handicap is None else plays.handicap,
+                      self.config["w2"])
 
     @staticmethod
-    def load_base(path):
-        """loads a saved base
+    def load_base(path, config=None):
+        """loads a saved base, with the ratings it was saved with (no iteration needed)
         
         Args:
             path (str): the path to the saved base
+            config (dict, optional): the config of the loaded base, w2 is taken from the snapshot
         
         Returns:
             Base: the loaded base
         """
-        teams, plays, config = json.load(open(path, 'rb'))
-        result = Base()
-        result.config["w2"], result.plays, result.teams = config, plays, teams
+        data = load_snapshot(path)
+        result = Base(config=dict(config or {}, w2=data["w2"]))
+        names = data["names"].tolist()
+        for name in names:
+            result.team_by_name(name)
+        # the play columns are stored by team id, in the order of names, like the play table
+        result._add_plays(data["home"].tolist(), data["away"].tolist(), data["home_won"].tolist(),
+                          data["week"].tolist(), data["handicap"].tolist())
+        teams = result.plays.teams
+        for t, week, r, u, c in zip(data["tw_team"].tolist(), data["tw_week"].tolist(), data["r"].tolist(),
+                                    data["uncertainty"].tolist(), data["next_covariance"].tolist()):
+            w = teams[t].week_exact(week)
+            w.r = r
+            if not math.isnan(u):
+                w.uncertainty = u
+            if not math.isnan(c):
+                w.next_covariance = c
+        result._pending = set()
         return result
 
 